@@ -76,6 +76,11 @@ def create_app():
     limiter.init_app(app)
     login_manager.init_app(app)
 
+    # Per-request query counts and DB time (set SQL_TIMING=true to enable)
+    from app.sql_timing import init_sql_timing
+    with app.app_context():
+        init_sql_timing(app, db.engine)
+
     # Sentry error monitoring (set SENTRY_DSN env var to enable)
     sentry_dsn = os.environ.get("SENTRY_DSN")
     if sentry_dsn:
@@ -103,6 +108,16 @@ def create_app():
     from app.cli import register_cli
     register_cli(app)
 
+    # Keep route-day versions in step with the data they cover
+    from app.route_bundle import register_change_tracking
+    register_change_tracking()
+
+    # Keep per-customer visit cadence and overdue scores in step with the data
+    from app.cadence import register_cadence_tracking
+    register_cadence_tracking()
+    from app.attention import register_score_tracking
+    register_score_tracking()
+
     # Read-only guard: block writes for demo users
     @app.before_request
     def readonly_guard():
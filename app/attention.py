@@ -0,0 +1,210 @@
+"""Overdue scoring: which customers most need a visit, relative to their own rhythm.
+
+For every active customer:
+
+    interval = median gap between visits (customer_cadence), or
+               DEFAULT_INTERVAL_DAYS with fewer than two visits,
+               never below MIN_INTERVAL_DAYS
+    ratio    = days since last visit / interval
+               (NEVER_VISITED_RATIO if never visited)
+    score    = (ratio - 1) * (1 + b / (b + BALANCE_SCALE) + r / (r + REVENUE_SCALE))
+
+where b is the outstanding balance and r the sales of the last
+REVENUE_WINDOW_DAYS. Each weight saturates, so a huge account ranks
+higher without drowning out how overdue everyone else is. A positive score
+means the customer is past due.
+
+Scores are computed in one batch (one read, one write for all customers)
+into ``attention_scores`` and read back sorted by the score index. Reads
+never write: the table is recomputed once a day by ``ensure_current``, which
+runs at app start, on every pass of the background worker
+(``flask backup schedule``) and from ``flask route score-attention``. In
+between, the customers touched by a flush (new customers, stops, payments,
+balance or status) are rescored once, just before their transaction commits.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, contains_eager
+
+from app.models import AttentionScore, Customer, CustomerCadence, Payment
+
+DEFAULT_INTERVAL_DAYS = 30
+MIN_INTERVAL_DAYS = 7
+NEVER_VISITED_RATIO = 2.0
+REVENUE_WINDOW_DAYS = 90
+BALANCE_SCALE = 100.0
+REVENUE_SCALE = 500.0
+
+
+def score(days_since: int | None, interval: float | None, balance: float, revenue: float) -> tuple[float, float, float]:
+    """``(expected_interval, overdue_ratio, score)`` for one customer."""
+    interval = max(interval or DEFAULT_INTERVAL_DAYS, MIN_INTERVAL_DAYS)
+    ratio = NEVER_VISITED_RATIO if days_since is None else days_since / interval
+    balance, revenue = max(balance, 0.0), max(revenue, 0.0)
+    weight = 1 + balance / (balance + BALANCE_SCALE) + revenue / (revenue + REVENUE_SCALE)
+    return float(interval), round(ratio, 4), round((ratio - 1) * weight, 4)
+
+
+def compute_scores(session, customer_ids=None, today: date | None = None) -> int:
+    """Rescore ``customer_ids`` (default: everyone). Does not commit. Returns rows written."""
+    today = today or date.today()
+    since = datetime.combine(today - timedelta(days=REVENUE_WINDOW_DAYS), time.min, tzinfo=timezone.utc)
+    ids = None if customer_ids is None else sorted({c for c in customer_ids if c is not None})
+    if ids == []:
+        return 0
+
+    revenue = (
+        sa.select(Payment.customer_id, func.sum(Payment.amount_sold).label("revenue"))
+        .where(Payment.payment_date >= since)
+        .group_by(Payment.customer_id)
+    )
+    if ids is not None:
+        revenue = revenue.where(Payment.customer_id.in_(ids))
+    revenue = revenue.subquery()
+    query = (
+        sa.select(
+            Customer.id, Customer.balance, CustomerCadence.last_visit,
+            CustomerCadence.median_interval, revenue.c.revenue,
+        )
+        .outerjoin(CustomerCadence, CustomerCadence.customer_id == Customer.id)
+        .outerjoin(revenue, revenue.c.customer_id == Customer.id)
+        .where(Customer.status == "active")
+    )
+    if ids is not None:
+        query = query.where(Customer.id.in_(ids))
+
+    rows = []
+    for r in session.execute(query):
+        days_since = (today - r.last_visit).days if r.last_visit else None
+        interval, ratio, value = score(days_since, r.median_interval,
+                                       float(r.balance or 0), float(r.revenue or 0))
+        rows.append({
+            "customer_id": r.id, "score": value, "overdue_ratio": ratio,
+            "expected_interval": interval, "last_visit": r.last_visit, "days_since": days_since,
+            "balance": r.balance or Decimal("0"), "revenue": r.revenue or Decimal("0"),
+            "computed_on": today,
+        })
+
+    table = AttentionScore.__table__
+    delete = table.delete()
+    if ids is not None:
+        delete = delete.where(table.c.customer_id.in_(ids))
+    session.execute(delete)
+    if rows:
+        session.execute(table.insert(), rows)
+    return len(rows)
+
+
+def ensure_current(session) -> None:
+    """Bring the scores up to date. Commits when it writes; a job, not a read.
+
+    Everything is recomputed when any score predates today; otherwise only
+    active customers that have no score yet are added.
+    """
+    today = date.today()
+    oldest = session.execute(sa.select(func.min(AttentionScore.computed_on))).scalar()
+    if oldest is None or oldest < today:
+        compute_scores(session, today=today)
+    else:
+        unscored = session.execute(
+            sa.select(Customer.id)
+            .outerjoin(AttentionScore, AttentionScore.customer_id == Customer.id)
+            .where(Customer.status == "active", AttentionScore.customer_id.is_(None))
+        ).scalars().all()
+        if not unscored:
+            return
+        compute_scores(session, unscored, today=today)
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another request recomputed at the same time; its rows are as good
+        session.rollback()
+
+
+def ranked_query() -> sa.Select:
+    """Active customers due a visit, most overdue first, read off the score index."""
+    return (
+        sa.select(AttentionScore)
+        .join(AttentionScore.customer)
+        .options(contains_eager(AttentionScore.customer))
+        .where(AttentionScore.score > 0, Customer.status == "active")
+        .order_by(AttentionScore.score.desc(), AttentionScore.customer_id)
+    )
+
+
+def ranked(session, limit: int | None = None) -> list[dict]:
+    """The ``limit`` most overdue customers as plain dicts, for dashboard panels."""
+    return [
+        {
+            "id": s.customer_id, "name": s.customer.name, "city": s.customer.city or "—",
+            "balance": float(s.balance or 0), "revenue": float(s.revenue or 0),
+            "last_visit": s.last_visit, "days_since": s.days_since,
+            "expected_interval": s.expected_interval, "overdue_ratio": s.overdue_ratio,
+            "days_overdue": s.days_overdue, "score": s.score,
+        }
+        for s in session.execute(ranked_query().limit(limit)).scalars()
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Change tracking
+# ---------------------------------------------------------------------------
+
+def _collect_score_changes(session, flush_context, instances) -> None:
+    # Stop changes arrive through app.cadence, which rescores after refreshing.
+    # Deleted rows give up their customer now; new ones only have it after the flush.
+    changed, ids = [], set()
+    for obj in session.new:
+        if isinstance(obj, (Payment, Customer)):
+            changed.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Payment):
+            ids.add(obj.customer_id)
+    for obj in session.dirty:
+        if isinstance(obj, Payment):
+            changed.append(obj)
+        elif isinstance(obj, Customer):
+            state = sa.inspect(obj)
+            if state.attrs.balance.history.has_changes() or state.attrs.status.history.has_changes():
+                changed.append(obj)
+    session.info["attention_changes"] = (changed, ids)
+
+
+def queue_rescore(session, customer_ids) -> None:
+    """Rescore ``customer_ids`` when the session's transaction commits."""
+    session.info.setdefault("attention_pending", set()).update(customer_ids)
+
+
+def _queue_changes(session, flush_context) -> None:
+    changed, ids = session.info.pop("attention_changes", ((), set()))
+    ids = {*ids, *(obj.id if isinstance(obj, Customer) else obj.customer_id for obj in changed)}
+    if ids:
+        queue_rescore(session, ids)
+
+
+def _rescore(session) -> None:
+    # A payment flushes more than once (the receipt number lookup autoflushes
+    # the balance); rescore once per transaction, after the commit's own flush.
+    session.flush()
+    ids = session.info.pop("attention_pending", None)
+    if ids:
+        compute_scores(session, ids)
+
+
+def _discard_pending(session) -> None:
+    session.info.pop("attention_pending", None)
+
+
+def register_score_tracking() -> None:
+    if not event.contains(Session, "before_flush", _collect_score_changes):
+        event.listen(Session, "before_flush", _collect_score_changes)
+        event.listen(Session, "after_flush", _queue_changes)
+        event.listen(Session, "before_commit", _rescore)
+        event.listen(Session, "after_rollback", _discard_pending)
@@ -45,6 +45,8 @@ def decode_value(value: Any, *, target_type: type | None = None) -> Any:
     return value
 
 
+import codecs
+import hashlib
 import io
 import json
 import zipfile
@@ -68,53 +70,75 @@ def _alembic_head() -> str | None:
         return None
 
 
-def make_backup() -> bytes:
-    """Build a full restorable backup of the database. Returns zip bytes."""
-    from app import db
+def _pack_backup(table_rows, *, created_at: str, alembic_version: str | None) -> bytes:
+    """Write (table name, encoded rows) pairs into the backup zip format."""
+    table_payloads: dict[str, bytes] = {}
+    table_entries: list[dict] = []
 
-    sorted_tables = list(db.metadata.sorted_tables)
-    table_data: dict[str, list[dict]] = {}
-
-    for table in sorted_tables:
-        rows = db.session.execute(table.select()).mappings().all()
-        table_data[table.name] = [
-            {k: encode_value(v) for k, v in dict(row).items()} for row in rows
-        ]
+    for name, rows in table_rows:
+        payload = json.dumps(rows, indent=2).encode("utf-8")
+        table_payloads[name] = payload
+        table_entries.append({
+            "name": name,
+            "rows": len(rows),
+            "sha256": hashlib.sha256(payload).hexdigest(),
+        })
 
     manifest = {
         "format_version": 1,
         "app": "candy_dash",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "alembic_version": _alembic_head(),
-        "tables": [{"name": t.name, "rows": len(table_data[t.name])} for t in sorted_tables],
+        "created_at": created_at,
+        "alembic_version": alembic_version,
+        "tables": table_entries,
     }
 
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
         zf.writestr("manifest.json", json.dumps(manifest, indent=2))
-        for table in sorted_tables:
-            zf.writestr(
-                f"tables/{table.name}.json",
-                json.dumps(table_data[table.name], indent=2),
-            )
+        for name, payload in table_payloads.items():
+            zf.writestr(f"tables/{name}.json", payload)
     return buf.getvalue()
 
 
+def make_backup() -> bytes:
+    """Build a full restorable backup of the database. Returns zip bytes."""
+    from app import db
+
+    table_rows = []
+    for table in db.metadata.sorted_tables:
+        # Primary-key order lets diff_backups merge two archives in one pass.
+        rows = db.session.execute(
+            table.select().order_by(*table.primary_key.columns)
+        ).mappings().all()
+        table_rows.append(
+            (table.name, [{k: encode_value(v) for k, v in dict(row).items()} for row in rows])
+        )
+
+    return _pack_backup(
+        table_rows,
+        created_at=datetime.now(timezone.utc).isoformat(),
+        alembic_version=_alembic_head(),
+    )
+
+
 import re
 
 VALID_TABLE_NAME = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
 
 SNAPSHOT_DIR = Path("instance") / "backups"
-SNAPSHOT_RETENTION = 3
+SNAPSHOT_RETENTION = 30
+VALID_SNAPSHOT_NAME = re.compile(r"^pre-restore-[0-9TZ]+$")
 
 
 class BackupError(RuntimeError):
     """Raised when a backup is malformed, incompatible, or restore fails."""
 
 
-def _open_backup_zip(zip_bytes: bytes) -> zipfile.ZipFile:
+def _open_backup_zip(source: bytes | str | Path) -> zipfile.ZipFile:
     try:
-        return zipfile.ZipFile(io.BytesIO(zip_bytes))
+        if isinstance(source, (bytes, bytearray)):
+            return zipfile.ZipFile(io.BytesIO(source))
+        return zipfile.ZipFile(source)
     except zipfile.BadZipFile as exc:
         raise BackupError(f"Not a valid zip file: {exc}") from exc
 
@@ -141,19 +165,167 @@ def _validate_zip_paths(zf: zipfile.ZipFile) -> None:
             raise BackupError(f"Suspicious path in backup zip: {name!r}")
 
 
-def _preflight(zip_bytes: bytes) -> tuple[zipfile.ZipFile, dict]:
-    """Validate everything we can without touching the DB. Returns (zf, manifest)."""
+_JSON_WS = re.compile(r"\s*")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_json_array(fp, *, label: str = "JSON file", hasher=None,
+                     chunk_size: int = READ_CHUNK_SIZE):
+    """Stream the objects of a top-level JSON array from a binary file.
+
+    Only one chunk plus the current row is held in memory. If ``hasher`` is
+    given, every raw byte read is fed to it, so a fully consumed iterator
+    leaves it holding the digest of the whole file.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, eof = "", 0, False
+
+    def more() -> None:
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if hasher is not None:
+            hasher.update(chunk)
+        if chunk:
+            buf = buf[pos:] + utf8.decode(chunk)
+        else:
+            eof = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        pos = 0
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            pos = _JSON_WS.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return ""
+            more()
+
+    if peek() != "[":
+        raise BackupError(f"{label} is not a JSON array")
+    pos += 1
+    first = True
+    while True:
+        ch = peek()
+        if ch == "]":
+            pos += 1
+            break
+        if not first:
+            if ch != ",":
+                raise BackupError(
+                    f"{label} is not valid JSON: expected ',' or ']' but found {ch or 'end of file'!r}"
+                )
+            pos += 1
+            peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError as exc:
+                if eof:
+                    raise BackupError(f"{label} is not valid JSON: {exc}") from exc
+                more()
+        if not isinstance(obj, dict):
+            raise BackupError(f"{label} must contain row objects, found {type(obj).__name__}")
+        pos = end
+        first = False
+        yield obj
+
+    if peek() != "":
+        raise BackupError(f"{label} has unexpected data after the JSON array")
+
+
+def _verify_tables(zf: zipfile.ZipFile, manifest: dict, *, only: set[str] | None = None) -> dict:
+    """Stream every table file once, checking checksum, JSON shape and columns.
+
+    Uses only ``db.metadata``; the database itself is never queried. ``only``
+    limits the check to the named tables.
+    """
     from app import db
 
-    zf = _open_backup_zip(zip_bytes)
-    manifest = _read_manifest(zf)
-    _validate_zip_paths(zf)
+    names = set(zf.namelist())
+    total_rows = 0
+    checksums = 0
+    for entry in manifest.get("tables", []):
+        name = entry["name"]
+        if only is not None and name not in only:
+            continue
+        table = db.metadata.tables.get(name)
+        if table is None:
+            raise BackupError(f"Manifest references unknown table: {name!r}")
+        path = f"tables/{name}.json"
+        if path not in names:
+            raise BackupError(f"Manifest lists {name!r} but {path} is missing from zip")
 
+        columns = {col.name for col in table.columns}
+        hasher = hashlib.sha256()
+        rows = 0
+        with zf.open(path) as fp:
+            for row in _iter_json_array(fp, label=path, hasher=hasher):
+                keys = row.keys()
+                if keys != columns:
+                    raise BackupError(
+                        f"{path} row {rows + 1} does not match the {name!r} columns "
+                        f"(unknown: {sorted(keys - columns)}, missing: {sorted(columns - keys)})"
+                    )
+                rows += 1
+
+        expected_rows = entry.get("rows")
+        if expected_rows is not None and expected_rows != rows:
+            raise BackupError(
+                f"{path} has {rows} rows but the manifest records {expected_rows}"
+            )
+        expected_sha = entry.get("sha256")
+        if expected_sha is not None:
+            if hasher.hexdigest() != expected_sha:
+                raise BackupError(f"{path} checksum mismatch; the file is corrupt or was modified")
+            checksums += 1
+        total_rows += rows
+
+    return {
+        "tables": len(manifest.get("tables", [])),
+        "rows": total_rows,
+        "checksums": checksums,
+    }
+
+
+def _check_format(manifest: dict) -> None:
     if manifest.get("format_version") != 1:
         raise BackupError(
             f"Unsupported backup format_version: {manifest.get('format_version')!r}"
         )
 
+
+def verify_backup(source: bytes | str | Path) -> dict:
+    """Validate a backup archive offline. Returns a summary dict.
+
+    Checks the manifest, zip paths, per-table SHA-256 and row counts, and
+    that every row's columns match the current models. Never touches the
+    database, so it is safe to run against any archive at any time.
+    """
+    with _open_backup_zip(source) as zf:
+        manifest = _read_manifest(zf)
+        _validate_zip_paths(zf)
+        _check_format(manifest)
+        summary = _verify_tables(zf, manifest)
+    return {"valid": True, **summary}
+
+
+def _preflight(zip_bytes: bytes | str | Path, *, tables: set[str] | None = None) -> tuple[zipfile.ZipFile, dict]:
+    """Validate everything we can without touching the DB. Returns (zf, manifest).
+
+    ``tables`` restricts the per-file content checks to the tables about to
+    be read.
+    """
+    from app import db
+
+    zf = _open_backup_zip(zip_bytes)
+    manifest = _read_manifest(zf)
+    _validate_zip_paths(zf)
+    _check_format(manifest)
+
     backup_head = manifest.get("alembic_version")
     current_head = _alembic_head()
     if backup_head != current_head:
@@ -167,6 +339,8 @@ def _preflight(zip_bytes: bytes) -> tuple[zipfile.ZipFile, dict]:
         if entry["name"] not in known_tables:
             raise BackupError(f"Manifest references unknown table: {entry['name']!r}")
 
+    _verify_tables(zf, manifest, only=tables)
+
     return zf, manifest
 
 
@@ -207,6 +381,12 @@ def restore_backup(zip_bytes: bytes) -> dict:
 
         _reset_sequences(sorted_tables)
 
+        # _preflight only admits backups at the current head, so derived
+        # tables such as customer_cadence are always in the archive; the
+        # scores are recomputed for today rather than the backup's date.
+        from app.attention import compute_scores
+        compute_scores(db.session)
+
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -222,6 +402,339 @@ def restore_backup(zip_bytes: bytes) -> dict:
     }
 
 
+# ---------------------------------------------------------------------------
+# Selective restore
+# ---------------------------------------------------------------------------
+
+SELECTIVE_BATCH_SIZE = 500
+
+
+def _customer_links(tables) -> dict[str, list[tuple[str, str]]]:
+    """Map each customer-owned table to its (column, parent table) links.
+
+    ``customers`` links to itself through ``id``. Any table with a foreign key
+    into a customer-owned table is customer-owned too, so invoice items and
+    recurring skips follow their parents without being listed by hand.
+    """
+    links: dict[str, list[tuple[str, str]]] = {"customers": [("id", "customers")]}
+    for table in tables:
+        if table.name == "customers":
+            continue
+        table_links = [
+            (fk.parent.name, fk.column.table.name)
+            for fk in table.foreign_keys
+            if fk.column.table.name in links
+        ]
+        if table_links:
+            links[table.name] = table_links
+    return links
+
+
+def _upsert_rows(table, rows: list[dict]) -> None:
+    """Insert rows, overwriting any existing row with the same primary key."""
+    from app import db
+
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    pk_names = [c.name for c in table.primary_key.columns]
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        update_cols = {
+            c.name: stmt.excluded[c.name] for c in table.columns if c.name not in pk_names
+        }
+        if update_cols:
+            stmt = stmt.on_conflict_do_update(index_elements=pk_names, set_=update_cols)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=pk_names)
+        db.session.execute(stmt, rows)
+        return
+
+    pk = table.primary_key.columns[pk_names[0]]
+    db.session.execute(table.delete().where(pk.in_([r[pk.name] for r in rows])))
+    db.session.execute(table.insert(), rows)
+
+
+def restore_selective(
+    source: bytes | str | Path,
+    *,
+    tables: list[str] | None = None,
+    customer_id: int | None = None,
+) -> dict:
+    """Restore chosen tables, or one customer's rows, from a backup by upsert.
+
+    Rows are streamed from the archive and only the matching ones are
+    decoded and written, keyed by primary key. Rows the backup doesn't
+    mention are left alone, so the rest of the database is untouched.
+    Returns a summary dict with per-table row counts.
+    """
+    from app import db
+
+    if not tables and customer_id is None:
+        raise BackupError("Choose at least one table or a customer to restore")
+
+    sorted_tables = list(db.metadata.sorted_tables)
+    links = _customer_links(sorted_tables)
+
+    if customer_id is not None:
+        selected = set(tables) if tables else set(links)
+        outside = sorted(selected - set(links))
+        if outside:
+            raise BackupError(f"Tables are not linked to customers: {', '.join(outside)}")
+        # Parent tables must be scanned too, to learn which child rows belong
+        # to the customer, even when they are not being restored.
+        needed = set(selected)
+        pending = list(selected)
+        while pending:
+            for _col, parent in links[pending.pop()]:
+                if parent not in needed:
+                    needed.add(parent)
+                    pending.append(parent)
+    else:
+        selected = set(tables)
+        needed = set(selected)
+
+    unknown = sorted(needed - set(db.metadata.tables))
+    if unknown:
+        raise BackupError(f"Unknown tables: {', '.join(unknown)}")
+
+    zf, manifest = _preflight(source, tables=needed)
+    in_manifest = {entry["name"] for entry in manifest["tables"]}
+    missing = sorted(selected - in_manifest)
+    if missing:
+        raise BackupError(f"Backup does not contain: {', '.join(missing)}")
+
+    snapshot_path = _write_pre_restore_snapshot()
+
+    owned_ids: dict[str, set] = {"customers": {customer_id}}
+    counts: dict[str, int] = {}
+    try:
+        with zf:
+            for table in sorted_tables:
+                if table.name not in needed or table.name not in in_manifest:
+                    continue
+                restoring = table.name in selected
+                table_links = links.get(table.name, []) if customer_id is not None else []
+                pk_name = next(iter(table.primary_key.columns)).name
+                keep_ids = customer_id is not None and table.name != "customers"
+                if keep_ids:
+                    owned_ids[table.name] = set()
+
+                batch: list[dict] = []
+                count = 0
+                with zf.open(f"tables/{table.name}.json") as fp:
+                    for row in _iter_json_array(fp, label=f"tables/{table.name}.json"):
+                        if table_links and not any(
+                            row.get(col) in owned_ids.get(parent, ()) for col, parent in table_links
+                        ):
+                            continue
+                        if keep_ids:
+                            owned_ids[table.name].add(row[pk_name])
+                        if not restoring:
+                            continue
+                        batch.append(_decode_row(row, table))
+                        if len(batch) >= SELECTIVE_BATCH_SIZE:
+                            _upsert_rows(table, batch)
+                            count += len(batch)
+                            batch = []
+                if restoring:
+                    _upsert_rows(table, batch)
+                    counts[table.name] = count + len(batch)
+
+        _reset_sequences([t for t in sorted_tables if t.name in counts])
+        if counts.keys() & {"route_stops", "payments"}:
+            from app.models import RouteCloseout
+            RouteCloseout.mark_stale()
+        if counts.keys() & {"route_stops", "payments", "customers"}:
+            # Restored rows were written outside the ORM; rederive what depends on them
+            from app.attention import compute_scores
+            from app.cadence import rebuild, refresh
+            if customer_id is not None:
+                refresh(db.session, [customer_id])
+                compute_scores(db.session, [customer_id])
+            else:
+                rebuild(db.session)
+                compute_scores(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if "users" in counts:
+        _invalidate_sessions()
+
+    return {
+        "restored": True,
+        "tables": counts,
+        "rows": sum(counts.values()),
+        "snapshot": str(snapshot_path),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Diff
+# ---------------------------------------------------------------------------
+
+DIFF_SAMPLE_SIZE = 3
+
+
+class _UnorderedRows(Exception):
+    """A side of the diff was not sorted by primary key."""
+
+
+def _archive_row_source(zf: zipfile.ZipFile, manifest: dict, name: str):
+    """Return a callable producing a fresh row iterator for one archive table."""
+    listed = {entry["name"] for entry in manifest.get("tables", [])}
+    path = f"tables/{name}.json"
+
+    def rows():
+        if name not in listed:
+            return iter(())
+        if path not in zf.namelist():
+            raise BackupError(f"Manifest lists {name!r} but {path} is missing from zip")
+        return _iter_closing(zf.open(path), path)
+
+    return rows
+
+
+def _iter_closing(fp, label: str):
+    with fp:
+        yield from _iter_json_array(fp, label=label)
+
+
+def _live_row_source(table):
+    """Return a callable streaming live rows in primary-key order, encoded like a backup."""
+    from app import db
+
+    def rows():
+        stmt = table.select().order_by(*table.primary_key.columns)
+        result = db.session.execute(stmt.execution_options(yield_per=1000)).mappings()
+        for row in result:
+            yield {k: encode_value(v) for k, v in dict(row).items()}
+
+    return rows
+
+
+def _ordered(rows, pk_names: list[str]):
+    last = None
+    for row in rows:
+        key = tuple(row.get(n) for n in pk_names)
+        if last is not None and key <= last:
+            raise _UnorderedRows()
+        last = key
+        yield key, row
+
+
+def _merge_diff(old_rows, new_rows, pk_names: list[str], sample_size: int) -> dict:
+    """Merge-join two primary-key ordered row streams into change counts."""
+    out = {
+        "inserted": 0, "deleted": 0, "changed": 0, "unchanged": 0,
+        "samples": {"inserted": [], "deleted": [], "changed": []},
+    }
+    samples = out["samples"]
+    old_it = _ordered(old_rows, pk_names)
+    new_it = _ordered(new_rows, pk_names)
+    old = next(old_it, None)
+    new = next(new_it, None)
+
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            out["deleted"] += 1
+            if len(samples["deleted"]) < sample_size:
+                samples["deleted"].append(old[1])
+            old = next(old_it, None)
+        elif old is None or new[0] < old[0]:
+            out["inserted"] += 1
+            if len(samples["inserted"]) < sample_size:
+                samples["inserted"].append(new[1])
+            new = next(new_it, None)
+        else:
+            if old[1] == new[1]:
+                out["unchanged"] += 1
+            else:
+                out["changed"] += 1
+                if len(samples["changed"]) < sample_size:
+                    cols = sorted(set(old[1]) | set(new[1]))
+                    samples["changed"].append({
+                        "key": dict(zip(pk_names, old[0])),
+                        "columns": {
+                            c: [old[1].get(c), new[1].get(c)]
+                            for c in cols if old[1].get(c) != new[1].get(c)
+                        },
+                    })
+            old = next(old_it, None)
+            new = next(new_it, None)
+    return out
+
+
+def _open_diff_side(source):
+    if source is None:
+        return None, None
+    zf = _open_backup_zip(source)
+    manifest = _read_manifest(zf)
+    _validate_zip_paths(zf)
+    _check_format(manifest)
+    return zf, manifest
+
+
+def diff_backups(
+    old: bytes | str | Path | None,
+    new: bytes | str | Path | None,
+    *,
+    sample_size: int = DIFF_SAMPLE_SIZE,
+) -> dict:
+    """Compare two backups, or a backup and the live database (pass None).
+
+    Both sides are streamed in primary-key order and merged, so memory stays
+    bounded by the sample size rather than the archive size. Counts describe
+    going from ``old`` to ``new``: restoring backup B over the live database
+    is ``diff_backups(None, B)``. Archives written before rows were stored in
+    primary-key order are sorted per table in memory instead.
+    """
+    from app import db
+
+    if old is None and new is None:
+        raise BackupError("At least one side of the diff must be a backup")
+
+    old_zf, old_manifest = _open_diff_side(old)
+    new_zf, new_manifest = _open_diff_side(new)
+    try:
+        tables: dict[str, dict] = {}
+        for table in db.metadata.sorted_tables:
+            pk_names = [c.name for c in table.primary_key.columns]
+            sides = []
+            for zf, manifest in ((old_zf, old_manifest), (new_zf, new_manifest)):
+                if zf is None:
+                    sides.append(_live_row_source(table))
+                else:
+                    sides.append(_archive_row_source(zf, manifest, table.name))
+            try:
+                result = _merge_diff(sides[0](), sides[1](), pk_names, sample_size)
+            except _UnorderedRows:
+                def key(row):
+                    return tuple(row.get(n) for n in pk_names)
+                result = _merge_diff(
+                    sorted(sides[0](), key=key), sorted(sides[1](), key=key),
+                    pk_names, sample_size,
+                )
+            tables[table.name] = result
+    finally:
+        for zf in (old_zf, new_zf):
+            if zf is not None:
+                zf.close()
+
+    return {
+        "tables": tables,
+        "inserted": sum(t["inserted"] for t in tables.values()),
+        "deleted": sum(t["deleted"] for t in tables.values()),
+        "changed": sum(t["changed"] for t in tables.values()),
+    }
+
+
 def _decode_row(row: dict, table) -> dict:
     out = {}
     for col in table.columns:
@@ -294,17 +807,190 @@ def _invalidate_sessions() -> None:
         pass
 
 
+# ---------------------------------------------------------------------------
+# Pre-restore snapshot store
+#
+# Snapshots are content-addressed: each table is split into chunks of rows
+# (bucketed by primary key, so an edit only changes its own bucket), every
+# chunk is stored once under chunks/<sha[:2]>/<sha>, and a snapshot is just a
+# small JSON manifest listing the chunk hashes per table. Unchanged chunks
+# are shared between snapshots, so keeping many restore points costs little
+# more disk than keeping one.
+# ---------------------------------------------------------------------------
+
+import zlib
+
+SNAPSHOT_CHUNK_ROWS = 500
+
+
+def _chunk_key_column(table):
+    """Return the single integer PK column used to bucket rows, if any."""
+    pk_cols = list(table.primary_key.columns)
+    if len(pk_cols) != 1:
+        return None
+    try:
+        if pk_cols[0].type.python_type is int:
+            return pk_cols[0]
+    except NotImplementedError:
+        pass
+    return None
+
+
+def _chunk_path(digest: str) -> Path:
+    return SNAPSHOT_DIR / "chunks" / digest[:2] / digest
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def _store_chunk(rows: list[dict]) -> str:
+    """Store a chunk of encoded rows if it isn't already present. Returns its hash."""
+    payload = json.dumps(rows, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    path = _chunk_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, zlib.compress(payload, 6))
+    return digest
+
+
+def _load_chunk(digest: str) -> list[dict]:
+    path = _chunk_path(digest)
+    try:
+        payload = zlib.decompress(path.read_bytes())
+    except FileNotFoundError as exc:
+        raise BackupError(f"Snapshot chunk {digest} is missing") from exc
+    if hashlib.sha256(payload).hexdigest() != digest:
+        raise BackupError(f"Snapshot chunk {digest} is corrupt")
+    return json.loads(payload)
+
+
+def _snapshot_table_chunks(table) -> tuple[list[str], int]:
+    from app import db
+
+    key_col = _chunk_key_column(table)
+    stmt = table.select()
+    if key_col is not None:
+        stmt = stmt.order_by(key_col)
+    result = db.session.execute(stmt.execution_options(yield_per=1000)).mappings()
+
+    digests: list[str] = []
+    pending: list[dict] = []
+    bucket = None
+    count = 0
+    for row in result:
+        key = (row[key_col.name] if key_col is not None else count) // SNAPSHOT_CHUNK_ROWS
+        if pending and key != bucket:
+            digests.append(_store_chunk(pending))
+            pending = []
+        bucket = key
+        pending.append({k: encode_value(v) for k, v in dict(row).items()})
+        count += 1
+    if pending:
+        digests.append(_store_chunk(pending))
+    return digests, count
+
+
 def _write_pre_restore_snapshot() -> Path:
+    """Snapshot the current database into the chunk store. Returns the manifest path."""
+    from app import db
+
     SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
-    snapshot_bytes = make_backup()
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
-    path = SNAPSHOT_DIR / f"pre-restore-{timestamp}.zip"
-    path.write_bytes(snapshot_bytes)
+    tables = []
+    for table in db.metadata.sorted_tables:
+        digests, count = _snapshot_table_chunks(table)
+        tables.append({"name": table.name, "rows": count, "chunks": digests})
+
+    now = datetime.now(timezone.utc)
+    manifest = {
+        "format_version": 1,
+        "kind": "snapshot",
+        "created_at": now.isoformat(),
+        "alembic_version": _alembic_head(),
+        "tables": tables,
+    }
+    path = SNAPSHOT_DIR / f"pre-restore-{now.strftime('%Y%m%dT%H%M%S%fZ')}.json"
+    _write_atomic(path, json.dumps(manifest, indent=2).encode("utf-8"))
+
+    _prune_snapshots()
+    return path
+
+
+def _snapshot_paths() -> list[Path]:
+    """Snapshot files, oldest first.
 
-    snapshots = sorted(SNAPSHOT_DIR.glob("pre-restore-*.zip"))
+    Chunked manifests (``.json``) plus any whole-zip snapshots (``.zip``)
+    written before the chunk store existed; both share one retention.
+    """
+    paths = [*SNAPSHOT_DIR.glob("pre-restore-*.json"), *SNAPSHOT_DIR.glob("pre-restore-*.zip")]
+    return sorted(paths, key=lambda p: p.stem)
+
+
+def _prune_snapshots() -> None:
+    """Apply SNAPSHOT_RETENTION, then delete chunks no snapshot references."""
+    snapshots = _snapshot_paths()
     for old in snapshots[:-SNAPSHOT_RETENTION]:
         old.unlink()
-    return path
+
+    referenced: set[str] = set()
+    for path in SNAPSHOT_DIR.glob("pre-restore-*.json"):
+        for entry in json.loads(path.read_text())["tables"]:
+            referenced.update(entry["chunks"])
+    for chunk in (SNAPSHOT_DIR / "chunks").glob("*/*"):
+        if chunk.name not in referenced:
+            chunk.unlink()
+
+
+def _snapshot_manifest(path: Path) -> dict:
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            return json.loads(zf.read("manifest.json"))
+    return json.loads(path.read_text())
+
+
+def list_snapshots() -> list[dict]:
+    """Return pre-restore snapshots, newest first."""
+    if not SNAPSHOT_DIR.is_dir():
+        return []
+    out = []
+    for path in reversed(_snapshot_paths()):
+        manifest = _snapshot_manifest(path)
+        out.append({
+            "name": path.stem,
+            "path": str(path),
+            "created_at": manifest["created_at"],
+            "rows": sum(t["rows"] for t in manifest["tables"]),
+        })
+    return out
+
+
+def snapshot_to_backup(name: str) -> bytes:
+    """Reassemble a stored snapshot into a regular, restorable backup zip."""
+    path = SNAPSHOT_DIR / f"{Path(name).stem}.json"
+    if not VALID_SNAPSHOT_NAME.match(path.stem):
+        raise BackupError(f"No snapshot named {name!r}")
+    if not path.is_file():
+        legacy = path.with_suffix(".zip")
+        if legacy.is_file():
+            return legacy.read_bytes()
+        raise BackupError(f"No snapshot named {name!r}")
+    manifest = json.loads(path.read_text())
+
+    table_rows = []
+    for entry in manifest["tables"]:
+        rows: list[dict] = []
+        for digest in entry["chunks"]:
+            rows.extend(_load_chunk(digest))
+        table_rows.append((entry["name"], rows))
+
+    return _pack_backup(
+        table_rows,
+        created_at=manifest["created_at"],
+        alembic_version=manifest["alembic_version"],
+    )
 
 
 import os
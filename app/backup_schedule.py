@@ -0,0 +1,330 @@
+"""Scheduled backups: local rotated archive plus a retrying send outbox.
+
+`flask backup schedule` runs this loop outside the web process. Each pass
+writes a new archive when the cadence is due (or when an admin asked for
+one), rotates old archives, queues the new archive in the outbox, and then
+tries to deliver every outbox entry whose retry time has come.
+
+Archives are files on the worker's own disk:
+
+    archive/   candy_dash_backup_<YYYY-mm-dd_HHMMSS>.zip
+
+Everything the web app needs to see lives in the database, since the
+worker usually runs in a separate container: the outbox (BackupDelivery
+rows: attempts, next retry, last error) and the worker's heartbeat and
+pending "email now" request (the WorkerState row named WORKER_NAME). The
+admin page only hands a backup to the worker while its heartbeat is
+recent; otherwise it builds and sends the backup itself.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import func
+
+from app import db
+from app.backup import BackupError, email_backup, make_backup
+from app.models import BackupDelivery, WorkerState
+
+log = logging.getLogger(__name__)
+
+BACKUP_ROOT = Path("instance") / "backups"
+ARCHIVE_PREFIX = "candy_dash_backup_"
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H%M%S"
+WORKER_NAME = "backup"
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.environ.get(key, default))
+    except ValueError:
+        return default
+
+
+def archive_dir() -> Path:
+    return Path(os.environ.get("BACKUP_ARCHIVE_DIR") or BACKUP_ROOT / "archive")
+
+
+def interval() -> timedelta:
+    return timedelta(hours=_env_int("BACKUP_INTERVAL_HOURS", 24))
+
+
+def archive_retention() -> int:
+    return max(_env_int("BACKUP_ARCHIVE_RETENTION", 14), 1)
+
+
+def max_attempts() -> int:
+    return max(_env_int("BACKUP_MAX_ATTEMPTS", 6), 1)
+
+
+def worker_timeout() -> timedelta:
+    """How long after its last pass the worker still counts as running.
+
+    Keep it above the scheduler's --poll interval.
+    """
+    return timedelta(seconds=_env_int("BACKUP_WORKER_TIMEOUT_SECONDS", 300))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff: 1, 2, 4, ... minutes, capped at six hours."""
+    base = _env_int("BACKUP_RETRY_BASE_SECONDS", 60)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 6 * 60 * 60))
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+class ResendTransport:
+    """Email the archive via Resend (BACKUP_EMAIL_TO recipients)."""
+
+    name = "resend"
+
+    def send(self, archive: Path) -> str:
+        return email_backup(archive.read_bytes())
+
+
+class FilesystemTransport:
+    """Copy the archive into a directory. Stand-in for email in tests and dev."""
+
+    name = "filesystem"
+
+    def __init__(self, directory: str | Path | None = None):
+        self.directory = Path(
+            directory or os.environ.get("BACKUP_TRANSPORT_DIR") or BACKUP_ROOT / "sent"
+        )
+
+    def send(self, archive: Path) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self.directory / archive.name
+        shutil.copyfile(archive, target)
+        return str(target)
+
+
+TRANSPORTS = {
+    ResendTransport.name: ResendTransport,
+    FilesystemTransport.name: FilesystemTransport,
+}
+
+
+def get_transport(name: str | None = None):
+    """Build the transport named by ``name`` or BACKUP_TRANSPORT (default resend)."""
+    name = name or os.environ.get("BACKUP_TRANSPORT", ResendTransport.name)
+    try:
+        return TRANSPORTS[name]()
+    except KeyError:
+        raise BackupError(
+            f"Unknown backup transport {name!r}; choose one of {', '.join(sorted(TRANSPORTS))}"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Archive
+# ---------------------------------------------------------------------------
+
+def _archive_time(path: Path) -> datetime | None:
+    try:
+        stamp = path.stem[len(ARCHIVE_PREFIX):]
+        return datetime.strptime(stamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def list_archives() -> list[Path]:
+    """Archived backups, oldest first."""
+    directory = archive_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(
+        p for p in directory.glob(f"{ARCHIVE_PREFIX}*.zip") if _archive_time(p) is not None
+    )
+
+
+def _utc(value: datetime | None) -> datetime | None:
+    # Naive values come back from columns that don't keep the offset
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def last_archive_time() -> datetime | None:
+    return _utc(db.session.query(func.max(BackupDelivery.created_at)).scalar())
+
+
+def write_archive(now: datetime) -> Path:
+    """Build a backup into the archive directory and rotate old ones. Does not commit."""
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{ARCHIVE_PREFIX}{now.strftime(TIMESTAMP_FORMAT)}.zip"
+    tmp = path.with_suffix(".zip.tmp")
+    tmp.write_bytes(make_backup())
+    tmp.replace(path)
+
+    queued = {
+        archive for (archive,) in
+        db.session.query(BackupDelivery.archive).filter(BackupDelivery.status == "pending")
+    }
+    for old in list_archives()[:-archive_retention()]:
+        if str(old) in queued:
+            continue  # still waiting to be delivered
+        old.unlink()
+        BackupDelivery.query.filter(BackupDelivery.archive == str(old)).delete(
+            synchronize_session="fetch"
+        )
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Outbox
+# ---------------------------------------------------------------------------
+
+def enqueue(archive: Path, now: datetime) -> BackupDelivery:
+    """Queue an archive for delivery on the next outbox drain. Does not commit."""
+    delivery = BackupDelivery(archive=str(archive), status="pending", attempts=0,
+                              next_attempt_at=now, created_at=now)
+    db.session.add(delivery)
+    return delivery
+
+
+def drain_outbox(transport, now: datetime) -> dict:
+    """Try every due outbox entry once. Commits. Returns sent/retrying/failed counts."""
+    summary = {"sent": 0, "retrying": 0, "failed": 0}
+    due = (
+        BackupDelivery.query
+        .filter(BackupDelivery.status == "pending", BackupDelivery.next_attempt_at <= now)
+        .order_by(BackupDelivery.id)
+        .all()
+    )
+    for entry in due:
+        archive = Path(entry.archive)
+        try:
+            if not archive.exists():
+                raise BackupError(f"{archive} no longer exists")
+            ref = transport.send(archive)
+        except Exception as exc:
+            entry.attempts += 1
+            entry.last_error = str(exc)
+            if entry.attempts >= max_attempts():
+                entry.status = "failed"
+                entry.next_attempt_at = None
+                summary["failed"] += 1
+                log.error("Backup %s not delivered after %d attempts: %s",
+                          archive.name, entry.attempts, exc)
+            else:
+                entry.next_attempt_at = now + retry_delay(entry.attempts)
+                summary["retrying"] += 1
+                log.warning("Backup %s delivery failed (attempt %d), retrying at %s: %s",
+                            archive.name, entry.attempts, entry.next_attempt_at.isoformat(), exc)
+        else:
+            entry.status = "sent"
+            entry.sent_at = now
+            entry.next_attempt_at = None
+            entry.last_error = None
+            summary["sent"] += 1
+            log.info("Backup %s delivered via %s: %s", archive.name, transport.name, ref)
+        db.session.commit()
+    return summary
+
+
+def next_retry_time() -> datetime | None:
+    return _utc(
+        db.session.query(func.min(BackupDelivery.next_attempt_at))
+        .filter(BackupDelivery.status == "pending")
+        .scalar()
+    )
+
+
+# ---------------------------------------------------------------------------
+# Worker state
+# ---------------------------------------------------------------------------
+
+def _worker_state() -> WorkerState:
+    state = db.session.get(WorkerState, WORKER_NAME)
+    if state is None:
+        state = WorkerState(name=WORKER_NAME)
+        db.session.add(state)
+    return state
+
+
+def worker_last_seen() -> datetime | None:
+    state = db.session.get(WorkerState, WORKER_NAME)
+    return _utc(state.last_seen_at) if state else None
+
+
+def worker_alive(now: datetime | None = None) -> bool:
+    """Whether `flask backup schedule` has made a pass recently."""
+    now = now or datetime.now(timezone.utc)
+    seen = worker_last_seen()
+    return seen is not None and now - seen <= worker_timeout()
+
+
+def outbox_status() -> dict:
+    """Counts for the admin page."""
+    counts = dict(
+        db.session.query(BackupDelivery.status, func.count(BackupDelivery.id))
+        .group_by(BackupDelivery.status)
+    )
+    state = db.session.get(WorkerState, WORKER_NAME)
+    return {
+        "pending": counts.get("pending", 0),
+        "failed": counts.get("failed", 0),
+        "requested": bool(state and state.requested_at),
+        "last_archive": last_archive_time(),
+        "worker_seen": _utc(state.last_seen_at) if state else None,
+        "worker_alive": worker_alive(),
+    }
+
+
+def request_backup(now: datetime | None = None) -> None:
+    """Ask the scheduler to take a backup on its next pass. Does not commit."""
+    _worker_state().requested_at = now or datetime.now(timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Scheduler pass
+# ---------------------------------------------------------------------------
+
+def run_pending(transport, now: datetime | None = None) -> dict:
+    """One scheduler pass: archive if due or requested, then drain the outbox. Commits."""
+    now = now or datetime.now(timezone.utc)
+    state = _worker_state()
+    state.last_seen_at = now
+    requested = state.requested_at
+    last = last_archive_time()
+    db.session.commit()
+
+    archived = None
+    if requested is not None or last is None or now - last >= interval():
+        archived = write_archive(now)
+        enqueue(archived, now)
+        if requested is not None:
+            # Clear only the request this archive served; one made while it
+            # was being built stays for the next pass.
+            table = WorkerState.__table__
+            db.session.execute(
+                table.update()
+                .where(table.c.name == WORKER_NAME, table.c.requested_at == requested)
+                .values(requested_at=None)
+            )
+        db.session.commit()
+
+    summary = drain_outbox(transport, now)
+    return {"archived": str(archived) if archived else None, **summary}
+
+
+def seconds_until_next_run(now: datetime | None = None, poll_seconds: int = 60) -> float:
+    """Time to sleep before the next pass; never longer than ``poll_seconds``."""
+    now = now or datetime.now(timezone.utc)
+    candidates = [now + timedelta(seconds=poll_seconds)]
+    last = last_archive_time()
+    if last is not None:
+        candidates.append(last + interval())
+    retry = next_retry_time()
+    if retry is not None:
+        candidates.append(retry)
+    return max((min(candidates) - now).total_seconds(), 1.0)
@@ -0,0 +1,117 @@
+"""Per-customer visit cadence, maintained as stops are completed.
+
+A customer's visits are the distinct dates of their completed route stops.
+``customer_cadence`` holds, per customer, the mean and median gap between
+visits, the last RECENT_INTERVALS gaps and the date the next visit is due
+(last visit plus the median of the recent gaps, so a store that moved from
+monthly to fortnightly is judged on its current rhythm).
+
+A flush listener notices completed stops being added, removed, uncompleted
+or moved and refreshes only the customers involved, inside the same
+transaction. An empty table is filled on app start (app.init_db), so an
+upgraded database starts out populated; ``flask route cadence-rebuild``
+recomputes every row, e.g. after bulk-editing stops outside the ORM.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+from statistics import mean, median
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.attention import queue_rescore
+from app.models import CustomerCadence, RouteStop
+
+# Gaps kept per customer, and used for the expected next visit
+RECENT_INTERVALS = 8
+
+
+def cadence_stats(visits: list[date]) -> dict | None:
+    """Cadence columns for a customer's visit dates, or None if there are none."""
+    visits = sorted(set(visits))
+    if not visits:
+        return None
+    gaps = [(b - a).days for a, b in zip(visits, visits[1:])]
+    recent = gaps[-RECENT_INTERVALS:]
+    return {
+        "visit_count": len(visits),
+        "first_visit": visits[0],
+        "last_visit": visits[-1],
+        "mean_interval": round(mean(gaps), 2) if gaps else None,
+        "median_interval": float(median(gaps)) if gaps else None,
+        "recent_intervals": json.dumps(recent),
+        "expected_next": visits[-1] + timedelta(days=round(median(recent))) if recent else None,
+    }
+
+
+def refresh(session, customer_ids) -> None:
+    """Recompute the cadence rows of ``customer_ids`` from their stops. Does not commit."""
+    ids = sorted({c for c in customer_ids if c is not None})
+    if not ids:
+        return
+    table = CustomerCadence.__table__
+    stops = RouteStop.__table__
+    visits = session.execute(
+        sa.select(stops.c.customer_id, stops.c.route_date)
+        .where(stops.c.customer_id.in_(ids), stops.c.completed.is_(True))
+        .distinct()
+        .order_by(stops.c.customer_id, stops.c.route_date)
+    )
+    now = datetime.now(timezone.utc)
+    rows = []
+    for customer_id, group in groupby(visits, key=lambda r: r.customer_id):
+        stats = cadence_stats([r.route_date for r in group])
+        rows.append({"customer_id": customer_id, "updated_at": now, **stats})
+    session.execute(table.delete().where(table.c.customer_id.in_(ids)))
+    if rows:
+        session.execute(table.insert(), rows)
+
+
+def rebuild(session) -> int:
+    """Recompute every customer's cadence. Does not commit. Returns rows written."""
+    session.execute(CustomerCadence.__table__.delete())
+    ids = [c for (c,) in session.execute(
+        sa.select(RouteStop.customer_id).where(RouteStop.completed.is_(True)).distinct()
+    )]
+    for start in range(0, len(ids), 500):
+        refresh(session, ids[start:start + 500])
+    return len(ids)
+
+
+def _collect_cadence_changes(session, flush_context, instances) -> None:
+    # Before the flush, while deleted or expired stops can still be loaded;
+    # ids are read after it, once new stops have their customer_id set.
+    stops, previous = [], set()
+    for obj in session.new:
+        if isinstance(obj, RouteStop) and obj.completed:
+            stops.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, RouteStop):
+            previous.add(obj.customer_id)
+    for obj in session.dirty:
+        if not isinstance(obj, RouteStop):
+            continue
+        state = sa.inspect(obj)
+        if any(state.attrs[a].history.has_changes() for a in ("completed", "route_date", "customer_id")):
+            stops.append(obj)
+            previous.update(state.attrs.customer_id.history.deleted)
+    session.info["cadence_changes"] = (stops, previous)
+
+
+def _refresh_cadence(session, flush_context) -> None:
+    stops, previous = session.info.pop("cadence_changes", ((), ()))
+    customers = {*previous, *(stop.customer_id for stop in stops)}
+    if customers:
+        refresh(session, customers)
+        queue_rescore(session, customers)
+
+
+def register_cadence_tracking() -> None:
+    if not event.contains(Session, "before_flush", _collect_cadence_changes):
+        event.listen(Session, "before_flush", _collect_cadence_changes)
+        event.listen(Session, "after_flush", _refresh_cadence)
@@ -13,6 +13,10 @@ from app.mail import MailError, send_email
 def register_cli(app: Flask) -> None:
     app.cli.add_command(_mail_group)
     app.cli.add_command(_backup_group)
+    app.cli.add_command(_recurring_group)
+    app.cli.add_command(_geo_group)
+    app.cli.add_command(_pdf_group)
+    app.cli.add_command(_route_group)
 
 
 _mail_group = AppGroup("mail", help="Email utilities.")
@@ -62,13 +66,29 @@ def backup_now(no_email: bool, out: str | None) -> None:
 @_backup_group.command("restore")
 @click.argument("path", type=click.Path(exists=True, dir_okay=False))
 @click.option("--confirm", required=True, help="Type RESTORE to proceed.")
-def backup_restore(path: str, confirm: str) -> None:
-    """Restore the database from a backup zip. Destructive."""
-    from app.backup import BackupError, restore_backup
+@click.option("--table", "tables", multiple=True,
+              help="Only upsert this table's rows (repeatable). Other data is left alone.")
+@click.option("--customer", "customer_id", type=int, default=None,
+              help="Only upsert rows belonging to this customer id.")
+def backup_restore(path: str, confirm: str, tables: tuple[str, ...], customer_id: int | None) -> None:
+    """Restore the database from a backup zip. Destructive unless --table/--customer is given."""
+    from app.backup import BackupError, restore_backup, restore_selective
 
     if confirm != "RESTORE":
         raise click.UsageError("--confirm must be exactly RESTORE (uppercase).")
 
+    if tables or customer_id is not None:
+        try:
+            result = restore_selective(path, tables=list(tables) or None, customer_id=customer_id)
+        except BackupError as exc:
+            raise click.ClickException(str(exc))
+        detail = ", ".join(f"{name}: {n:,}" for name, n in result["tables"].items())
+        click.echo(
+            f"Upserted {result['rows']:,} rows ({detail}). "
+            f"Snapshot saved at {result['snapshot']}"
+        )
+        return
+
     zip_bytes = Path(path).read_bytes()
     try:
         result = restore_backup(zip_bytes)
@@ -79,3 +99,383 @@ def backup_restore(path: str, confirm: str) -> None:
         f"Restored {result['rows']:,} rows across {result['tables']} tables. "
         f"Snapshot saved at {result['snapshot']}"
     )
+
+
+@_backup_group.command("verify")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def backup_verify(path: str) -> None:
+    """Check a backup zip's checksums and structure without touching the DB."""
+    from app.backup import BackupError, verify_backup
+
+    try:
+        result = verify_backup(path)
+    except BackupError as exc:
+        raise click.ClickException(str(exc))
+
+    click.echo(
+        f"OK: {result['rows']:,} rows across {result['tables']} tables verified "
+        f"({result['checksums']} checksums matched)."
+    )
+
+
+@_backup_group.command("snapshots")
+def backup_snapshots() -> None:
+    """List the pre-restore snapshots kept in the snapshot store."""
+    from app.backup import list_snapshots
+
+    snapshots = list_snapshots()
+    if not snapshots:
+        click.echo("No snapshots.")
+        return
+    for snap in snapshots:
+        click.echo(f"{snap['name']}  {snap['created_at']}  {snap['rows']:,} rows")
+
+
+@_backup_group.command("export-snapshot")
+@click.argument("name")
+@click.option("--out", required=True, type=click.Path(), help="Write the backup zip here.")
+def backup_export_snapshot(name: str, out: str) -> None:
+    """Rebuild a pre-restore snapshot as a normal backup zip."""
+    from app.backup import BackupError, snapshot_to_backup
+
+    try:
+        zip_bytes = snapshot_to_backup(name)
+    except BackupError as exc:
+        raise click.ClickException(str(exc))
+    Path(out).write_bytes(zip_bytes)
+    click.echo(f"Wrote {out} ({len(zip_bytes):,} bytes)")
+
+
+@_backup_group.command("diff")
+@click.argument("old", type=click.Path(exists=True, dir_okay=False))
+@click.argument("new", required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option("--samples", default=3, show_default=True, help="Sample rows to show per change type.")
+def backup_diff(old: str, new: str | None, samples: int) -> None:
+    """Show what changes between OLD and NEW backups.
+
+    With one archive, show what restoring it would change in the live database.
+    """
+    import json as _json
+
+    from app.backup import BackupError, diff_backups
+
+    try:
+        if new is None:
+            result = diff_backups(None, old, sample_size=samples)
+            click.echo(f"live database -> {old}")
+        else:
+            result = diff_backups(old, new, sample_size=samples)
+            click.echo(f"{old} -> {new}")
+    except BackupError as exc:
+        raise click.ClickException(str(exc))
+
+    for name, t in result["tables"].items():
+        if not (t["inserted"] or t["deleted"] or t["changed"]):
+            continue
+        click.echo(
+            f"  {name:<20} +{t['inserted']:,} inserted  -{t['deleted']:,} deleted  "
+            f"~{t['changed']:,} changed"
+        )
+        for kind in ("inserted", "deleted", "changed"):
+            for row in t["samples"][kind]:
+                click.echo(f"      {kind[0]} {_json.dumps(row, default=str)}")
+    click.echo(
+        f"Total: +{result['inserted']:,} inserted, -{result['deleted']:,} deleted, "
+        f"~{result['changed']:,} changed"
+    )
+
+
+@_backup_group.command("schedule")
+@click.option("--once", is_flag=True, help="Run a single pass and exit (for cron).")
+@click.option("--transport", default=None,
+              help="Delivery transport: resend or filesystem (defaults to BACKUP_TRANSPORT).")
+@click.option("--poll", default=60, show_default=True, help="Maximum seconds between passes.")
+def backup_schedule(once: bool, transport: str | None, poll: int) -> None:
+    """Take backups on the configured cadence and deliver them via the outbox.
+
+    Each pass also sends queued close-out emails, refreshes overdue scores
+    and tops up the recurring horizon.
+    """
+    import time
+
+    from app import db
+    from app.backup import BackupError
+    from app.backup_schedule import get_transport, run_pending, seconds_until_next_run
+    from app.attention import ensure_current
+    from app.closeout import drain_email_queue
+    from app.recurring import top_up
+
+    try:
+        sender = get_transport(transport)
+    except BackupError as exc:
+        raise click.ClickException(str(exc))
+
+    while True:
+        try:
+            result = run_pending(sender)
+        except Exception as exc:
+            if once:
+                raise click.ClickException(f"Backup pass failed: {exc}")
+            click.echo(f"Backup pass failed: {exc}", err=True)
+            result = None
+        finally:
+            db.session.remove()
+
+        if result:
+            if result["archived"]:
+                click.echo(f"Archived {result['archived']}")
+            if result["sent"] or result["retrying"] or result["failed"]:
+                click.echo(
+                    f"Outbox: {result['sent']} sent, {result['retrying']} retrying, "
+                    f"{result['failed']} failed"
+                )
+
+        # Route close-out summaries share this worker's delivery loop
+        try:
+            emails = drain_email_queue()
+        except Exception as exc:
+            click.echo(f"Close-out email pass failed: {exc}", err=True)
+        else:
+            if emails["sent"] or emails["retrying"] or emails["failed"]:
+                click.echo(
+                    f"Close-out emails: {emails['sent']} sent, {emails['retrying']} retrying, "
+                    f"{emails['failed']} failed"
+                )
+        finally:
+            db.session.remove()
+
+        # Overdue scores and the recurring horizon are kept current here once a
+        # day rather than on a read
+        try:
+            ensure_current(db.session)
+        except Exception as exc:
+            click.echo(f"Attention scoring pass failed: {exc}", err=True)
+        finally:
+            db.session.remove()
+        try:
+            topped_up = top_up()
+        except Exception as exc:
+            click.echo(f"Recurring top-up failed: {exc}", err=True)
+        else:
+            if topped_up and topped_up["created"]:
+                click.echo(f"Recurring: materialized {topped_up['created']} stop(s)")
+        finally:
+            db.session.remove()
+
+        if once:
+            if result and result["failed"]:
+                raise click.ClickException("Some backups could not be delivered.")
+            return
+        delay = seconds_until_next_run(poll_seconds=poll)
+        db.session.remove()
+        time.sleep(delay)
+
+
+_recurring_group = AppGroup("recurring", help="Recurring stop utilities.")
+
+
+@_recurring_group.command("materialize")
+@click.option("--days", type=int, default=None,
+              help="Horizon in days from today (defaults to RECURRING_HORIZON_DAYS or 28).")
+@click.option("--watch", is_flag=True, help="Keep running and materialize every --every hours.")
+@click.option("--every", default=6, show_default=True, help="Hours between passes with --watch.")
+def recurring_materialize(days: int | None, watch: bool, every: int) -> None:
+    """Create route stops for recurring schedules due within the horizon."""
+    import time
+    from datetime import date, timedelta
+
+    from app import db
+    from app.recurring import backfill_next_occurrence, horizon_days, materialize_recurring
+
+    if days is not None and days < 0:
+        raise click.UsageError("--days must be zero or more")
+    while True:
+        through = date.today() + timedelta(days=horizon_days() if days is None else days)
+        try:
+            seeded = backfill_next_occurrence()
+            result = materialize_recurring(through)
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            if not watch:
+                raise click.ClickException(f"Materialize failed: {exc}")
+            click.echo(f"Materialize failed: {exc}", err=True)
+        else:
+            if seeded:
+                click.echo(f"Initialized {seeded} schedule(s) without a next occurrence")
+            click.echo(
+                f"Materialized {result['created']} stop(s) from {result['schedules']} "
+                f"schedule(s) through {through.isoformat()}"
+            )
+        finally:
+            db.session.remove()
+        if not watch:
+            return
+        time.sleep(max(every, 1) * 60 * 60)
+
+
+_geo_group = AppGroup("geo", help="Customer coordinates and geocode cache.")
+
+
+@_geo_group.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--overwrite", is_flag=True, help="Also replace coordinates customers already have.")
+def geo_import(path: str, overwrite: bool) -> None:
+    """Merge a geocoded CSV (address,city,latitude,longitude) into the cache and apply it."""
+    from app import db
+    from app.geo import apply_cache, cache_path, import_cache
+
+    try:
+        merged = import_cache(path)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(
+        f"Cache {cache_path()}: {merged['imported']} row(s) imported, "
+        f"{merged['added']} new, {merged['total']} total"
+    )
+    applied = apply_cache(overwrite=overwrite)
+    db.session.commit()
+    click.echo(f"Located {applied['located']} customer(s); {applied['missing']} not in cache")
+
+
+@_geo_group.command("apply")
+@click.option("--overwrite", is_flag=True, help="Also replace coordinates customers already have.")
+def geo_apply(overwrite: bool) -> None:
+    """Copy cached coordinates onto customers without re-importing."""
+    from app import db
+    from app.geo import apply_cache
+
+    try:
+        applied = apply_cache(overwrite=overwrite)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    db.session.commit()
+    click.echo(f"Located {applied['located']} customer(s); {applied['missing']} not in cache")
+
+
+@_geo_group.command("missing")
+@click.option("--out", type=click.Path(dir_okay=False), default=None,
+              help="Write the CSV here instead of stdout.")
+def geo_missing(out: str | None) -> None:
+    """List customers without coordinates as a CSV ready to geocode offline."""
+    import csv
+    import sys
+
+    from app.geo import CACHE_FIELDS
+    from app.models import Customer
+
+    customers = (
+        Customer.query
+        .filter(Customer.address.isnot(None), Customer.address != "",
+                Customer.latitude.is_(None))
+        .order_by(Customer.city, Customer.name)
+        .all()
+    )
+    fp = open(out, "w", newline="", encoding="utf-8") if out else sys.stdout
+    try:
+        writer = csv.writer(fp)
+        writer.writerow(CACHE_FIELDS)
+        for c in customers:
+            writer.writerow([c.address, c.city or "", "", ""])
+    finally:
+        if out:
+            fp.close()
+    if out:
+        click.echo(f"Wrote {len(customers)} address(es) to {out}")
+
+
+
+_pdf_group = AppGroup("pdf", help="PDF rendering utilities.")
+
+
+@_pdf_group.command("bench")
+@click.option("--iterations", default=50, show_default=True, help="Renders per document type.")
+def pdf_bench(iterations: int) -> None:
+    """Report the per-document cost of each PDF renderer."""
+    from app.pdf_engine import benchmark
+
+    results = benchmark(max(iterations, 1))
+    click.echo(f"{'setup (styles, logo)':<22} {results.pop('setup')['ms']:8.1f} ms")
+    click.echo(f"{'document':<22} {'first':>8} {'warm':>8} {'size':>9}")
+    for name, r in results.items():
+        click.echo(f"{name:<22} {r['first_ms']:6.1f}ms {r['ms']:6.1f}ms {r['bytes']:>8,}B")
+
+
+_route_group = AppGroup("route", help="Daily route utilities.")
+
+
+@_route_group.command("manifest")
+@click.option("--date", "day", default=None, help="Route date, YYYY-MM-DD (defaults to tomorrow).")
+@click.option("--out", type=click.Path(), help="Also write the PDF to this path.")
+def route_manifest(day: str | None, out: str | None) -> None:
+    """Build a day's route manifest PDF into the cache, ready to print."""
+    import time
+    from datetime import date, timedelta
+
+    from app.route_manifest import manifest_pdf
+
+    try:
+        target = date.fromisoformat(day) if day else date.today() + timedelta(days=1)
+    except ValueError:
+        raise click.UsageError("--date must be YYYY-MM-DD")
+    start = time.perf_counter()
+    _, pdf = manifest_pdf(target)
+    click.echo(f"Manifest for {target.isoformat()}: {len(pdf):,} bytes in {(time.perf_counter() - start) * 1000:.0f} ms")
+    if out:
+        Path(out).write_bytes(pdf)
+        click.echo(f"Wrote {out}")
+
+
+@_route_group.command("cadence-rebuild")
+def route_cadence_rebuild() -> None:
+    """Recompute every customer's visit cadence from their completed stops."""
+    from app import db
+    from app.cadence import rebuild
+
+    count = rebuild(db.session)
+    db.session.commit()
+    click.echo(f"Rebuilt visit cadence for {count} customer(s).")
+
+
+@_route_group.command("score-attention")
+@click.option("--top", default=10, show_default=True, help="How many of the most overdue to list.")
+def route_score_attention(top: int) -> None:
+    """Recompute every active customer's overdue score and list the most overdue."""
+    from app import db
+    from app.attention import compute_scores, ranked
+
+    count = compute_scores(db.session)
+    db.session.commit()
+    click.echo(f"Scored {count} active customer(s).")
+    for row in ranked(db.session, limit=top):
+        since = "never visited" if row["days_since"] is None else f"{row['days_since']}d since visit"
+        click.echo(f"{row['score']:7.2f}  {row['name']:<30} {since}, usually every {row['expected_interval']:.0f}d")
+
+
+@_route_group.command("closeout")
+@click.option("--date", "day", default=None, help="Route date, YYYY-MM-DD (defaults to today).")
+def route_closeout(day: str | None) -> None:
+    """Close out a day's route: snapshot the summary, archive receipts, queue the email."""
+    import json
+    from datetime import date
+
+    from app import db
+    from app.closeout import close_out, current_snapshot, send_if_unattended
+
+    try:
+        target = date.fromisoformat(day) if day else date.today()
+    except ValueError:
+        raise click.UsageError("--date must be YYYY-MM-DD")
+    _, summary = current_snapshot(target)
+    if summary is not None:
+        click.echo(f"{target.isoformat()} is already closed out.")
+        return
+    closeout = close_out(target, user_id=None)
+    db.session.commit()
+    stats = json.loads(closeout.summary)
+    status = send_if_unattended(closeout)
+    click.echo(
+        f"Closed out {target.isoformat()}: {stats['completed_stops']}/{stats['total_stops']} stops, "
+        f"{stats['payment_count']} payment(s); email {status}"
+    )
+
@@ -0,0 +1,258 @@
+"""End-of-day route close-out.
+
+Closing out a date does the day's end-of-route work once:
+
+* aggregates the summary (stops done and missed, takings) and stores it as
+  a RouteCloseout snapshot that the summary page reads from then on;
+* writes the receipts ZIP to CLOSEOUT_DIR/<date>/ (default
+  instance/closeouts), which the receipts download then serves as a file;
+* builds the route manifest (kept in the PDF cache and next to the ZIP);
+* queues the summary email to CLOSEOUT_EMAIL_TO (falling back to
+  BACKUP_EMAIL_TO). ``flask backup schedule`` drains that queue with
+  backoff; while that worker isn't running, ``send_if_unattended`` sends
+  it straight away instead.
+
+If the day's own stops or payments change afterwards (a late payment, a
+stop completed or moved), the write marks the snapshot stale (see
+RouteDay.bump), views fall back to live figures, and the day can be closed
+out again. Changes elsewhere, such as a customer's phone number or a
+payment on another day, leave it alone. Checking a snapshot is one
+primary-key read.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from html import escape
+from pathlib import Path
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.mail import send_email
+from app.models import Customer, Payment, RouteCloseout, RouteStop
+from app.receipts import render_receipts, snapshot as receipt_snapshot, stream_zip
+from app.route_bundle import day_window
+from app.route_manifest import manifest_pdf
+
+log = logging.getLogger(__name__)
+
+MAX_EMAIL_ATTEMPTS = 5
+
+
+def closeout_dir() -> Path:
+    return Path(os.environ.get("CLOSEOUT_DIR") or Path("instance") / "closeouts")
+
+
+def email_recipients() -> list[str]:
+    raw = os.environ.get("CLOSEOUT_EMAIL_TO") or os.environ.get("BACKUP_EMAIL_TO", "")
+    return [r.strip() for r in raw.split(",") if r.strip()]
+
+
+def receipts_path(day: date) -> Path:
+    return closeout_dir() / day.isoformat() / f"receipts-{day.isoformat()}.zip"
+
+
+def manifest_path(day: date) -> Path:
+    return closeout_dir() / day.isoformat() / f"manifest-{day.isoformat()}.pdf"
+
+
+# ---------------------------------------------------------------------------
+# Summary
+# ---------------------------------------------------------------------------
+
+def compute_summary(day: date) -> dict:
+    """The day's route summary as plain JSON-ready data."""
+    stops = (
+        RouteStop.query
+        .options(joinedload(RouteStop.customer))
+        .join(Customer)
+        .filter(RouteStop.route_date == day)
+        .order_by(RouteStop.sequence)
+        .all()
+    )
+    start, end = day_window(day)
+    payment_count, payment_sum, sales_sum = db.session.query(
+        func.count(Payment.id),
+        func.coalesce(func.sum(Payment.amount), Decimal("0")),
+        func.coalesce(func.sum(Payment.amount_sold), Decimal("0")),
+    ).filter(
+        Payment.payment_date >= start,
+        Payment.payment_date <= end,
+    ).one()
+    return {
+        "route_date": day.isoformat(),
+        "total_stops": len(stops),
+        "completed_stops": sum(1 for s in stops if s.completed),
+        "payment_count": payment_count,
+        "payment_sum": str(Decimal(payment_sum or 0)),
+        "sales_sum": str(Decimal(sales_sum or 0)),
+        "stops": [
+            {
+                "customer_id": s.customer_id,
+                "sequence": s.sequence,
+                "completed": bool(s.completed),
+                "completed_at": s.completed_at.isoformat() if s.completed_at else None,
+                "customer": {"id": s.customer.id, "name": s.customer.name, "city": s.customer.city},
+            }
+            for s in stops
+        ],
+    }
+
+
+def current_snapshot(day: date) -> tuple[RouteCloseout | None, dict | None]:
+    """The day's close-out and its summary, or (closeout, None) if it's stale.
+
+    Returns (None, None) when the day was never closed out.
+    """
+    closeout = db.session.get(RouteCloseout, day)
+    if closeout is None:
+        return None, None
+    if closeout.stale:
+        return closeout, None
+    return closeout, json.loads(closeout.summary)
+
+
+# ---------------------------------------------------------------------------
+# Close-out
+# ---------------------------------------------------------------------------
+
+def _write_atomic(path: Path, chunks) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as fh:
+        for chunk in chunks:
+            fh.write(chunk)
+    tmp.replace(path)
+
+
+def close_out(day: date, user_id: int | None) -> RouteCloseout:
+    """Snapshot the day, write its receipts and manifest, queue the email. Does not commit.
+
+    Replaces an earlier close-out of the same day.
+    """
+    summary = compute_summary(day)
+
+    start, end = day_window(day)
+    payments = (
+        Payment.query
+        .options(joinedload(Payment.customer))
+        .filter(Payment.payment_date >= start, Payment.payment_date <= end)
+        .all()
+    )
+    zip_path = receipts_path(day)
+    if payments:
+        _write_atomic(zip_path, stream_zip(render_receipts([receipt_snapshot(p) for p in payments])))
+    else:
+        zip_path.unlink(missing_ok=True)
+    _, manifest = manifest_pdf(day)
+    _write_atomic(manifest_path(day), [manifest])
+
+    now = datetime.now(timezone.utc)
+    closeout = db.session.get(RouteCloseout, day) or RouteCloseout(route_date=day)
+    closeout.stale = False
+    closeout.summary = json.dumps(summary)
+    closeout.closed_at = now
+    closeout.closed_by = user_id
+    closeout.email_attempts = 0
+    closeout.email_error = None
+    if email_recipients():
+        closeout.email_status = "queued"
+        closeout.email_next_attempt_at = now
+    else:
+        closeout.email_status = "skipped"
+        closeout.email_next_attempt_at = None
+    db.session.add(closeout)
+    return closeout
+
+
+# ---------------------------------------------------------------------------
+# Summary email
+# ---------------------------------------------------------------------------
+
+def send_summary_email(closeout: RouteCloseout) -> str:
+    summary = json.loads(closeout.summary)
+    day = closeout.route_date
+    missed = [s["customer"]["name"] for s in summary["stops"] if not s["completed"]]
+    subject = (
+        f"[Candy Dash] Route close-out {day.isoformat()} — "
+        f"{summary['completed_stops']}/{summary['total_stops']} stops, "
+        f"${Decimal(summary['payment_sum']):,.2f} collected"
+    )
+    text = (
+        f"Route close-out for {day.strftime('%A, %B %d, %Y')}\n\n"
+        f"Stops completed: {summary['completed_stops']} of {summary['total_stops']}\n"
+        f"Payments: {summary['payment_count']}, ${Decimal(summary['payment_sum']):,.2f} collected\n"
+        f"Sales: ${Decimal(summary['sales_sum']):,.2f}\n"
+    )
+    if missed:
+        text += "\nMissed stops:\n" + "".join(f"  - {name}\n" for name in missed)
+    attachments = [
+        (path.name, path.read_bytes())
+        for path in (manifest_path(day), receipts_path(day))
+        if path.exists()
+    ]
+    return send_email(
+        to=email_recipients(),
+        subject=subject,
+        html=f"<pre style='font-family:monospace'>{escape(text)}</pre>",
+        text=text,
+        attachments=attachments,
+    )
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(minutes=min(2 ** max(attempts - 1, 0), 6 * 60))
+
+
+def send_if_unattended(closeout: RouteCloseout, send=send_summary_email) -> str:
+    """Send a queued close-out email now when no backup worker will. Commits.
+
+    Returns the close-out's email status afterwards.
+    """
+    from app.backup_schedule import worker_alive
+
+    if closeout.email_status == "queued" and not worker_alive():
+        drain_email_queue(send=send)
+    return closeout.email_status
+
+
+def drain_email_queue(now: datetime | None = None, send=send_summary_email) -> dict:
+    """Send every due queued close-out email once. Commits. Returns counts."""
+    now = now or datetime.now(timezone.utc)
+    result = {"sent": 0, "retrying": 0, "failed": 0}
+    due = (
+        RouteCloseout.query
+        .filter(RouteCloseout.email_status == "queued", RouteCloseout.email_next_attempt_at <= now)
+        .order_by(RouteCloseout.route_date)
+        .all()
+    )
+    for closeout in due:
+        try:
+            send(closeout)
+        except Exception as exc:
+            closeout.email_attempts += 1
+            closeout.email_error = str(exc)
+            if closeout.email_attempts >= MAX_EMAIL_ATTEMPTS:
+                closeout.email_status = "failed"
+                closeout.email_next_attempt_at = None
+                result["failed"] += 1
+                log.error("Close-out email for %s not sent after %d attempts: %s",
+                          closeout.route_date, closeout.email_attempts, exc)
+            else:
+                closeout.email_next_attempt_at = now + _retry_delay(closeout.email_attempts)
+                result["retrying"] += 1
+                log.warning("Close-out email for %s failed (attempt %d): %s",
+                            closeout.route_date, closeout.email_attempts, exc)
+        else:
+            closeout.email_status = "sent"
+            closeout.email_next_attempt_at = None
+            closeout.email_error = None
+            result["sent"] += 1
+        db.session.commit()
+    return result
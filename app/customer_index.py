@@ -0,0 +1,100 @@
+"""Compact index of active customers for the planner's picker.
+
+The planner needs every active customer's id, name, city and balance to
+group them by city, but not on every page load. The index is served as a
+JSON asset whose URL carries a version, so the browser keeps it until a
+customer changes:
+
+    {"version": "...", "fields": ["id", "name", "city", "balance"],
+     "rows": [[12, "Corner Store", "Salem", 14.5], ...]}
+
+The version is a digest of the customer count and the latest
+``updated_at``, which every ORM write to a customer advances (soft deletes
+and balance changes included). Built documents are kept per process by
+version. Anything not in the index (phone, customer code) is searched
+server side by ``search``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Customer
+
+# Bump when the document's shape changes
+INDEX_FORMAT = 1
+INDEX_FIELDS = ["id", "name", "city", "balance"]
+INDEX_CACHE_SIZE = 4
+SEARCH_PAGE_SIZE = 30
+
+_cache: OrderedDict[str, bytes] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def index_version() -> str:
+    count, latest = db.session.query(func.count(Customer.id), func.max(Customer.updated_at)).one()
+    payload = json.dumps([INDEX_FORMAT, count, latest], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def build_index(version: str) -> dict:
+    rows = (
+        db.session.query(Customer.id, Customer.name, Customer.city, Customer.balance)
+        .filter(Customer.status == "active")
+        .order_by(Customer.city, Customer.name)
+    )
+    return {
+        "version": version,
+        "fields": INDEX_FIELDS,
+        "rows": [[r.id, r.name, r.city or "", float(r.balance or 0)] for r in rows],
+    }
+
+
+def index_bytes(version: str) -> bytes:
+    """The serialized index for ``version`` (the current one), built once per process."""
+    with _cache_lock:
+        body = _cache.get(version)
+        if body is not None:
+            _cache.move_to_end(version)
+            return body
+    body = json.dumps(build_index(version), separators=(",", ":")).encode()
+    with _cache_lock:
+        _cache[version] = body
+        while len(_cache) > INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return body
+
+
+def search(q: str, page: int = 1, per_page: int | None = None) -> dict:
+    """Active customers matching ``q`` by name, city, phone or code, a page at a time."""
+    per_page = per_page or SEARCH_PAGE_SIZE
+    pattern = f"%{q}%"
+    page = max(page, 1)
+    rows = (
+        Customer.query
+        .filter(Customer.status == "active")
+        .filter(db.or_(
+            Customer.name.ilike(pattern),
+            Customer.city.ilike(pattern),
+            Customer.phone.ilike(pattern),
+            Customer.customer_code.ilike(pattern),
+        ))
+        .order_by(Customer.name, Customer.id)
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    return {
+        "results": [
+            {"id": c.id, "name": c.name, "city": c.city or "", "balance": float(c.balance or 0)}
+            for c in rows[:per_page]
+        ],
+        "page": page,
+        "has_more": len(rows) > per_page,
+    }
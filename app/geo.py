@@ -0,0 +1,294 @@
+"""Customer coordinates: offline geocode cache and geohash bucketing.
+
+Coordinates come from a local CSV cache rather than a live geocoding API.
+A cache row is ``address,city,latitude,longitude``, keyed on the normalized
+address and city. ``flask geo import`` merges a CSV into the cache, for
+example one exported from a batch geocoder or from a phone's saved pins.
+It then applies the cache to customers.
+
+Each located customer also stores a geohash. Customers in one geohash cell
+share its prefix, so "near this point" becomes a few indexed prefix range
+scans over the cell and its eight neighbours. Exact distances are then
+computed only for that short candidate list. A shorter prefix is the
+"area" used to cluster stops.
+"""
+
+from __future__ import annotations
+
+import csv
+import logging
+import math
+import os
+import re
+import threading
+from pathlib import Path
+
+from app import db
+from app.models import Customer
+from app.route_optimizer import haversine_km
+
+log = logging.getLogger(__name__)
+
+GEOHASH_PRECISION = 9
+AREA_PRECISION = 5  # ~4.9 km cells
+CACHE_FIELDS = ("address", "city", "latitude", "longitude")
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+KM_PER_DEGREE = 111.2
+
+# Parsed cache file per process, keyed by path and (mtime, size, inode)
+_loaded: dict[Path, tuple[tuple, dict[str, tuple[float, float]]]] = {}
+_loaded_lock = threading.Lock()
+
+
+def cache_path() -> Path:
+    return Path(os.environ.get("GEOCODE_CACHE") or Path("instance") / "geocode_cache.csv")
+
+
+# ---------------------------------------------------------------------------
+# Geohash
+# ---------------------------------------------------------------------------
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def _cell_bounds(cell: str) -> tuple[float, float, float, float]:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in cell:
+        value = _BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def geohash_neighbourhood(lat: float, lon: float, precision: int) -> set[str]:
+    """The cell containing (lat, lon) plus its eight neighbours."""
+    lat_lo, lat_hi, lon_lo, lon_hi = _cell_bounds(geohash_encode(lat, lon, precision))
+    dlat, dlon = lat_hi - lat_lo, lon_hi - lon_lo
+    cells = set()
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            nlat = min(max(lat + i * dlat, -89.999999), 89.999999)
+            nlon = (lon + j * dlon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(nlat, nlon, precision))
+    return cells
+
+
+def precision_for_radius(lat: float, lon: float, km: float) -> int:
+    """Longest prefix whose 3x3 neighbourhood around (lat, lon) covers ``km``.
+
+    Cells narrow away from the equator, so the width is measured at the point.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_lo, lat_hi, lon_lo, lon_hi = _cell_bounds(geohash_encode(lat, lon, precision))
+        height = (lat_hi - lat_lo) * KM_PER_DEGREE
+        width = (lon_hi - lon_lo) * KM_PER_DEGREE * math.cos(math.radians(lat))
+        if min(height, width) >= km:
+            return precision
+    return 1
+
+
+def _cell_range(cell: str):
+    """``geohash`` within ``cell``, as a range a plain btree index can serve.
+
+    LIKE 'cell%' only uses the index under the C collation; the bound above
+    is the next cell of the same length, found in base32 order.
+    """
+    lower = Customer.geohash >= cell
+    head = cell.rstrip(_BASE32[-1])
+    if not head:
+        return lower
+    upper = head[:-1] + _BASE32[_BASE32.index(head[-1]) + 1]
+    return db.and_(lower, Customer.geohash < upper)
+
+
+def area_key(customer: Customer) -> str | None:
+    """Coarse geohash prefix used to cluster stops by area."""
+    return customer.geohash[:AREA_PRECISION] if customer.geohash else None
+
+
+# ---------------------------------------------------------------------------
+# Customer location
+# ---------------------------------------------------------------------------
+
+def set_location(customer: Customer, lat: float | None, lon: float | None) -> None:
+    """Set (or clear) a customer's coordinates, keeping the geohash in step."""
+    if lat is None or lon is None:
+        customer.latitude = customer.longitude = customer.geohash = None
+        return
+    customer.latitude = lat
+    customer.longitude = lon
+    customer.geohash = geohash_encode(lat, lon)
+
+
+def customers_near(lat: float, lon: float, km: float, *, limit: int | None = None,
+                   exclude_id: int | None = None) -> list[tuple[Customer, float]]:
+    """Customers within ``km`` of a point, nearest first, as (customer, distance)."""
+    precision = precision_for_radius(lat, lon, km)
+    cells = geohash_neighbourhood(lat, lon, precision)
+    query = Customer.query.filter(
+        db.or_(*(_cell_range(cell) for cell in cells))
+    )
+    if exclude_id is not None:
+        query = query.filter(Customer.id != exclude_id)
+
+    hits = []
+    for c in query:
+        d = haversine_km((lat, lon), (c.latitude, c.longitude))
+        if d <= km:
+            hits.append((c, d))
+    hits.sort(key=lambda hit: hit[1])
+    return hits[:limit] if limit else hits
+
+
+# ---------------------------------------------------------------------------
+# Offline geocode cache
+# ---------------------------------------------------------------------------
+
+def normalize_address(address: str | None, city: str | None) -> str | None:
+    """Cache key: lowercased, punctuation-free "address|city", or None if blank."""
+    address = re.sub(r"[^\w\s]", " ", (address or "").lower())
+    city = re.sub(r"[^\w\s]", " ", (city or "").lower())
+    address = " ".join(address.split())
+    city = " ".join(city.split())
+    if not address:
+        return None
+    return f"{address}|{city}"
+
+
+def _read_rows(path: Path):
+    with path.open(newline="", encoding="utf-8") as fp:
+        reader = csv.DictReader(fp)
+        missing = set(CACHE_FIELDS) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path} is missing columns: {', '.join(sorted(missing))}")
+        for line, row in enumerate(reader, start=2):
+            key = normalize_address(row["address"], row["city"])
+            if key is None:
+                continue
+            try:
+                lat, lon = float(row["latitude"]), float(row["longitude"])
+            except (TypeError, ValueError):
+                raise ValueError(f"{path} line {line}: latitude/longitude must be numbers")
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"{path} line {line}: coordinates out of range")
+            yield key, row["address"].strip(), (row["city"] or "").strip(), lat, lon
+
+
+def load_cache(path: Path | None = None) -> dict[str, tuple[float, float]]:
+    """The cache file as ``{key: (lat, lon)}``, parsed again only when the file changes.
+
+    The returned dict is shared; don't modify it.
+    """
+    path = path or cache_path()
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _loaded_lock:
+        hit = _loaded.get(path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    cache = {key: (lat, lon) for key, _, _, lat, lon in _read_rows(path)}
+    with _loaded_lock:
+        _loaded[path] = (stamp, cache)
+    return cache
+
+
+def import_cache(source: str | Path) -> dict:
+    """Merge a CSV of geocoded addresses into the cache file; later rows win."""
+    target = cache_path()
+    merged = {}
+    if target.exists():
+        merged = {key: rest for key, *rest in _read_rows(target)}
+    before = len(merged)
+    imported = 0
+    for key, *rest in _read_rows(Path(source)):
+        merged[key] = rest
+        imported += 1
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(".csv.tmp")
+    with tmp.open("w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(CACHE_FIELDS)
+        for key in sorted(merged):
+            writer.writerow(merged[key])
+    tmp.replace(target)
+    return {"imported": imported, "added": len(merged) - before, "total": len(merged)}
+
+
+def apply_cache(*, overwrite: bool = False, cache: dict | None = None) -> dict:
+    """Copy cached coordinates onto customers. Does not commit.
+
+    Customers that already have coordinates are left alone unless
+    ``overwrite`` is set; customers whose address isn't cached are counted
+    as ``missing`` so they can be geocoded and imported later.
+    """
+    cache = load_cache() if cache is None else cache
+    query = Customer.query
+    if not overwrite:
+        query = query.filter(db.or_(Customer.latitude.is_(None), Customer.longitude.is_(None)))
+    located = missing = 0
+    for c in query:
+        hit = cache.get(normalize_address(c.address, c.city))
+        if hit is None:
+            missing += 1
+            continue
+        set_location(c, *hit)
+        located += 1
+    return {"located": located, "missing": missing}
+
+
+def locate_customer(customer: Customer) -> bool:
+    """Look a single customer's address up in the cache (after an address edit).
+
+    An unreadable cache file is logged and leaves the customer untouched, so
+    it can never block saving a customer.
+    """
+    try:
+        cache = load_cache()
+    except (OSError, ValueError) as exc:
+        log.warning("Geocode cache unavailable: %s", exc)
+        return False
+    hit = cache.get(normalize_address(customer.address, customer.city))
+    set_location(customer, *(hit or (None, None)))
+    return hit is not None
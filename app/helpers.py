@@ -12,11 +12,6 @@ from urllib.parse import urlparse, urljoin
 
 from flask import abort, redirect, request, url_for
 from flask_login import current_user
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
 
 
 def sanitize_csv_value(val):
@@ -77,45 +72,14 @@ def safe_redirect(target):
 
 
 def get_needs_attention(limit=5):
-    """Return customers not visited in 30+ days. Shared by dashboard and analytics."""
-    from datetime import timedelta
-    from sqlalchemy import func as sa_func
+    """Return active customers most overdue for a visit. Shared by dashboard and analytics.
+
+    Ranked by their materialized overdue score (see app.attention).
+    """
     from app import db
-    from app.models import Customer, RouteStop
+    from app.attention import ranked
 
-    today = date.today()
-    subq = (
-        db.session.query(
-            RouteStop.customer_id,
-            sa_func.max(RouteStop.route_date).label("last_visit"),
-        )
-        .filter(RouteStop.completed.is_(True))
-        .group_by(RouteStop.customer_id)
-        .subquery()
-    )
-    rows = (
-        db.session.query(
-            Customer.id, Customer.name, Customer.city,
-            Customer.balance, subq.c.last_visit,
-        )
-        .outerjoin(subq, Customer.id == subq.c.customer_id)
-        .filter(Customer.status == "active")
-        .filter(db.or_(
-            subq.c.last_visit.is_(None),
-            subq.c.last_visit < today - timedelta(days=30),
-        ))
-        .order_by(subq.c.last_visit.asc().nullsfirst())
-        .limit(limit)
-        .all()
-    )
-    return [
-        {
-            "id": r.id, "name": r.name, "city": r.city or "—",
-            "balance": float(r.balance or 0), "last_visit": r.last_visit,
-            "days_since": (today - r.last_visit).days if r.last_visit else None,
-        }
-        for r in rows
-    ]
+    return ranked(db.session, limit=limit)
 
 
 def format_currency(value):
@@ -271,74 +235,13 @@ def xlsx_response(rows, headers, filename):
 
 def pdf_table_response(rows, headers, filename, title=None):
     """Build a PDF table download using reportlab."""
-    from reportlab.lib.pagesizes import landscape
+    from app.pdf_engine import render_table  # the engine imports this module
 
-    buf = io.BytesIO()
-    ncols = len(headers)
-
-    # Use landscape for wide tables (7+ columns)
-    use_landscape = ncols > 6
-    page = landscape(letter) if use_landscape else letter
-    doc = SimpleDocTemplate(buf, pagesize=page, topMargin=0.5 * inch,
-                            leftMargin=0.4 * inch, rightMargin=0.4 * inch)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    if title:
-        title_style = ParagraphStyle("TableTitle", parent=styles["Heading1"], fontSize=16, alignment=1)
-        elements.append(Paragraph(title, title_style))
-        elements.append(Spacer(1, 0.3 * inch))
-
-    # Cell style for word-wrapping
-    cell_style = ParagraphStyle("Cell", parent=styles["Normal"], fontSize=7, leading=9)
-    header_style = ParagraphStyle("HeaderCell", parent=styles["Normal"], fontSize=7,
-                                  leading=9, fontName="Helvetica-Bold", textColor=colors.white)
-
-    # Build table data with Paragraph-wrapped cells for word-wrapping.
-    # Track raw string lengths as we go so we can size columns without
-    # re-iterating `rows` (which may be a generator that's now exhausted).
-    from xml.sax.saxutils import escape as _xml_escape
-    table_data = [[Paragraph(_xml_escape(str(h)), header_style) for h in headers]]
-    col_max_len = [len(str(h)) for h in headers]
-    sample_cap = 50  # only sample first 50 rows for width calc
-    for idx, row in enumerate(rows):
-        cells = []
-        for col_idx, cell in enumerate(row):
-            text = str(sanitize_csv_value(cell))
-            cells.append(Paragraph(_xml_escape(text), cell_style))
-            if idx < sample_cap and col_idx < ncols:
-                col_max_len[col_idx] = max(col_max_len[col_idx], len(text))
-        table_data.append(cells)
-
-    # Calculate proportional column widths based on max content length
-    usable_width = page[0] - 0.8 * inch  # page width minus margins
-    col_max_len = [max(cl, 3) for cl in col_max_len]  # minimum 3 chars wide
-
-    total_len = sum(col_max_len)
-    col_widths = [max(usable_width * (cl / total_len), 0.4 * inch) for cl in col_max_len]
-    # Scale to fit exactly
-    scale = usable_width / sum(col_widths)
-    col_widths = [w * scale for w in col_widths]
-
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#374151")),
-        ("LINEBELOW", (0, 0), (-1, 0), 1, colors.HexColor("#4b5563")),
-        ("TOPPADDING", (0, 0), (-1, -1), 3),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 3),
-        ("LEFTPADDING", (0, 0), (-1, -1), 4),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 4),
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f3f4f6")]),
-        ("VALIGN", (0, 0), (-1, -1), "TOP"),
-    ]))
-    elements.append(table)
-
-    doc.build(elements)
-    buf.seek(0)
+    pdf_bytes = render_table(rows, headers, title=title)
     safe_filename = filename.replace('"', "").replace("\r", "").replace("\n", "")
     from flask import Response
     return Response(
-        buf.getvalue(),
+        pdf_bytes,
         mimetype="application/pdf",
         headers={"Content-Disposition": f'attachment; filename="{safe_filename}"'},
     )
@@ -410,82 +313,5 @@ def generate_receipt_number(payment_date=None):
 
 def generate_receipt_pdf(payment, customer):
     """Generate a PDF receipt for a payment. Returns bytes."""
-    import os
-    from reportlab.platypus import Image
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5 * inch)
-    styles = getSampleStyleSheet()
-
-    title_style = ParagraphStyle(
-        "ReceiptTitle", parent=styles["Heading1"], fontSize=18, alignment=1
-    )
-    normal_center = ParagraphStyle(
-        "NormalCenter", parent=styles["Normal"], alignment=1
-    )
-
-    elements = []
-
-    # Logo
-    logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "img", "logo.png")
-    if os.path.exists(logo_path):
-        try:
-            logo = Image(logo_path, width=1.2 * inch, height=1.2 * inch)
-            logo.hAlign = "CENTER"
-            elements.append(logo)
-            elements.append(Spacer(1, 12))
-        except Exception:
-            pass
-
-    elements.append(Paragraph("Northern Sweet Supply", title_style))
-    elements.append(Paragraph("Payment Receipt", normal_center))
-    elements.append(Spacer(1, 0.3 * inch))
-
-    amount_sold = getattr(payment, "amount_sold", None) or Decimal("0")
-    previous_balance = payment.previous_balance if payment.previous_balance is not None else Decimal("0")
-    new_balance = max(previous_balance + amount_sold - payment.amount, Decimal("0"))
-
-    data = [
-        ["Invoice #:", payment.receipt_number],
-        ["Date:", format_date(payment.payment_date, "%B %d, %Y")],
-        ["Customer:", customer.name],
-        ["Payment Type:", (payment.payment_type or "cash").capitalize()],
-        ["", ""],
-        ["Previous Balance:", format_currency(previous_balance)],
-    ]
-    if amount_sold > 0:
-        data.append(["Sale Amount:", format_currency(amount_sold)])
-    if payment.amount > 0:
-        data.append(["Payment Amount:", format_currency(payment.amount)])
-    data.append(["New Balance:", format_currency(new_balance)])
-
-    if payment.notes:
-        from xml.sax.saxutils import escape as xml_escape
-        note_style = ParagraphStyle("NoteWrap", parent=styles["Normal"], fontSize=11)
-        data.append(["Notes:", Paragraph(xml_escape(payment.notes), note_style)])
-
-    # Find the separator row (the empty row) dynamically
-    separator_row = next(i for i, row in enumerate(data) if row == ["", ""])
-    table = Table(data, colWidths=[2.5 * inch, 4 * inch])
-    table.setStyle(TableStyle([
-        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
-        ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
-        ("FONTSIZE", (0, 0), (-1, -1), 11),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("LINEBELOW", (0, separator_row), (-1, separator_row), 1, colors.grey),
-        ("LINEBELOW", (0, -1), (-1, -1), 1, colors.grey),
-        ("LINEABOVE", (0, 0), (-1, 0), 1, colors.grey),
-    ]))
-
-    elements.append(table)
-    elements.append(Spacer(1, 0.5 * inch))
-
-    if new_balance > 0:
-        elements.append(Paragraph(f"Balance owing: {format_currency(new_balance)}. Please remit payment at your earliest convenience.", normal_center))
-    else:
-        elements.append(Paragraph("Thank you for your payment!", normal_center))
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
+    from app.pdf_engine import render_receipt  # the engine imports this module
+    return render_receipt(payment, customer)
@@ -0,0 +1,92 @@
+"""Idempotency keys for requests that move money.
+
+Clients send an ``Idempotency-Key`` header (any string up to 64 printable
+characters, typically a UUID) with a stop completion or payment, and reuse
+it when retrying. The first request stores a short JSON summary of its
+result under (user, key) in the same transaction as the payment. A retry
+finds that row with one indexed lookup and answers from it, without taking
+locks, allocating a receipt or running FIFO again.
+
+Two copies racing each other both miss the lookup, but only one can commit
+its key row: the other hits the unique constraint and rolls back whole,
+then answers from the winner's row. Rows expire after
+IDEMPOTENCY_TTL_HOURS (default 24) and are purged as new keys are stored.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from flask import request
+
+from app import db
+from app.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+DEFAULT_TTL_HOURS = 24
+
+_VALID_KEY = re.compile(r"^[\x21-\x7e]{1,64}$")
+
+
+def ttl_hours() -> int:
+    try:
+        return max(int(os.environ.get("IDEMPOTENCY_TTL_HOURS", DEFAULT_TTL_HOURS)), 1)
+    except ValueError:
+        return DEFAULT_TTL_HOURS
+
+
+def valid_key(key) -> bool:
+    return isinstance(key, str) and bool(_VALID_KEY.match(key))
+
+
+def request_key() -> str | None:
+    """The request's Idempotency-Key, or None if it didn't send one.
+
+    Raises ValueError for a malformed key.
+    """
+    key = request.headers.get(HEADER, "").strip()
+    if not key:
+        return None
+    if not valid_key(key):
+        raise ValueError(f"{HEADER} must be 1-64 printable characters.")
+    return key
+
+
+def find(key: str, user_id: int) -> dict | None:
+    """Stored result for an unexpired key, or None if it hasn't been used."""
+    row = (
+        db.session.query(IdempotencyKey.result)
+        .filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > datetime.now(timezone.utc),
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return json.loads(row.result or "{}")
+
+
+def remember(key: str, user_id: int, endpoint: str, result: dict) -> None:
+    """Store a request's result under its key. Does not commit.
+
+    Expired rows, including an old use of the same key, are cleared first.
+    Raises IntegrityError if another request stored the key meanwhile.
+    """
+    now = datetime.now(timezone.utc)
+    db.session.query(IdempotencyKey).filter(
+        IdempotencyKey.expires_at <= now
+    ).delete(synchronize_session="fetch")
+    db.session.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        result=json.dumps(result),
+        created_at=now,
+        expires_at=now + timedelta(hours=ttl_hours()),
+    ))
+    db.session.flush()
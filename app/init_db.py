@@ -90,9 +90,81 @@ def init_database():
         db.session.rollback()
         log.debug("payments.amount_sold migration skipped: %s", e)
 
+    # Add latitude/longitude columns to customers if missing
+    for column in ("latitude", "longitude"):
+        try:
+            db.session.execute(db.text(
+                f"ALTER TABLE customers ADD COLUMN {column} FLOAT"
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.debug("customers.%s migration skipped: %s", column, e)
+
+    # Add indexed geohash column to customers if missing
+    try:
+        db.session.execute(db.text(
+            "ALTER TABLE customers ADD COLUMN geohash VARCHAR(12)"
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.debug("customers.geohash migration skipped: %s", e)
+    try:
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_customers_geohash ON customers (geohash)"
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.debug("ix_customers_geohash creation skipped: %s", e)
+
+    # Add next_occurrence column to recurring_stops if missing
+    try:
+        db.session.execute(db.text(
+            "ALTER TABLE recurring_stops ADD COLUMN next_occurrence DATE"
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.debug("recurring_stops.next_occurrence migration skipped: %s", e)
+    try:
+        from app.recurring import backfill_next_occurrence
+        if backfill_next_occurrence():
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.debug("recurring_stops.next_occurrence backfill skipped: %s", e)
+
     # Create invoices, invoice_items, and notes tables if missing
     db.create_all()
 
+    # Derive visit cadence for databases that predate customer_cadence
+    try:
+        from app.cadence import rebuild
+        from app.models import CustomerCadence
+        if CustomerCadence.query.first() is None and rebuild(db.session):
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.debug("customer_cadence backfill skipped: %s", e)
+
+    # Bring overdue scores up to date; the worker keeps them current after that
+    try:
+        from app.attention import ensure_current
+        ensure_current(db.session)
+    except Exception as e:
+        db.session.rollback()
+        log.debug("attention_scores refresh skipped: %s", e)
+
+    # Fill the recurring horizon; the worker tops it up daily after that
+    try:
+        from app.recurring import top_up
+        top_up()
+    except Exception as e:
+        db.session.rollback()
+        log.debug("Recurring top-up skipped: %s", e)
+
     # Migrate old roles (sales, manager) to owner
     try:
         db.session.execute(db.text(
@@ -62,6 +62,9 @@ class Customer(db.Model):
     customer_code = db.Column(db.String(50), nullable=True, index=True)
     address = db.Column(db.String(300), nullable=True)
     city = db.Column(db.String(100), nullable=True, index=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # see app.geo
     phone = db.Column(db.String(30), nullable=True)
     notes = db.Column(db.Text, nullable=True)
     balance = db.Column(db.Numeric(10, 2), nullable=False, default=0)
@@ -75,6 +78,13 @@ class Customer(db.Model):
     payments = db.relationship("Payment", backref="customer", lazy="dynamic", order_by="Payment.payment_date.desc()")
     activity_logs = db.relationship("ActivityLog", backref="customer", lazy="dynamic", order_by="ActivityLog.created_at.desc()")
 
+    @property
+    def coordinates(self):
+        """(latitude, longitude) or None when the customer hasn't been located."""
+        if self.latitude is None or self.longitude is None:
+            return None
+        return (self.latitude, self.longitude)
+
     def __repr__(self):
         return f"<Customer {self.name}>"
 
@@ -85,6 +95,7 @@ class RouteStop(db.Model):
         db.Index("ix_route_stops_date_customer", "route_date", "customer_id"),
         db.Index("ix_route_stops_date_completed", "route_date", "completed"),
         db.Index("ix_route_stops_customer_completed", "customer_id", "completed"),
+        db.UniqueConstraint("customer_id", "route_date", name="uq_route_stops_customer_date"),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -100,6 +111,144 @@ class RouteStop(db.Model):
         return f"<RouteStop {self.customer.name if self.customer else self.customer_id} on {self.route_date}>"
 
 
+class CustomerCadence(db.Model):
+    """Visit rhythm of a customer, derived from their completed route stops.
+
+    Kept up to date by app.cadence whenever a completed stop appears,
+    disappears or moves, so readers never have to scan ``route_stops``.
+    Intervals are in days between consecutive visit dates. Customers with no
+    completed visit have no row.
+    """
+    __tablename__ = "customer_cadence"
+
+    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), primary_key=True)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+    first_visit = db.Column(db.Date, nullable=False)
+    last_visit = db.Column(db.Date, nullable=False, index=True)
+    mean_interval = db.Column(db.Float, nullable=True)
+    median_interval = db.Column(db.Float, nullable=True)
+    recent_intervals = db.Column(db.Text, nullable=False, default="[]")  # JSON, oldest first
+    expected_next = db.Column(db.Date, nullable=True, index=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    customer = db.relationship("Customer", backref=db.backref("cadence", uselist=False))
+
+    def __repr__(self):
+        return f"<CustomerCadence {self.customer_id} every {self.median_interval}d>"
+
+
+class AttentionScore(db.Model):
+    """How overdue an active customer is for a visit, materialized by app.attention.
+
+    ``overdue_ratio`` is days since the last visit over the customer's usual
+    interval; ``score`` is the excess over 1, weighted up by outstanding
+    balance and recent revenue. Rows with a positive score need a visit.
+    """
+    __tablename__ = "attention_scores"
+
+    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), primary_key=True)
+    score = db.Column(db.Float, nullable=False, index=True)
+    overdue_ratio = db.Column(db.Float, nullable=False)
+    expected_interval = db.Column(db.Float, nullable=False)
+    last_visit = db.Column(db.Date, nullable=True)
+    days_since = db.Column(db.Integer, nullable=True)  # None = never visited
+    balance = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    revenue = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    computed_on = db.Column(db.Date, nullable=False)
+
+    customer = db.relationship("Customer")
+
+    @property
+    def days_overdue(self):
+        """Days past the usual interval, or None if never visited."""
+        if self.days_since is None:
+            return None
+        return round(self.days_since - self.expected_interval)
+
+    def __repr__(self):
+        return f"<AttentionScore {self.customer_id} {self.score:.2f}>"
+
+
+class RouteDay(db.Model):
+    """Per-date change counter for a route.
+
+    ``version`` goes up by one whenever the day's stops change, so clients can
+    send back the version they edited and be refused if someone else got
+    there first. Days without a row are at version 0.
+    """
+    __tablename__ = "route_days"
+
+    route_date = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    @classmethod
+    def _ensure(cls, days):
+        rows = [{"route_date": d, "version": 0} for d in days]
+        if not rows:
+            return
+        table = cls.__table__
+        dialect = db.engine.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            db.session.execute(insert(table).on_conflict_do_nothing(index_elements=["route_date"]), rows)
+            return
+        have = {d for (d,) in db.session.query(cls.route_date).filter(cls.route_date.in_(days))}
+        missing = [r for r in rows if r["route_date"] not in have]
+        if missing:
+            db.session.execute(table.insert(), missing)
+
+    @classmethod
+    def bump(cls, days, *, closeouts: bool = True) -> None:
+        """Advance the version of every date in ``days``. Does not commit.
+
+        The days' own stops or payments changed, so their close-outs go
+        stale too, unless ``closeouts`` is False (only data shown alongside,
+        such as a customer's balance, changed).
+        """
+        days = sorted(set(days))
+        if not days:
+            return
+        cls._ensure(days)
+        table = cls.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.route_date.in_(days))
+            .values(version=table.c.version + 1, updated_at=datetime.now(timezone.utc))
+        )
+        if closeouts:
+            RouteCloseout.mark_stale(days)
+
+    @classmethod
+    def claim(cls, day, version: int) -> int | None:
+        """Advance ``day`` from ``version`` to ``version + 1``; None if it has moved on.
+
+        A conditional UPDATE, so of two writers holding the same version only
+        one matches the row. Does not commit.
+        """
+        cls._ensure([day])
+        table = cls.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.route_date == day, table.c.version == version)
+            .values(version=table.c.version + 1, updated_at=datetime.now(timezone.utc))
+        )
+        if result.rowcount != 1:
+            return None
+        RouteCloseout.mark_stale([day])
+        return version + 1
+
+    @classmethod
+    def version_of(cls, day) -> int:
+        return db.session.query(cls.version).filter(cls.route_date == day).scalar() or 0
+
+    def __repr__(self):
+        return f"<RouteDay {self.route_date} v{self.version}>"
+
+
 class Invoice(db.Model):
     __tablename__ = "invoices"
     __table_args__ = (
@@ -188,6 +337,9 @@ class Payment(db.Model):
 
 class RecurringStop(db.Model):
     __tablename__ = "recurring_stops"
+    __table_args__ = (
+        db.Index("ix_recurring_stops_active_next", "is_active", "next_occurrence"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=False, index=True)
@@ -195,6 +347,7 @@ class RecurringStop(db.Model):
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    next_occurrence = db.Column(db.Date, nullable=True)  # first date not yet materialized
     created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
@@ -296,3 +449,90 @@ class AdminAuditLog(db.Model):
 
     def __repr__(self):
         return f"<AdminAuditLog {self.action} by user {self.user_id}>"
+
+
+class IdempotencyKey(db.Model):
+    """Result of a money-moving request, kept so a retry can be answered without redoing it."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    endpoint = db.Column(db.String(64), nullable=False)
+    result = db.Column(db.Text, nullable=True)  # JSON summary of the response
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} {self.endpoint}>"
+
+
+class RouteCloseout(db.Model):
+    """End-of-day snapshot of a route date's summary.
+
+    Written once by a close-out and read by later views instead of
+    re-aggregating. ``stale`` is set as soon as the day's own stops or
+    payments change afterwards (see RouteDay.bump), so views can tell a
+    snapshot the day has moved past without re-reading the day.
+    """
+    __tablename__ = "route_closeouts"
+
+    route_date = db.Column(db.Date, primary_key=True)
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+    summary = db.Column(db.Text, nullable=False)  # JSON
+    closed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    closed_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    email_status = db.Column(db.String(20), nullable=False, default="queued")  # queued/sent/failed/skipped
+    email_attempts = db.Column(db.Integer, nullable=False, default=0)
+    email_next_attempt_at = db.Column(db.DateTime, nullable=True, index=True)
+    email_error = db.Column(db.Text, nullable=True)
+
+    closer = db.relationship("User", foreign_keys=[closed_by])
+
+    @classmethod
+    def mark_stale(cls, days=None) -> None:
+        """Flag the close-outs of ``days`` (default: every day) as stale. Does not commit."""
+        table = cls.__table__
+        stmt = table.update().where(table.c.stale.is_(False)).values(stale=True)
+        if days is not None:
+            stmt = stmt.where(table.c.route_date.in_(list(days)))
+        db.session.execute(stmt)
+
+    def __repr__(self):
+        return f"<RouteCloseout {self.route_date}>"
+
+
+class WorkerState(db.Model):
+    """Heartbeat and pending request for a background worker, by name.
+
+    The worker runs in its own process (often its own container), so the
+    web app learns whether it is alive, and asks it for work, through here.
+    """
+    __tablename__ = "worker_state"
+
+    name = db.Column(db.String(40), primary_key=True)
+    last_seen_at = db.Column(db.DateTime, nullable=True)
+    requested_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<WorkerState {self.name}>"
+
+
+class BackupDelivery(db.Model):
+    """Outbox entry for an archived backup waiting to be (or already) delivered."""
+    __tablename__ = "backup_deliveries"
+
+    id = db.Column(db.Integer, primary_key=True)
+    archive = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending/sent/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BackupDelivery {self.archive} {self.status}>"
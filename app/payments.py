@@ -0,0 +1,116 @@
+"""Recording sales and payments against a customer's balance.
+
+Shared by the customer payment form, route stop completion and the offline
+sync replay, so every path allocates receipts, writes invoices and applies
+FIFO credit the same way.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from app import db
+from app.helpers import generate_receipt_number
+from app.models import Customer, Invoice, Payment
+
+
+def record_sale(
+    customer_id: int,
+    *,
+    amount_sold: Decimal,
+    amount_paid: Decimal,
+    payment_type: str,
+    notes: str | None,
+    user_id: int | None,
+    paid_at: datetime | None = None,
+) -> dict:
+    """Apply a sale and/or payment to a customer. Does not commit.
+
+    Locks the customer row, moves the balance (clamped at zero), allocates a
+    receipt number, records the Payment, invoices any sale and marks older
+    unpaid invoices paid, oldest first, with whatever the payment has left
+    over. ``paid_at`` (default now) backdates the payment and its invoice,
+    for actions replayed after the fact.
+
+    Returns ``{"customer", "payment", "receipt_number", "previous_balance",
+    "new_balance", "overpayment"}``.
+    """
+    invoice_date = paid_at.date() if paid_at else date.today()
+    paid_at = paid_at or datetime.now(timezone.utc)
+    customer = db.session.query(Customer).filter_by(id=customer_id).with_for_update().one()
+    previous_balance = customer.balance
+
+    # Apply sale (increases balance) then payment (decreases balance)
+    new_balance = previous_balance + amount_sold - amount_paid
+    overpayment = Decimal("0")
+    if new_balance < 0:
+        overpayment = -new_balance
+        new_balance = Decimal("0")
+    customer.balance = new_balance
+
+    receipt_number = generate_receipt_number(paid_at)
+    payment = Payment(
+        customer_id=customer.id,
+        amount=amount_paid,
+        amount_sold=amount_sold,
+        payment_type=payment_type,
+        payment_date=paid_at,
+        receipt_number=receipt_number,
+        previous_balance=previous_balance,
+        notes=notes,
+        recorded_by=user_id,
+    )
+    db.session.add(payment)
+    db.session.flush()  # get payment.id for FIFO tracking
+    assert payment.id is not None, "Payment flush failed to generate ID"
+
+    # Auto-create invoice when a sale is recorded
+    if amount_sold > 0:
+        db.session.add(Invoice(
+            customer_id=customer.id,
+            invoice_number=receipt_number,
+            amount=amount_sold,
+            invoice_date=invoice_date,
+            description=notes,
+            payment_type=payment_type,
+            status="paid" if amount_paid >= amount_sold else "unpaid",
+            created_by=user_id,
+        ))
+
+    # Mark unpaid invoices as paid FIFO, only up to what this payment covers.
+    # yield_per streams rows so we stop consuming once credit is exhausted.
+    if amount_paid > 0:
+        remaining_credit = amount_paid - amount_sold  # excess beyond the current sale
+        if remaining_credit > 0:
+            unpaid_invoices = Invoice.query.filter_by(
+                customer_id=customer.id, status="unpaid"
+            ).order_by(Invoice.invoice_date.asc()).yield_per(100)
+            for inv in unpaid_invoices:
+                if inv.invoice_number == receipt_number:
+                    continue  # skip the invoice we just created above
+                if remaining_credit >= inv.amount:
+                    inv.status = "paid"
+                    inv.payment_type = payment_type
+                    inv.paid_by_payment_id = payment.id
+                    remaining_credit -= inv.amount
+                else:
+                    break
+
+    return {
+        "customer": customer,
+        "payment": payment,
+        "receipt_number": receipt_number,
+        "previous_balance": previous_balance,
+        "new_balance": new_balance,
+        "overpayment": overpayment,
+    }
+
+
+def sale_description(amount_sold: Decimal, amount_paid: Decimal) -> str:
+    parts = []
+    if amount_sold > 0:
+        parts.append(f"Sold ${amount_sold:,.2f}")
+    if amount_paid > 0:
+        parts.append(f"Paid ${amount_paid:,.2f}")
+    return ". ".join(parts)
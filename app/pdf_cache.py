@@ -0,0 +1,145 @@
+"""On-disk cache of rendered PDFs (receipts, invoices, purchase orders, manifests).
+
+A document is cached under a digest of its type, id and every field the
+PDF shows, so any change to those fields (an invoice marked paid, an item
+edited) simply produces a new key; the superseded file for that document is
+removed when the new one is stored. The digest doubles as the response's
+ETag, letting browsers revalidate without the PDF being read or rebuilt.
+
+Files live in PDF_CACHE_DIR (default instance/pdf_cache). The directory is
+kept under PDF_CACHE_MB (default 64; 0 disables caching) by evicting the
+least recently served files. Hits touch the file's mtime to mark use.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+from flask import Response, request, send_file
+
+log = logging.getLogger(__name__)
+
+# Bump when a PDF layout changes, so cached copies of the old layout miss
+RENDER_VERSION = 2
+DEFAULT_MAX_MB = 64
+
+
+def cache_dir() -> Path:
+    return Path(os.environ.get("PDF_CACHE_DIR") or Path("instance") / "pdf_cache")
+
+
+def max_bytes() -> int:
+    try:
+        return max(int(os.environ.get("PDF_CACHE_MB", DEFAULT_MAX_MB)), 0) * 1024 * 1024
+    except ValueError:
+        return DEFAULT_MAX_MB * 1024 * 1024
+
+
+def document_key(kind: str, obj_id: int | str, fields: dict) -> str:
+    """Digest of everything a document's PDF depends on."""
+    payload = json.dumps([RENDER_VERSION, kind, obj_id, fields], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _path(kind: str, obj_id: int | str, digest: str) -> Path:
+    return cache_dir() / f"{kind}-{obj_id}-{digest}.pdf"
+
+
+def get(kind: str, obj_id: int | str, digest: str) -> bytes | None:
+    path = _path(kind, obj_id, digest)
+    try:
+        data = path.read_bytes()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+
+def put(kind: str, obj_id: int | str, digest: str, data: bytes) -> None:
+    """Store a rendered PDF, drop older versions of it and trim the cache."""
+    path = _path(kind, obj_id, digest)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        for stale in path.parent.glob(f"{kind}-{obj_id}-*.pdf"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        _evict(path.parent)
+    except OSError:
+        log.warning("Could not cache %s", path, exc_info=True)
+
+
+def invalidate(kind: str, obj_id: int | str) -> None:
+    """Remove every cached version of a document."""
+    for path in cache_dir().glob(f"{kind}-{obj_id}-*.pdf"):
+        path.unlink(missing_ok=True)
+
+
+def _evict(directory: Path) -> None:
+    entries = []
+    for path in directory.glob("*.pdf"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    limit = max_bytes()
+    for _, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def cached_pdf(kind: str, obj_id: int | str, fields: dict, render: Callable[[], bytes]) -> tuple[str, bytes]:
+    """``(digest, pdf_bytes)`` for a document, rendering and storing it on a miss."""
+    digest = document_key(kind, obj_id, fields)
+    enabled = max_bytes() > 0
+    data = get(kind, obj_id, digest) if enabled else None
+    if data is None:
+        data = render()
+        if enabled:
+            put(kind, obj_id, digest, data)
+    return digest, data
+
+
+def pdf_response(
+    kind: str,
+    obj_id: int | str,
+    fields: dict,
+    render: Callable[[], bytes],
+    *,
+    download_name: str,
+    as_attachment: bool = False,
+) -> Response:
+    """Serve a document's PDF from the cache, rendering it only on a miss.
+
+    ``fields`` must hold every value the PDF shows; ``render`` builds it.
+    Answers 304 when the client already has this version.
+    """
+    digest = document_key(kind, obj_id, fields)
+    if digest in request.if_none_match:
+        response = Response(status=304)
+    else:
+        digest, data = cached_pdf(kind, obj_id, fields, render)
+        response = send_file(
+            io.BytesIO(data),
+            mimetype="application/pdf",
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=False,
+        )
+    response.set_etag(digest)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
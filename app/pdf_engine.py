@@ -0,0 +1,504 @@
+"""PDF rendering for receipts, invoices, purchase orders, route manifests and tables.
+
+Everything a document shares is prepared once per process and reused: the
+reportlab imports, the stylesheet and paragraph styles, the table styles
+and the decoded company logo. A render only lays out its own data. Call
+``preload()`` to pay the setup cost up front (the receipt worker pool does)
+instead of on the first request.
+
+Streams are written binary rather than ASCII85-encoded. reportlab's pure
+Python ASCII85 encoder was most of the cost of a logo-bearing page.
+
+``flask pdf bench`` prints the per-document cost of each renderer.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+from decimal import Decimal
+from types import SimpleNamespace
+from xml.sax.saxutils import escape as xml_escape
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from app.helpers import format_currency, format_date, sanitize_csv_value
+
+rl_config.useA85 = 0
+
+COMPANY_NAME = "Northern Sweet Supply"
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "img", "logo.png")
+
+_HEADER_BG = colors.HexColor("#374151")
+_HEADER_RULE = colors.HexColor("#4b5563")
+_STRIPE = colors.HexColor("#f3f4f6")
+
+_setup_lock = threading.Lock()
+_styles: SimpleNamespace | None = None
+_logo: ImageReader | None = None
+_logo_loaded = False
+
+
+def _build_styles() -> SimpleNamespace:
+    sheet = getSampleStyleSheet()
+    normal_center = ParagraphStyle("NormalCenter", parent=sheet["Normal"], alignment=1)
+    return SimpleNamespace(
+        sheet=sheet,
+        normal_center=normal_center,
+        company_title=ParagraphStyle("CompanyTitle", parent=sheet["Heading1"], fontSize=18, alignment=1),
+        note=ParagraphStyle("NoteWrap", parent=sheet["Normal"], fontSize=11),
+        invoice_title=ParagraphStyle("InvTitle", parent=sheet["Title"], fontSize=20, spaceAfter=6),
+        detail=ParagraphStyle("Detail", parent=sheet["Normal"], fontSize=11, spaceAfter=4),
+        void=ParagraphStyle("Void", parent=normal_center, fontSize=14, textColor=colors.red,
+                            fontName="Helvetica-Bold"),
+        total=ParagraphStyle("Total", parent=sheet["Normal"], fontSize=12, fontName="Helvetica-Bold",
+                             alignment=2),
+        table_title=ParagraphStyle("TableTitle", parent=sheet["Heading1"], fontSize=16, alignment=1),
+        cell=ParagraphStyle("Cell", parent=sheet["Normal"], fontSize=7, leading=9),
+        header_cell=ParagraphStyle("HeaderCell", parent=sheet["Normal"], fontSize=7, leading=9,
+                                   fontName="Helvetica-Bold", textColor=colors.white),
+        manifest_cell=ParagraphStyle("ManifestCell", parent=sheet["Normal"], fontSize=8, leading=10),
+    )
+
+
+def preload() -> None:
+    """Build the shared styles and decode the logo, if not done already."""
+    global _styles, _logo, _logo_loaded
+    with _setup_lock:
+        if _styles is None:
+            _styles = _build_styles()
+        if not _logo_loaded:
+            try:
+                logo = ImageReader(LOGO_PATH)
+                logo.getRGBData()  # decode now, not on first draw
+                _logo = logo
+            except Exception:
+                _logo = None
+            _logo_loaded = True
+
+
+def styles() -> SimpleNamespace:
+    if _styles is None:
+        preload()
+    return _styles
+
+
+class _Logo(Flowable):
+    """The company logo, drawn from the process-wide decoded image."""
+
+    def __init__(self, image: ImageReader, size: float):
+        super().__init__()
+        self.image = image
+        self.width = self.height = size
+        self.hAlign = "CENTER"
+
+    def wrap(self, avail_width, avail_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.image, 0, 0, self.width, self.height, mask="auto")
+
+
+def _logo_flowables(size: float, space_after: float) -> list:
+    if not _logo_loaded:
+        preload()
+    if _logo is None:
+        return []
+    return [_Logo(_logo, size), Spacer(1, space_after)]
+
+
+def _build(elements: list, pagesize=letter, **margins) -> bytes:
+    buf = io.BytesIO()
+    SimpleDocTemplate(buf, pagesize=pagesize, **margins).build(elements)
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Documents
+# ---------------------------------------------------------------------------
+
+# Label/value summary block shared by receipts and purchase orders; the empty
+# row is the separator above the totals.
+def _summary_table(data: list) -> Table:
+    separator_row = next(i for i, row in enumerate(data) if row == ["", ""])
+    table = Table(data, colWidths=[2.5 * inch, 4 * inch])
+    table.setStyle(TableStyle([
+        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+        ("FONTNAME", (1, 0), (1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 11),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+        ("TOPPADDING", (0, 0), (-1, -1), 4),
+        ("LINEBELOW", (0, separator_row), (-1, separator_row), 1, colors.grey),
+        ("LINEBELOW", (0, -1), (-1, -1), 1, colors.grey),
+        ("LINEABOVE", (0, 0), (-1, 0), 1, colors.grey),
+    ]))
+    return table
+
+
+def render_receipt(payment, customer) -> bytes:
+    """Payment receipt. ``payment`` and ``customer`` may be models or plain snapshots."""
+    st = styles()
+    elements = _logo_flowables(1.2 * inch, 12)
+    elements.append(Paragraph(COMPANY_NAME, st.company_title))
+    elements.append(Paragraph("Payment Receipt", st.normal_center))
+    elements.append(Spacer(1, 0.3 * inch))
+
+    amount_sold = getattr(payment, "amount_sold", None) or Decimal("0")
+    previous_balance = payment.previous_balance if payment.previous_balance is not None else Decimal("0")
+    new_balance = max(previous_balance + amount_sold - payment.amount, Decimal("0"))
+
+    data = [
+        ["Invoice #:", payment.receipt_number],
+        ["Date:", format_date(payment.payment_date, "%B %d, %Y")],
+        ["Customer:", customer.name],
+        ["Payment Type:", (payment.payment_type or "cash").capitalize()],
+        ["", ""],
+        ["Previous Balance:", format_currency(previous_balance)],
+    ]
+    if amount_sold > 0:
+        data.append(["Sale Amount:", format_currency(amount_sold)])
+    if payment.amount > 0:
+        data.append(["Payment Amount:", format_currency(payment.amount)])
+    data.append(["New Balance:", format_currency(new_balance)])
+    if payment.notes:
+        data.append(["Notes:", Paragraph(xml_escape(payment.notes), st.note)])
+
+    elements.append(_summary_table(data))
+    elements.append(Spacer(1, 0.5 * inch))
+
+    if new_balance > 0:
+        elements.append(Paragraph(f"Balance owing: {format_currency(new_balance)}. Please remit payment at your earliest convenience.", st.normal_center))
+    else:
+        elements.append(Paragraph("Thank you for your payment!", st.normal_center))
+
+    return _build(elements, topMargin=0.5 * inch)
+
+
+def render_invoice(invoice, customer) -> bytes:
+    """Customer invoice, itemised when it has line items."""
+    st = styles()
+    elements = _logo_flowables(1.2 * inch, 12)
+    elements.append(Paragraph("INVOICE", st.invoice_title))
+    elements.append(Spacer(1, 12))
+
+    if invoice.invoice_number:
+        elements.append(Paragraph(f"<b>Invoice #:</b> {xml_escape(invoice.invoice_number)}", st.detail))
+    elements.append(Paragraph(f"<b>Date:</b> {format_date(invoice.invoice_date, '%B %d, %Y')}", st.detail))
+    elements.append(Paragraph(f"<b>Status:</b> {invoice.status.upper()}", st.detail))
+    if invoice.payment_type:
+        elements.append(Paragraph(f"<b>Payment Type:</b> {invoice.payment_type.capitalize()}", st.detail))
+    elements.append(Spacer(1, 16))
+
+    elements.append(Paragraph("<b>Bill To:</b>", st.detail))
+    elements.append(Paragraph(xml_escape(customer.name), st.detail))
+    for line in (customer.address, customer.city, customer.phone):
+        if line:
+            elements.append(Paragraph(xml_escape(line), st.detail))
+    elements.append(Spacer(1, 20))
+
+    total = invoice.amount
+    line_items = invoice.items or []
+    if line_items:
+        data = [["Item #", "Description", "Qty", "Weight", "Unit Price", "Amount"]]
+        for item in line_items:
+            data.append([
+                item.item_number or "",
+                item.description or "",
+                f"{item.quantity:g}" if item.quantity else "",
+                item.weight or "",
+                f"${item.unit_price:,.2f}" if item.unit_price else "",
+                f"${item.amount:,.2f}",
+            ])
+        data.append(["", "", "", "", "Total:", f"${total:,.2f}"])
+
+        t = Table(data, colWidths=[0.8 * inch, 1.8 * inch, 0.6 * inch, 0.8 * inch, 1 * inch, 1 * inch], repeatRows=1)
+        t.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, -1), 10),
+            ("BACKGROUND", (0, 0), (-1, 0), _HEADER_BG),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("ALIGN", (-2, 0), (-1, -1), "RIGHT"),
+            ("ALIGN", (2, 0), (2, -1), "CENTER"),
+            ("LINEBELOW", (0, 0), (-1, 0), 1, _HEADER_RULE),
+            ("LINEABOVE", (0, -1), (-1, -1), 1, _HEADER_RULE),
+            ("FONTNAME", (-2, -1), (-1, -1), "Helvetica-Bold"),
+            ("TOPPADDING", (0, 0), (-1, -1), 6),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+        ]))
+    else:
+        # Fallback: single-line invoice (e.g. from quick sale)
+        data = [
+            ["Description", "Amount"],
+            [invoice.description or "Goods/Services", f"${invoice.amount:,.2f}"],
+            ["", ""],
+            ["Total", f"${total:,.2f}"],
+        ]
+        t = Table(data, colWidths=[4 * inch, 2 * inch])
+        t.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, -1), 11),
+            ("BACKGROUND", (0, 0), (-1, 0), _HEADER_BG),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("ALIGN", (1, 0), (1, -1), "RIGHT"),
+            ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+            ("LINEBELOW", (0, 0), (-1, 0), 1, _HEADER_RULE),
+            ("LINEABOVE", (0, -1), (-1, -1), 1, _HEADER_RULE),
+            ("TOPPADDING", (0, 0), (-1, -1), 8),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+        ]))
+
+    elements.append(t)
+    elements.append(Spacer(1, 0.5 * inch))
+
+    if invoice.status == "void":
+        elements.append(Paragraph("THIS INVOICE HAS BEEN VOIDED", st.void))
+    elif invoice.status == "unpaid":
+        elements.append(Paragraph(
+            f"Balance owing: ${total:,.2f}. Please remit payment at your earliest convenience.",
+            st.normal_center,
+        ))
+    else:
+        elements.append(Paragraph("Thank you for your payment!", st.normal_center))
+
+    return _build(elements, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+
+
+def render_purchase_order(purchase) -> bytes:
+    """Supplier purchase order; items come from the comma-separated description."""
+    st = styles()
+    elements = _logo_flowables(1.0 * inch, 8)
+    elements.append(Paragraph(COMPANY_NAME, st.company_title))
+    elements.append(Paragraph("Purchase Order", st.normal_center))
+    elements.append(Spacer(1, 0.3 * inch))
+
+    data = [
+        ["PO Number:", f"PO-{purchase.id:04d}"],
+        ["Date:", format_date(purchase.purchase_date, "%B %d, %Y")],
+        ["Supplier:", purchase.supplier],
+        ["Payment Type:", (purchase.payment_type or "cash").capitalize()],
+    ]
+    if purchase.invoice_number:
+        data.append(["Invoice #:", purchase.invoice_number])
+    data.append(["", ""])
+    data.append(["Total Amount:", format_currency(purchase.amount)])
+    elements.append(_summary_table(data))
+
+    items = [item.strip() for item in (purchase.description or "").split(",") if item.strip()]
+    if purchase.description:
+        elements.append(Spacer(1, 0.3 * inch))
+        elements.append(Paragraph("Items:", st.sheet["Heading3"]))
+        elements.append(Spacer(1, 0.1 * inch))
+    if items:
+        item_data = [["#", "Item", "Details"]]
+        for i, item in enumerate(items, 1):
+            # Try to split "2x Product Name 20x100g" into qty and name
+            parts = item.split(" ", 1)
+            if parts[0].endswith("x") and parts[0][:-1].isdigit():
+                qty = parts[0]
+                name = parts[1] if len(parts) > 1 else ""
+            else:
+                qty = ""
+                name = item
+            item_data.append([str(i), name, qty])
+
+        item_table = Table(item_data, colWidths=[0.4 * inch, 4.5 * inch, 1.5 * inch])
+        item_table.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 9),
+            ("FONTSIZE", (0, 1), (-1, -1), 9),
+            ("BACKGROUND", (0, 0), (-1, 0), _HEADER_BG),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("LINEBELOW", (0, 0), (-1, 0), 1, _HEADER_RULE),
+            ("TOPPADDING", (0, 0), (-1, -1), 4),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, _STRIPE]),
+            ("ALIGN", (0, 0), (0, -1), "CENTER"),
+            ("ALIGN", (2, 0), (2, -1), "CENTER"),
+        ]))
+        elements.append(item_table)
+
+    elements.append(Spacer(1, 0.5 * inch))
+    elements.append(Paragraph(f"Total: {format_currency(purchase.amount)}", st.total))
+
+    return _build(elements, topMargin=0.5 * inch)
+
+
+def render_table(rows, headers, title=None) -> bytes:
+    """Report table with wrapped cells; landscape when it has 7+ columns."""
+    st = styles()
+    ncols = len(headers)
+    page = landscape(letter) if ncols > 6 else letter
+    elements = []
+
+    if title:
+        elements.append(Paragraph(title, st.table_title))
+        elements.append(Spacer(1, 0.3 * inch))
+
+    # Track raw string lengths as we go so we can size columns without
+    # re-iterating `rows` (which may be a generator that's now exhausted).
+    table_data = [[Paragraph(xml_escape(str(h)), st.header_cell) for h in headers]]
+    col_max_len = [len(str(h)) for h in headers]
+    sample_cap = 50  # only sample first 50 rows for width calc
+    for idx, row in enumerate(rows):
+        cells = []
+        for col_idx, cell in enumerate(row):
+            text = str(sanitize_csv_value(cell))
+            cells.append(Paragraph(xml_escape(text), st.cell))
+            if idx < sample_cap and col_idx < ncols:
+                col_max_len[col_idx] = max(col_max_len[col_idx], len(text))
+        table_data.append(cells)
+
+    # Proportional column widths based on max content length
+    usable_width = page[0] - 0.8 * inch  # page width minus margins
+    col_max_len = [max(cl, 3) for cl in col_max_len]  # minimum 3 chars wide
+    total_len = sum(col_max_len)
+    col_widths = [max(usable_width * (cl / total_len), 0.4 * inch) for cl in col_max_len]
+    scale = usable_width / sum(col_widths)
+    col_widths = [w * scale for w in col_widths]
+
+    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), _HEADER_BG),
+        ("LINEBELOW", (0, 0), (-1, 0), 1, _HEADER_RULE),
+        ("TOPPADDING", (0, 0), (-1, -1), 3),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 3),
+        ("LEFTPADDING", (0, 0), (-1, -1), 4),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, _STRIPE]),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    elements.append(table)
+
+    return _build(elements, pagesize=page, topMargin=0.5 * inch,
+                  leftMargin=0.4 * inch, rightMargin=0.4 * inch)
+
+
+# Route manifest layout: fixed columns on landscape letter, so only the rows vary
+_MANIFEST_HEADERS = ["Done", "#", "Customer", "Address", "Phone", "Balance", "Last visit", "Last payment", "Notes"]
+_MANIFEST_WIDTHS = [w * inch for w in (0.45, 0.35, 1.8, 2.2, 1.05, 0.85, 0.8, 1.45, 1.25)]
+_MANIFEST_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("BACKGROUND", (0, 0), (-1, 0), _HEADER_BG),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+    ("LINEBELOW", (0, 0), (-1, 0), 1, _HEADER_RULE),
+    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, _STRIPE]),
+    ("ALIGN", (0, 0), (1, -1), "CENTER"),
+    ("ALIGN", (5, 0), (5, -1), "RIGHT"),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ("TOPPADDING", (0, 0), (-1, -1), 4),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ("LEFTPADDING", (0, 0), (-1, -1), 3),
+    ("RIGHTPADDING", (0, 0), (-1, -1), 3),
+    ("BOX", (0, 0), (-1, -1), 0.5, colors.grey),
+    ("LINEAFTER", (0, 0), (0, -1), 0.5, colors.grey),
+])
+
+
+def render_manifest(day, rows) -> bytes:
+    """Printable list of a day's stops (rows from ``route_manifest.manifest_rows``)."""
+    st = styles()
+    owing = sum((r.balance or Decimal("0")) for r in rows if (r.balance or 0) > 0)
+    elements = [
+        Paragraph(f"Route Manifest &mdash; {format_date(day, '%A, %B %d, %Y')}", st.table_title),
+        Paragraph(f"{len(rows)} stop{'s' if len(rows) != 1 else ''} &middot; {format_currency(owing)} owing",
+                  st.normal_center),
+        Spacer(1, 0.2 * inch),
+    ]
+
+    def para(text):
+        return Paragraph(xml_escape(text), st.manifest_cell) if text else ""
+
+    data = [_MANIFEST_HEADERS]
+    for r in rows:
+        last_payment = ""
+        if r.last_payment_date:
+            parts = []
+            if r.last_sold:
+                parts.append(f"sold {format_currency(r.last_sold)}")
+            if r.last_paid:
+                parts.append(f"paid {format_currency(r.last_paid)}")
+            last_payment = f"{', '.join(parts) or format_currency(0)} on {format_date(r.last_payment_date, '%b %d')}"
+        data.append([
+            "X" if r.completed else "",
+            str(r.sequence or ""),
+            para(r.name),
+            para(", ".join(part for part in (r.address, r.city) if part)),
+            r.phone or "",
+            format_currency(r.balance),
+            format_date(r.last_visit, "%b %d") if r.last_visit else "Never",
+            para(last_payment),
+            para(r.notes),
+        ])
+
+    table = Table(data, colWidths=_MANIFEST_WIDTHS, repeatRows=1)
+    table.setStyle(_MANIFEST_STYLE)
+    elements.append(table)
+
+    return _build(elements, pagesize=landscape(letter), topMargin=0.4 * inch, bottomMargin=0.4 * inch,
+                  leftMargin=0.4 * inch, rightMargin=0.4 * inch)
+
+
+# ---------------------------------------------------------------------------
+# Micro-benchmark
+# ---------------------------------------------------------------------------
+
+def _sample_documents() -> dict:
+    from datetime import date, datetime, timezone
+
+    customer = SimpleNamespace(name="Sample Store", address="12 Main St", city="Huntsville",
+                               phone="705-555-0100")
+    payment = SimpleNamespace(receipt_number="INV-20260101-0001", payment_date=datetime.now(timezone.utc),
+                              payment_type="cash", amount=Decimal("40"), amount_sold=Decimal("55.50"),
+                              previous_balance=Decimal("20"), notes="Left at back door")
+    items = [SimpleNamespace(item_number=f"C-{i:03d}", description=f"Candy assortment {i}", quantity=2,
+                             weight="100g", unit_price=Decimal("4.25"), amount=Decimal("8.50"))
+             for i in range(12)]
+    invoice = SimpleNamespace(invoice_number="INV-20260101-0002", invoice_date=date.today(), status="unpaid",
+                              payment_type="cash", amount=Decimal("102"), description=None, items=items)
+    purchase = SimpleNamespace(id=42, purchase_date=date.today(), supplier="Sweet Wholesale",
+                               payment_type="cheque", invoice_number="SW-991", amount=Decimal("812.40"),
+                               description="4x Gummy Bears 12x200g, 2x Mints 24x50g, Licorice")
+    rows = [[f"Customer {i}", "Huntsville", f"{i * 3.5:.2f}", "2026-01-01"] for i in range(60)]
+    stops = [SimpleNamespace(sequence=i, completed=i < 20, notes="Side door" if i % 7 == 0 else None,
+                             name=f"Customer {i}", address=f"{i} Main St", city="Huntsville",
+                             phone="705-555-0100", balance=Decimal(i * 3), last_visit=date.today(),
+                             last_paid=Decimal("40"), last_sold=Decimal("55.50"),
+                             last_payment_date=payment.payment_date)
+             for i in range(60)]
+    return {
+        "receipt": lambda: render_receipt(payment, customer),
+        "invoice": lambda: render_invoice(invoice, customer),
+        "purchase_order": lambda: render_purchase_order(purchase),
+        "table (60 rows)": lambda: render_table(rows, ["Customer", "City", "Balance", "Last visit"], "Report"),
+        "manifest (60 stops)": lambda: render_manifest(date.today(), stops),
+    }
+
+
+def benchmark(iterations: int = 50) -> dict[str, dict]:
+    """Time each renderer: setup, the first document and the warm average, in ms."""
+    import time
+
+    start = time.perf_counter()
+    preload()
+    results = {"setup": {"ms": (time.perf_counter() - start) * 1000}}
+    for name, render in _sample_documents().items():
+        start = time.perf_counter()
+        size = len(render())
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(iterations):
+            render()
+        results[name] = {
+            "first_ms": first * 1000,
+            "ms": (time.perf_counter() - start) * 1000 / max(iterations, 1),
+            "bytes": size,
+        }
+    return results
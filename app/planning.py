@@ -0,0 +1,431 @@
+"""Set-based route planning operations.
+
+These run as single SQL statements instead of loading customers and stops
+into the session, so filling a week of routes is one round trip.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import Customer, RouteDay, RouteStop
+
+# Longest date range a single bulk add may cover
+MAX_BULK_DAYS = 31
+
+
+def _days(start: date, end: date):
+    """A one-column ``day`` subquery holding every date in [start, end]."""
+    selects = [
+        sa.select(sa.literal(start + timedelta(days=i), sa.Date).label("day"))
+        for i in range((end - start).days + 1)
+    ]
+    return (sa.union_all(*selects) if len(selects) > 1 else selects[0]).subquery("days")
+
+
+def bulk_add_stops(
+    start: date,
+    end: date,
+    *,
+    cities: list[str] | None = None,
+    customer_ids: list[int] | None = None,
+    created_by: int | None = None,
+) -> dict:
+    """Put every active customer in ``cities`` (or ``customer_ids``) on each day in range.
+
+    One ``INSERT ... SELECT``: customers are crossed with the dates, pairs that
+    already have a stop are excluded in SQL, and new stops are sequenced after
+    each day's current last stop, by city then name. Does not commit.
+
+    Returns ``{"added": total, "days": {iso_date: added}}``.
+    """
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days >= MAX_BULK_DAYS:
+        raise ValueError(f"Date range is limited to {MAX_BULK_DAYS} days")
+    if not cities and not customer_ids:
+        return {"added": 0, "days": {}}
+
+    days = _days(start, end)
+    existing = aliased(RouteStop)
+    last_seq = (
+        sa.select(RouteStop.route_date, sa.func.max(RouteStop.sequence).label("max_seq"))
+        .where(RouteStop.route_date.between(start, end))
+        .group_by(RouteStop.route_date)
+        .subquery("last_seq")
+    )
+
+    chosen = []
+    if cities:
+        chosen.append(Customer.city.in_(cities))
+    if customer_ids:
+        chosen.append(Customer.id.in_(customer_ids))
+
+    rows = (
+        sa.select(
+            Customer.id,
+            days.c.day,
+            (
+                sa.func.coalesce(last_seq.c.max_seq, 0)
+                + sa.func.row_number().over(
+                    partition_by=days.c.day, order_by=(Customer.city, Customer.name, Customer.id)
+                )
+            ),
+            sa.false(),
+            sa.literal(created_by, sa.Integer),
+        )
+        .select_from(Customer)
+        .join(days, sa.true())
+        .outerjoin(last_seq, last_seq.c.route_date == days.c.day)
+        .where(
+            Customer.status == "active",
+            sa.or_(*chosen),
+            ~sa.exists().where(
+                existing.customer_id == Customer.id,
+                existing.route_date == days.c.day,
+            ),
+        )
+    )
+
+    columns = ["customer_id", "route_date", "sequence", "completed", "created_by"]
+    dialect = db.engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = (
+            insert(RouteStop.__table__)
+            .from_select(columns, rows)
+            .on_conflict_do_nothing(index_elements=["customer_id", "route_date"])
+        )
+    else:
+        stmt = sa.insert(RouteStop.__table__).from_select(columns, rows)
+
+    per_day: dict[str, int] = {}
+    if db.engine.dialect.insert_returning:
+        for (day,) in db.session.execute(stmt.returning(RouteStop.route_date)):
+            per_day[day.isoformat()] = per_day.get(day.isoformat(), 0) + 1
+        added = sum(per_day.values())
+    else:
+        added = db.session.execute(stmt).rowcount
+    if per_day:
+        RouteDay.bump(date.fromisoformat(d) for d in per_day)
+    elif added:
+        RouteDay.bump(start + timedelta(days=i) for i in range((end - start).days + 1))
+    return {"added": added, "days": per_day}
+
+
+# ---------------------------------------------------------------------------
+# Week planner
+# ---------------------------------------------------------------------------
+
+DEFAULT_DAY_CAPACITY = 25
+DEFAULT_PLAN_SECONDS = 1.0
+RECURRING_FLEX_DAYS = 1  # how far a recurring visit may move to balance the week
+
+# Cost weights: squared deviation from the mean load per day, each extra
+# area (geohash cell or city) a day has to cover, and each day a recurring
+# visit is moved from its scheduled date.
+LOAD_WEIGHT = 1.0
+AREA_WEIGHT = 4.0
+SHIFT_WEIGHT = 3.0
+
+
+def _plan_days(start: date, end: date, weekdays_only: bool) -> list[date]:
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return [d for d in days if not weekdays_only or d.weekday() < 5]
+
+
+def _area(customer: Customer) -> str:
+    from app.geo import area_key
+    return area_key(customer) or f"city:{(customer.city or '').lower()}"
+
+
+def _week_candidates(days: list[date], include_attention: bool) -> tuple[list[dict], dict]:
+    """Visits to place (recurring occurrences, overdue customers) and existing stops per day.
+
+    Existing stops are ``(customer_id, area)`` pairs.
+    """
+    from app.helpers import get_needs_attention
+    from app.recurring import projected_occurrences
+
+    start, end = days[0], days[-1]
+    existing: dict[date, list[tuple[int, str]]] = {d: [] for d in days}
+    scheduled = set()
+    for stop, customer in (
+        db.session.query(RouteStop, Customer).join(Customer)
+        .filter(RouteStop.route_date.between(start, end))
+    ):
+        scheduled.add(customer.id)
+        if stop.route_date in existing:
+            existing[stop.route_date].append((customer.id, _area(customer)))
+
+    candidates = []
+    for r, day in sorted(projected_occurrences(start, end), key=lambda o: (o[1], o[0].id)):
+        allowed = [d for d in days if abs((d - day).days) <= RECURRING_FLEX_DAYS]
+        if not allowed:
+            continue
+        candidates.append({
+            "customer_id": r.customer_id, "name": r.customer.name,
+            "city": r.customer.city or "", "area": _area(r.customer),
+            "recurring_id": r.id, "preferred": day, "allowed": allowed,
+            "reason": r.frequency_label,
+        })
+        scheduled.add(r.customer_id)
+
+    if include_attention:
+        overdue = [a for a in get_needs_attention(limit=None) if a["id"] not in scheduled]
+        customers = {c.id: c for c in Customer.query.filter(
+            Customer.id.in_([a["id"] for a in overdue]))} if overdue else {}
+        for a in overdue:
+            c = customers[a["id"]]
+            candidates.append({
+                "customer_id": c.id, "name": c.name, "city": c.city or "",
+                "area": _area(c), "recurring_id": None, "preferred": None,
+                "allowed": list(days),
+                "reason": f"{a['days_since']} days since visit" if a["days_since"] else "never visited",
+            })
+    return candidates, existing
+
+
+class _WeekState:
+    """Per-day load and area counts; a day's cost is cheap to recompute.
+
+    ``visits`` holds the (customer_id, day) pairs already taken, so no
+    customer is put on a day twice.
+    """
+
+    def __init__(self, days, existing, total):
+        self.load = {d: len(existing[d]) for d in days}
+        self.areas = {d: {} for d in days}
+        self.visits = set()
+        for d in days:
+            for customer_id, area in existing[d]:
+                self.areas[d][area] = self.areas[d].get(area, 0) + 1
+                self.visits.add((customer_id, d))
+        self.target = total / len(days)
+
+    def day_cost(self, day):
+        return (LOAD_WEIGHT * (self.load[day] - self.target) ** 2
+                + AREA_WEIGHT * len(self.areas[day]))
+
+    def free(self, candidate, day):
+        return (candidate["customer_id"], day) not in self.visits
+
+    def add(self, day, candidate):
+        self.load[day] += 1
+        area = candidate["area"]
+        self.areas[day][area] = self.areas[day].get(area, 0) + 1
+        self.visits.add((candidate["customer_id"], day))
+
+    def remove(self, day, candidate):
+        self.load[day] -= 1
+        area = candidate["area"]
+        self.areas[day][area] -= 1
+        if not self.areas[day][area]:
+            del self.areas[day][area]
+        self.visits.discard((candidate["customer_id"], day))
+
+    def move(self, candidate, src, dst):
+        self.remove(src, candidate)
+        self.add(dst, candidate)
+
+
+def _shift_cost(candidate, day):
+    if candidate["preferred"] is None:
+        return 0.0
+    return SHIFT_WEIGHT * abs((day - candidate["preferred"]).days)
+
+
+def plan_week(
+    start: date,
+    end: date,
+    *,
+    capacity: int = DEFAULT_DAY_CAPACITY,
+    weekdays_only: bool = True,
+    include_attention: bool = True,
+    time_budget: float = DEFAULT_PLAN_SECONDS,
+    seed: int = 0,
+) -> dict:
+    """Spread due visits over the days in [start, end] without writing anything.
+
+    Recurring occurrences may move up to RECURRING_FLEX_DAYS from their date;
+    overdue customers can go on any day. Existing stops stay where they are
+    and count toward ``capacity``. A greedy pass (most constrained first,
+    then most overdue) is improved by random moves and swaps until
+    ``time_budget`` seconds pass. Returns the preview::
+
+        {"days": [{"date", "existing", "add": [...], "total"}],
+         "unassigned": [...], "assignments": [...]}
+    """
+    import random
+    import time
+
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days >= MAX_BULK_DAYS:
+        raise ValueError(f"Date range is limited to {MAX_BULK_DAYS} days")
+    days = _plan_days(start, end, weekdays_only)
+    if not days:
+        raise ValueError("No working days in range")
+
+    candidates, existing = _week_candidates(days, include_attention)
+    total = sum(len(v) for v in existing.values()) + len(candidates)
+    state = _WeekState(days, existing, min(total, capacity * len(days)))
+    placed: dict[int, date] = {}
+    unassigned = []
+
+    order = sorted(range(len(candidates)), key=lambda i: (len(candidates[i]["allowed"]), i))
+    for i in order:
+        c = candidates[i]
+        open_days = [d for d in c["allowed"] if state.load[d] < capacity and state.free(c, d)]
+        if not open_days:
+            unassigned.append(i)
+            continue
+        def added_cost(d):
+            before = state.day_cost(d)
+            state.add(d, c)
+            after = state.day_cost(d)
+            state.remove(d, c)
+            return after - before + _shift_cost(c, d)
+
+        best = min(open_days, key=lambda d: (added_cost(d), d))
+        state.add(best, c)
+        placed[i] = best
+
+    def cost(days_touched, pairs):
+        return (sum(state.day_cost(d) for d in days_touched)
+                + sum(_shift_cost(candidates[k], d) for k, d in pairs))
+
+    rng = random.Random(seed)
+    movable = [i for i in placed if len(candidates[i]["allowed"]) > 1]
+    deadline = time.perf_counter() + max(time_budget, 0.0)
+    stale, patience = 0, 200 * len(movable)  # give up once moves stop helping
+    while movable and stale < patience and time.perf_counter() < deadline:
+        stale += 1
+        i = rng.choice(movable)
+        here = placed[i]
+        if rng.random() < 0.5:
+            # Move one visit to another allowed day
+            there = rng.choice(candidates[i]["allowed"])
+            if there == here or state.load[there] >= capacity \
+                    or not state.free(candidates[i], there):
+                continue
+            before = cost((here, there), [(i, here)])
+            state.move(candidates[i], here, there)
+            after = cost((here, there), [(i, there)])
+            if after < before - 1e-9:
+                placed[i] = there
+                stale = 0
+            else:
+                state.move(candidates[i], there, here)
+        else:
+            # Swap the days of two visits
+            j = rng.choice(movable)
+            there = placed[j]
+            if here == there or there not in candidates[i]["allowed"] \
+                    or here not in candidates[j]["allowed"] \
+                    or candidates[i]["customer_id"] == candidates[j]["customer_id"] \
+                    or not state.free(candidates[i], there) or not state.free(candidates[j], here):
+                continue
+            before = cost((here, there), [(i, here), (j, there)])
+            state.move(candidates[i], here, there)
+            state.move(candidates[j], there, here)
+            after = cost((here, there), [(i, there), (j, here)])
+            if after < before - 1e-9:
+                placed[i], placed[j] = there, here
+                stale = 0
+            else:
+                state.move(candidates[i], there, here)
+                state.move(candidates[j], here, there)
+
+    def _public(c, day=None):
+        item = {k: c[k] for k in ("customer_id", "name", "city", "recurring_id", "reason")}
+        item["preferred"] = c["preferred"].isoformat() if c["preferred"] else None
+        if day is not None:
+            item["date"] = day.isoformat()
+        return item
+
+    assignments = [_public(candidates[i], placed[i]) for i in sorted(placed)]
+    preview = []
+    for d in days:
+        add = sorted((a for a in assignments if a["date"] == d.isoformat()),
+                     key=lambda a: (a["city"], a["name"]))
+        preview.append({"date": d.isoformat(), "existing": len(existing[d]),
+                        "add": add, "total": len(existing[d]) + len(add)})
+    return {
+        "days": preview,
+        "unassigned": [_public(candidates[i]) for i in unassigned],
+        "assignments": assignments,
+        "capacity": capacity,
+    }
+
+
+def apply_week_plan(assignments: list[dict], *, created_by: int | None = None) -> dict:
+    """Insert the stops from a ``plan_week`` preview. Does not commit.
+
+    Recurring visits moved off their scheduled date get a RecurringSkip for
+    that date so materialization won't put them back, but only once the
+    moved stop is in: stops that appeared since the preview are left alone
+    (ON CONFLICT DO NOTHING), and a visit that wasn't inserted keeps its date.
+    """
+    from app.models import RecurringSkip, RecurringStop
+    from app.recurring import insert_stops
+
+    parsed = []
+    for a in assignments:
+        try:
+            parsed.append((int(a["customer_id"]), date.fromisoformat(a["date"]),
+                           a.get("recurring_id"), a.get("preferred")))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Malformed plan entry")
+    if not parsed:
+        return {"added": 0, "moved": 0}
+
+    customer_ids = {cid for cid, *_ in parsed}
+    known = {cid for (cid,) in db.session.query(Customer.id).filter(Customer.id.in_(customer_ids))}
+    if known != customer_ids:
+        raise ValueError("Plan references unknown customers")
+
+    by_day: dict[date, list[int]] = {}
+    for cid, day, _, _ in parsed:
+        if cid not in by_day.setdefault(day, []):
+            by_day[day].append(cid)
+    max_seq = dict(
+        db.session.query(RouteStop.route_date, db.func.max(RouteStop.sequence))
+        .filter(RouteStop.route_date.in_(list(by_day)))
+        .group_by(RouteStop.route_date)
+    )
+    rows = []
+    for day, cids in sorted(by_day.items()):
+        seq = max_seq.get(day) or 0
+        for cid in cids:
+            seq += 1
+            rows.append({"customer_id": cid, "route_date": day, "sequence": seq,
+                         "completed": False, "created_by": created_by})
+    inserted = set(insert_stops(rows))
+
+    moved = 0
+    recurring_ids = {rid for _, _, rid, _ in parsed if rid}
+    schedules = {r.id: r for r in RecurringStop.query.filter(RecurringStop.id.in_(recurring_ids))}
+    # One stop serves one entry; a visit kept on its own date claims it first
+    claimed = set()
+    for cid, day, rid, preferred in sorted(parsed, key=lambda p: p[3] != p[1].isoformat()):
+        if (cid, day) not in inserted or (cid, day) in claimed:
+            continue
+        claimed.add((cid, day))
+        r = schedules.get(rid)
+        if not r or not preferred or preferred == day.isoformat() or r.customer_id != cid:
+            continue
+        skip_day = date.fromisoformat(preferred)
+        if not r.matches(skip_day):
+            continue
+        if not RecurringSkip.query.filter_by(recurring_stop_id=r.id, skip_date=skip_day).first():
+            db.session.add(RecurringSkip(recurring_stop_id=r.id, skip_date=skip_day))
+        moved += 1
+    return {"added": len(inserted), "moved": moved}
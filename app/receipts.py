@@ -0,0 +1,172 @@
+"""Bulk receipt PDFs: rendered in a process pool, streamed out as a ZIP.
+
+Rendering a receipt is CPU-bound reportlab work, so a day's worth of them
+is spread over a small pool of worker processes (RECEIPT_WORKERS, default
+up to 4; 0 renders in the calling thread). The request thread only
+snapshots the payments it needs, then writes each PDF into the ZIP as soon
+as a worker hands it back, so the download starts with the first receipt
+instead of after the last one.
+
+A receipt that fails to render is logged and left out; the ZIP then ends
+with FAILED_NOTE listing the receipts that are missing, rather than being
+cut off after the response has started.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from types import SimpleNamespace
+from typing import Iterable, Iterator
+
+from app import pdf_engine
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+FAILED_NOTE = "FAILED.txt"
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def receipt_workers() -> int:
+    try:
+        return max(int(os.environ.get("RECEIPT_WORKERS", DEFAULT_WORKERS)), 0)
+    except ValueError:
+        return DEFAULT_WORKERS
+
+
+def _executor() -> ProcessPoolExecutor | None:
+    """The shared worker pool, started on first use. None means render inline."""
+    global _pool
+    workers = receipt_workers()
+    if workers == 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process has threads and open DB connections
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                        initializer=pdf_engine.preload)
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def snapshot(payment) -> tuple[str, SimpleNamespace, SimpleNamespace]:
+    """Plain, picklable copy of what a receipt shows: (filename, payment, customer)."""
+    return (
+        f"{payment.receipt_number}.pdf",
+        SimpleNamespace(
+            receipt_number=payment.receipt_number,
+            payment_date=payment.payment_date,
+            payment_type=payment.payment_type,
+            amount=payment.amount,
+            amount_sold=payment.amount_sold,
+            previous_balance=payment.previous_balance,
+            notes=payment.notes,
+        ),
+        SimpleNamespace(name=payment.customer.name),
+    )
+
+
+def _render(item: tuple[str, SimpleNamespace, SimpleNamespace]) -> tuple[str, bytes]:
+    filename, payment, customer = item
+    return filename, pdf_engine.render_receipt(payment, customer)
+
+
+def _render_inline(items: list, failed: list[str]) -> Iterator[tuple[str, bytes]]:
+    for item in items:
+        try:
+            result = _render(item)
+        except Exception:
+            log.exception("Could not render receipt %s", item[0])
+            failed.append(item[0])
+            continue
+        yield result
+
+
+def _failed_note(failed: list[str]) -> bytes:
+    lines = ["These receipts could not be rendered and are not in this archive:", ""]
+    lines += sorted(failed)
+    return ("\n".join(lines) + "\n").encode()
+
+
+def render_receipts(items: list) -> Iterator[tuple[str, bytes]]:
+    """Yield ``(filename, pdf_bytes)`` for each snapshot, in completion order.
+
+    Receipts that fail are skipped and listed in a final FAILED_NOTE entry.
+    """
+    failed: list[str] = []
+    pool = _executor()
+    if pool is None:
+        yield from _render_inline(items, failed)
+    else:
+        futures = {pool.submit(_render, item): item for item in items}
+        done = set()
+        try:
+            for future in as_completed(futures):
+                done.add(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    log.exception("Could not render receipt %s", futures[future][0])
+                    failed.append(futures[future][0])
+                    continue
+                yield result
+        except BrokenProcessPool:
+            log.exception("Receipt worker pool died; rendering the rest inline")
+            _discard_pool(pool)
+            rest = [item for f, item in futures.items() if f not in done]
+            yield from _render_inline(rest, failed)
+        finally:
+            # Client went away mid-download: don't render what nobody will read
+            for future in futures:
+                future.cancel()
+    if failed:
+        yield FAILED_NOTE, _failed_note(failed)
+
+
+class _Chunks:
+    """Write-only file object that hands back whatever was written since last drained."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def stream_zip(entries: Iterable[tuple[str, bytes]]) -> Iterator[bytes]:
+    """Build a ZIP from ``(name, data)`` pairs, yielding bytes as each entry is added.
+
+    The sink can't seek, so zipfile writes sizes in data descriptors after
+    each entry instead of patching local headers.
+    """
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,305 @@
+"""Recurring stop materialization.
+
+Each active RecurringStop carries ``next_occurrence``: the first date it has
+not yet been turned into a RouteStop. Finding the schedules due by a given
+date is then an indexed range scan on (is_active, next_occurrence) instead
+of evaluating every schedule in Python. ``materialize_recurring`` walks each
+due schedule forward by whole intervals, creates the missing stops, and
+advances ``next_occurrence`` past the horizon.
+
+Materializing is a write and only happens from explicit steps: the
+planner's generate action, new schedules, ``flask recurring materialize``
+and ``top_up``, which keeps RECURRING_HORIZON_DAYS of stops ahead of today.
+``top_up`` runs on every pass of the background worker
+(``flask backup schedule``) and once at app start, so the driver's route
+never runs dry. Read paths never materialize; they use ``projected_stops``
+to show occurrences that have not been created yet.
+A unique (customer_id, route_date) constraint on route_stops makes racing
+generators harmless: the loser's inserts are dropped, not duplicated.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models import RecurringSkip, RecurringStop, RouteDay, RouteStop, WorkerState
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_DAYS = 28
+# WorkerState row recording the last daily top-up
+TOP_UP_NAME = "recurring"
+
+
+def horizon_days() -> int:
+    try:
+        return max(int(os.environ.get("RECURRING_HORIZON_DAYS", DEFAULT_HORIZON_DAYS)), 1)
+    except ValueError:
+        return DEFAULT_HORIZON_DAYS
+
+
+def occurrence_on_or_after(schedule: RecurringStop, day: date) -> date | None:
+    """First date >= ``day`` the schedule falls on, or None once it has ended."""
+    if schedule.interval_days < 1:
+        return None
+    if day <= schedule.start_date:
+        candidate = schedule.start_date
+    else:
+        periods = -(-(day - schedule.start_date).days // schedule.interval_days)
+        candidate = schedule.start_date + timedelta(days=periods * schedule.interval_days)
+    if schedule.end_date and candidate > schedule.end_date:
+        return None
+    return candidate
+
+
+def reset_next_occurrence(schedule: RecurringStop, today: date | None = None) -> None:
+    """Point a new or edited schedule at its first occurrence from today on."""
+    schedule.next_occurrence = occurrence_on_or_after(schedule, today or date.today())
+
+
+def backfill_next_occurrence(today: date | None = None) -> int:
+    """Seed ``next_occurrence`` for active schedules that predate the column."""
+    today = today or date.today()
+    pending = RecurringStop.query.filter(
+        RecurringStop.is_active.is_(True),
+        RecurringStop.next_occurrence.is_(None),
+        db.or_(RecurringStop.end_date.is_(None), RecurringStop.end_date >= today),
+    ).all()
+    for r in pending:
+        reset_next_occurrence(r, today)
+    return len(pending)
+
+
+def materialize_recurring(through: date) -> dict:
+    """Create RouteStops for every due occurrence up to and including ``through``.
+
+    Idempotent: occurrences that already have a stop for the customer, or a
+    RecurringSkip, are passed over. Does not commit.
+    """
+    due = (
+        RecurringStop.query
+        .filter(
+            RecurringStop.is_active.is_(True),
+            RecurringStop.next_occurrence.isnot(None),
+            RecurringStop.next_occurrence <= through,
+        )
+        .order_by(RecurringStop.next_occurrence)
+        .all()
+    )
+    if not due:
+        return {"schedules": 0, "created": 0}
+
+    first = min(r.next_occurrence for r in due)
+    schedule_ids = [r.id for r in due]
+    customer_ids = {r.customer_id for r in due}
+
+    skips = {
+        (s.recurring_stop_id, s.skip_date)
+        for s in RecurringSkip.query.filter(
+            RecurringSkip.recurring_stop_id.in_(schedule_ids),
+            RecurringSkip.skip_date >= first,
+            RecurringSkip.skip_date <= through,
+        )
+    }
+    existing = set(
+        db.session.query(RouteStop.customer_id, RouteStop.route_date)
+        .filter(
+            RouteStop.customer_id.in_(customer_ids),
+            RouteStop.route_date >= first,
+            RouteStop.route_date <= through,
+        )
+    )
+    max_seq = dict(
+        db.session.query(RouteStop.route_date, db.func.max(RouteStop.sequence))
+        .filter(RouteStop.route_date >= first, RouteStop.route_date <= through)
+        .group_by(RouteStop.route_date)
+    )
+
+    rows = []
+    for r in due:
+        step = timedelta(days=r.interval_days)
+        day = r.next_occurrence
+        while day <= through and not (r.end_date and day > r.end_date):
+            if (r.id, day) not in skips and (r.customer_id, day) not in existing:
+                max_seq[day] = (max_seq.get(day) or 0) + 1
+                rows.append({
+                    "customer_id": r.customer_id,
+                    "route_date": day,
+                    "sequence": max_seq[day],
+                    "completed": False,
+                    "created_by": r.created_by,
+                })
+                existing.add((r.customer_id, day))
+            day += step
+        r.next_occurrence = day if not (r.end_date and day > r.end_date) else None
+
+    created = len(insert_stops(rows))
+    log.info("Materialized %d recurring stops from %d schedules through %s",
+             created, len(due), through)
+    return {"schedules": len(due), "created": created}
+
+
+def top_up(today: date | None = None) -> dict | None:
+    """Materialize through today + horizon, once per day. Commits when it runs.
+
+    Returns the materialize result, or None if today's top-up was already
+    done. Call it with a clean session (the worker loop, app start): failures
+    are logged and rolled back rather than raised.
+    """
+    today = today or date.today()
+    try:
+        state = db.session.get(WorkerState, TOP_UP_NAME)
+        if state is not None and state.last_seen_at is not None and state.last_seen_at.date() >= today:
+            return None
+        backfill_next_occurrence(today)
+        # Occurrences that fell behind while nobody topped up are in the past; skip them
+        for r in RecurringStop.query.filter(
+            RecurringStop.is_active.is_(True),
+            RecurringStop.next_occurrence < today,
+        ):
+            lapsed = r.next_occurrence
+            reset_next_occurrence(r, today)
+            log.warning("Recurring schedule %d (customer %d) lapsed: occurrences from %s "
+                        "to %s were never generated and are skipped",
+                        r.id, r.customer_id, lapsed, today - timedelta(days=1))
+        result = materialize_recurring(today + timedelta(days=horizon_days()))
+        state = state or WorkerState(name=TOP_UP_NAME)
+        # Midnight of the day topped up, so the check above compares dates
+        state.last_seen_at = datetime.combine(today, time.min, tzinfo=timezone.utc)
+        db.session.add(state)
+        db.session.commit()
+    except SQLAlchemyError:
+        # Most likely another process topping up at the same moment
+        db.session.rollback()
+        log.exception("Recurring top-up failed")
+        return None
+    return result
+
+
+def insert_stops(rows: list[dict]) -> list[tuple[int, date]]:
+    """Insert route stops, ignoring any that collide on (customer_id, route_date).
+
+    Every date touched gets its RouteDay version bumped. Returns the
+    ``(customer_id, route_date)`` of each stop actually inserted.
+    """
+    if not rows:
+        return []
+    RouteDay.bump(r["route_date"] for r in rows)
+    table = RouteStop.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = (
+            insert(table)
+            .on_conflict_do_nothing(index_elements=["customer_id", "route_date"])
+            .returning(table.c.customer_id, table.c.route_date)
+        )
+        return [tuple(r) for r in db.session.execute(stmt, rows)]
+    db.session.execute(table.insert(), rows)
+    return [(r["customer_id"], r["route_date"]) for r in rows]
+
+
+def projected_stops(day: date) -> list[RecurringStop]:
+    """Schedules that fall on ``day`` but have no RouteStop there yet.
+
+    Read-only counterpart to ``materialize_recurring``: only occurrences at or
+    after a schedule's ``next_occurrence`` are projected, so dates that were
+    already generated (and possibly edited since) are left alone.
+    """
+    candidates = (
+        RecurringStop.query
+        .filter(
+            RecurringStop.is_active.is_(True),
+            RecurringStop.next_occurrence.isnot(None),
+            RecurringStop.next_occurrence <= day,
+            RecurringStop.start_date <= day,
+            db.or_(RecurringStop.end_date.is_(None), RecurringStop.end_date >= day),
+        )
+        .all()
+    )
+    candidates = [r for r in candidates if r.matches(day)]
+    if not candidates:
+        return []
+    skipped = {
+        sid for (sid,) in db.session.query(RecurringSkip.recurring_stop_id).filter(
+            RecurringSkip.recurring_stop_id.in_([r.id for r in candidates]),
+            RecurringSkip.skip_date == day,
+        )
+    }
+    on_route = {
+        cid for (cid,) in db.session.query(RouteStop.customer_id).filter(
+            RouteStop.route_date == day,
+            RouteStop.customer_id.in_({r.customer_id for r in candidates}),
+        )
+    }
+    return [r for r in candidates if r.id not in skipped and r.customer_id not in on_route]
+
+
+def projected_occurrences(start: date, end: date) -> list[tuple[RecurringStop, date]]:
+    """Ungenerated recurring occurrences in [start, end] as (schedule, day) pairs.
+
+    Each schedule contributes an arithmetic progression: the first occurrence
+    on or after max(start, next_occurrence) stepped by interval_days up to
+    min(end, end_date). Skips and days where the customer already has a stop
+    are subtracted from bulk-loaded sets, so cost grows with the number of
+    occurrences in the range, never with the number of days times schedules.
+    """
+    if end < start:
+        return []
+    schedules = (
+        RecurringStop.query
+        .options(joinedload(RecurringStop.customer))
+        .filter(
+            RecurringStop.is_active.is_(True),
+            RecurringStop.next_occurrence.isnot(None),
+            RecurringStop.next_occurrence <= end,
+            db.or_(RecurringStop.end_date.is_(None), RecurringStop.end_date >= start),
+        )
+        .all()
+    )
+    if not schedules:
+        return []
+
+    skips = {
+        (sid, day)
+        for sid, day in db.session.query(RecurringSkip.recurring_stop_id, RecurringSkip.skip_date)
+        .filter(RecurringSkip.skip_date >= start, RecurringSkip.skip_date <= end)
+    }
+    on_route = set(
+        db.session.query(RouteStop.customer_id, RouteStop.route_date)
+        .filter(
+            RouteStop.route_date >= start,
+            RouteStop.route_date <= end,
+            RouteStop.customer_id.in_({r.customer_id for r in schedules}),
+        )
+    )
+
+    occurrences = []
+    for r in schedules:
+        first = occurrence_on_or_after(r, max(start, r.next_occurrence))
+        if first is None:
+            continue
+        last = min(end, r.end_date) if r.end_date else end
+        for ordinal in range(first.toordinal(), last.toordinal() + 1, r.interval_days):
+            day = date.fromordinal(ordinal)
+            if (r.id, day) in skips or (r.customer_id, day) in on_route:
+                continue
+            occurrences.append((r, day))
+    return occurrences
+
+
+def projected_counts(start: date, end: date) -> dict[date, int]:
+    """Ungenerated recurring stops per day in [start, end]."""
+    counts: dict[date, int] = {}
+    for _, day in projected_occurrences(start, end):
+        counts[day] = counts.get(day, 0) + 1
+    return counts
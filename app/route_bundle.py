@@ -0,0 +1,261 @@
+"""Route-day bundle: one JSON document with everything a driver needs for a date.
+
+The bundle is versioned by the date's RouteDay counter, so a refresh that
+finds nothing changed costs one primary-key lookup and a 304. To keep that
+counter honest, flush hooks note whenever ORM writes touch data the
+bundle shows, and the dates are bumped once as the transaction commits
+(a bump of the day's own stops or payments also marks its close-out stale):
+
+* a stop on the date (added, removed, completed, edited);
+* a payment dated that day (the day's takings);
+* a customer on the route, or their payments and completed visits (the
+  balance, last visit and last payment shown per stop), which bumps the
+  customer's stops from today on. Past days keep their version, so a
+  closed day's bundle (and close-out snapshot) isn't invalidated by
+  later activity.
+
+Core statements that insert or resequence stops bump RouteDay explicitly
+(see ``insert_stops``, ``bulk_add_stops`` and the planner's reorder).
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, joinedload
+
+from app import db
+from app.models import Customer, Payment, RouteDay, RouteStop
+
+# Built bundles kept per process, keyed by ETag
+BUNDLE_CACHE_SIZE = 64
+
+_cache: OrderedDict[str, bytes] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Queries shared with the route page
+# ---------------------------------------------------------------------------
+
+def day_window(day: date) -> tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    end = datetime(day.year, day.month, day.day, 23, 59, 59, 999999, tzinfo=timezone.utc)
+    return start, end
+
+
+def collection_target(customer_ids) -> Decimal:
+    """Total outstanding balance across the given customers."""
+    if not customer_ids:
+        return Decimal("0")
+    return db.session.query(
+        func.coalesce(func.sum(Customer.balance), Decimal("0"))
+    ).filter(
+        Customer.id.in_(set(customer_ids)),
+        Customer.balance > 0,
+    ).scalar() or Decimal("0")
+
+
+def day_takings(day: date) -> tuple[Decimal, Decimal]:
+    """(collected, sold) across all payments recorded on ``day``."""
+    start, end = day_window(day)
+    collected, sold = db.session.query(
+        func.coalesce(func.sum(Payment.amount), Decimal("0")),
+        func.coalesce(func.sum(Payment.amount_sold), Decimal("0")),
+    ).filter(
+        Payment.payment_date >= start,
+        Payment.payment_date <= end,
+    ).one()
+    return Decimal(collected or 0), Decimal(sold or 0)
+
+
+def last_visits(customer_ids, before: date) -> dict[int, date]:
+    """Most recent completed stop before ``before``, per customer."""
+    if not customer_ids:
+        return {}
+    rows = (
+        db.session.query(RouteStop.customer_id, func.max(RouteStop.route_date))
+        .filter(
+            RouteStop.customer_id.in_(set(customer_ids)),
+            RouteStop.completed.is_(True),
+            RouteStop.route_date < before,
+        )
+        .group_by(RouteStop.customer_id)
+    )
+    return dict(rows)
+
+
+def last_payments(customer_ids) -> dict[int, Payment]:
+    """Latest payment per customer."""
+    if not customer_ids:
+        return {}
+    latest = (
+        db.session.query(Payment.customer_id, func.max(Payment.id).label("max_id"))
+        .filter(Payment.customer_id.in_(set(customer_ids)))
+        .group_by(Payment.customer_id)
+        .subquery()
+    )
+    rows = Payment.query.join(latest, Payment.id == latest.c.max_id)
+    return {p.customer_id: p for p in rows}
+
+
+# ---------------------------------------------------------------------------
+# Bundle
+# ---------------------------------------------------------------------------
+
+def route_etag(day: date) -> str:
+    """ETag for a date's bundle: one lookup on route_days' primary key."""
+    row = db.session.query(RouteDay.version, RouteDay.updated_at).filter(
+        RouteDay.route_date == day
+    ).first()
+    if row is None:
+        return f"{day.isoformat()}.0"
+    stamp = int(row.updated_at.timestamp() * 1_000_000) if row.updated_at else 0
+    return f"{day.isoformat()}.{row.version}.{stamp}"
+
+
+def _money(value) -> float:
+    return float(value) if value else 0.0
+
+
+def build_bundle(day: date) -> dict:
+    stops = (
+        RouteStop.query
+        .options(joinedload(RouteStop.customer))
+        .join(Customer)
+        .filter(RouteStop.route_date == day)
+        .order_by(RouteStop.sequence, RouteStop.id)
+        .all()
+    )
+    customer_ids = [s.customer_id for s in stops]
+    visits = last_visits(customer_ids, day)
+    payments = last_payments(customer_ids)
+    collected, sold = day_takings(day)
+
+    data = []
+    for stop in stops:
+        customer = stop.customer
+        lp = payments.get(customer.id)
+        lv = visits.get(customer.id)
+        data.append({
+            "stop_id": stop.id,
+            "sequence": stop.sequence,
+            "completed": bool(stop.completed),
+            "completed_at": stop.completed_at.isoformat() if stop.completed_at else None,
+            "notes": stop.notes,
+            "customer": {
+                "id": customer.id,
+                "name": customer.name,
+                "address": customer.address,
+                "city": customer.city,
+                "phone": customer.phone,
+                "balance": _money(customer.balance),
+            },
+            "last_visit": lv.isoformat() if lv else None,
+            "last_payment": {
+                "amount": _money(lp.amount),
+                "amount_sold": _money(lp.amount_sold),
+                "payment_date": lp.payment_date.isoformat() if lp.payment_date else None,
+            } if lp else None,
+        })
+
+    return {
+        "route_date": day.isoformat(),
+        "version": RouteDay.version_of(day),
+        "total_stops": len(data),
+        "completed_stops": sum(1 for s in data if s["completed"]),
+        "collection_target": _money(collection_target(customer_ids)),
+        "collected": _money(collected),
+        "sold": _money(sold),
+        "stops": data,
+    }
+
+
+def bundle_bytes(day: date, etag: str) -> bytes:
+    """The serialized bundle for ``etag``, built on first request per process."""
+    with _cache_lock:
+        body = _cache.get(etag)
+        if body is not None:
+            _cache.move_to_end(etag)
+            return body
+    body = json.dumps(build_bundle(day), separators=(",", ":")).encode()
+    with _cache_lock:
+        _cache[etag] = body
+        while len(_cache) > BUNDLE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return body
+
+
+# ---------------------------------------------------------------------------
+# Change tracking
+# ---------------------------------------------------------------------------
+
+def _history(obj, attr: str) -> tuple[list, bool]:
+    """Every value ``attr`` had in this flush, and whether it changed."""
+    hist = sa.inspect(obj).attrs[attr].history
+    values = [v for v in (*hist.added, *hist.unchanged, *hist.deleted) if v is not None]
+    return values, hist.has_changes()
+
+
+def _payment_day(value) -> date:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+
+def _track_route_changes(session, flush_context) -> None:
+    days, customers = session.info.setdefault("route_changes", (set(), set()))
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        created_or_deleted = obj in session.new or obj in session.deleted
+        if not created_or_deleted and not session.is_modified(obj):
+            continue
+        if isinstance(obj, RouteStop):
+            route_dates, moved = _history(obj, "route_date")
+            days.update(route_dates)
+            _, completed = _history(obj, "completed")
+            if created_or_deleted or moved or completed:
+                customers.add(obj.customer_id)
+        elif isinstance(obj, Payment):
+            paid_on, _ = _history(obj, "payment_date")
+            days.update(_payment_day(v) for v in paid_on)
+            customers.add(obj.customer_id)
+        elif isinstance(obj, Customer) and obj not in session.new and obj.id is not None:
+            customers.add(obj.id)
+
+
+def _bump_route_days(session) -> None:
+    # Once per transaction: recording a payment alone flushes twice.
+    session.flush()
+    days, customers = session.info.pop("route_changes", (set(), set()))
+    customers.discard(None)
+    RouteDay.bump(days)
+    if customers:
+        # Days that only show these customers: their close-outs still hold
+        RouteDay.bump(
+            (d for (d,) in session.execute(
+                sa.select(RouteStop.route_date)
+                .where(RouteStop.customer_id.in_(customers), RouteStop.route_date >= date.today())
+                .distinct()
+            ) if d not in days),
+            closeouts=False,
+        )
+
+
+def _discard_route_changes(session) -> None:
+    session.info.pop("route_changes", None)
+
+
+def register_change_tracking() -> None:
+    if not event.contains(Session, "after_flush", _track_route_changes):
+        event.listen(Session, "after_flush", _track_route_changes)
+        event.listen(Session, "before_commit", _bump_route_days)
+        event.listen(Session, "after_rollback", _discard_route_changes)
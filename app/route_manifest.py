@@ -0,0 +1,78 @@
+"""Printable route manifest: one PDF page set listing a day's stops.
+
+The rows come from a single query: the day's stops joined to their
+customers, to each customer's last completed visit before the day and to
+their latest payment. The PDF is cached on disk (see app.pdf_cache) under
+the day's route ETag, which changes whenever anything the manifest shows
+does (see app.route_bundle), so a reprint is a file read and tomorrow's
+manifest can be built ahead of time with ``flask route manifest``.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from app import db, pdf_cache, pdf_engine
+from app.models import Customer, Payment, RouteStop
+from app.route_bundle import route_etag
+
+CACHE_KIND = "manifest"
+
+
+def manifest_rows(day: date) -> list:
+    """The day's stops with customer, last visit and last payment, in route order."""
+    on_day = select(RouteStop.customer_id).where(RouteStop.route_date == day)
+    visited = aliased(RouteStop)
+    last_visit = (
+        select(visited.customer_id, func.max(visited.route_date).label("last_visit"))
+        .where(visited.customer_id.in_(on_day), visited.completed.is_(True), visited.route_date < day)
+        .group_by(visited.customer_id)
+        .subquery()
+    )
+    latest = (
+        select(Payment.customer_id, func.max(Payment.id).label("payment_id"))
+        .where(Payment.customer_id.in_(on_day))
+        .group_by(Payment.customer_id)
+        .subquery()
+    )
+    last_payment = aliased(Payment)
+    query = (
+        select(
+            RouteStop.sequence,
+            RouteStop.completed,
+            RouteStop.notes,
+            Customer.name,
+            Customer.address,
+            Customer.city,
+            Customer.phone,
+            Customer.balance,
+            last_visit.c.last_visit,
+            last_payment.amount.label("last_paid"),
+            last_payment.amount_sold.label("last_sold"),
+            last_payment.payment_date.label("last_payment_date"),
+        )
+        .join(Customer, Customer.id == RouteStop.customer_id)
+        .outerjoin(last_visit, last_visit.c.customer_id == RouteStop.customer_id)
+        .outerjoin(latest, latest.c.customer_id == RouteStop.customer_id)
+        .outerjoin(last_payment, last_payment.id == latest.c.payment_id)
+        .where(RouteStop.route_date == day)
+        .order_by(RouteStop.sequence, RouteStop.id)
+    )
+    return db.session.execute(query).all()
+
+
+def cache_fields(day: date) -> dict:
+    """What the cached manifest depends on: the day's route ETag."""
+    return {"route": route_etag(day)}
+
+
+def render(day: date) -> bytes:
+    return pdf_engine.render_manifest(day, manifest_rows(day))
+
+
+def manifest_pdf(day: date) -> tuple[str, bytes]:
+    """``(etag, pdf_bytes)`` for a day's manifest, from the cache when current."""
+    return pdf_cache.cached_pdf(CACHE_KIND, day.isoformat(), cache_fields(day), lambda: render(day))
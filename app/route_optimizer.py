@@ -0,0 +1,157 @@
+"""Stop sequence optimization for a day's route.
+
+A nearest-neighbour tour is improved with 2-opt (reverse a segment) and
+or-opt (move a run of 1-3 stops elsewhere) until neither finds a shorter
+route or the time budget runs out. Distances are great-circle kilometres
+between customer coordinates; routes are a few dozen stops, so a full
+distance matrix is cheap.
+
+Without a depot the route is an open path: a zero-cost dummy node is added
+to the tour and the tour is cut there, which lets the optimizer choose the
+best first and last stop. With a depot (ROUTE_DEPOT="lat,lon") the route
+starts and ends at the depot.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_TIME_BUDGET = 0.5  # seconds
+
+
+def haversine_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def depot_from_env() -> tuple[float, float] | None:
+    """Parse ROUTE_DEPOT ("lat,lon"); None when unset or malformed."""
+    raw = os.environ.get("ROUTE_DEPOT", "").strip()
+    if not raw:
+        return None
+    try:
+        lat, lon = (float(part) for part in raw.split(","))
+    except ValueError:
+        return None
+    return lat, lon
+
+
+def budget_seconds() -> float:
+    """Optimizer time budget from ROUTE_OPTIMIZE_SECONDS (default 0.5s)."""
+    try:
+        return max(float(os.environ.get("ROUTE_OPTIMIZE_SECONDS", DEFAULT_TIME_BUDGET)), 0.0)
+    except ValueError:
+        return DEFAULT_TIME_BUDGET
+
+
+def _tour_length(tour: list[int], dist: list[list[float]]) -> float:
+    return sum(dist[tour[i - 1]][tour[i]] for i in range(len(tour)))
+
+
+def _nearest_neighbour(dist: list[list[float]], start: int) -> list[int]:
+    n = len(dist)
+    tour = [start]
+    remaining = set(range(n)) - {start}
+    while remaining:
+        last = tour[-1]
+        nxt = min(remaining, key=lambda j: dist[last][j])
+        tour.append(nxt)
+        remaining.remove(nxt)
+    return tour
+
+
+def _two_opt(tour: list[int], dist: list[list[float]], deadline: float) -> bool:
+    """One sweep of first-improvement 2-opt. Returns True if the tour changed."""
+    n = len(tour)
+    improved = False
+    for i in range(n - 1):
+        if time.perf_counter() > deadline:
+            break
+        a, b = tour[i], tour[i + 1]
+        for j in range(i + 2, n if i else n - 1):
+            c, d = tour[j], tour[(j + 1) % n]
+            delta = dist[a][c] + dist[b][d] - dist[a][b] - dist[c][d]
+            if delta < -1e-9:
+                tour[i + 1:j + 1] = reversed(tour[i + 1:j + 1])
+                a, b = tour[i], tour[i + 1]
+                improved = True
+    return improved
+
+
+def _or_opt(tour: list[int], dist: list[list[float]], deadline: float) -> bool:
+    """Move runs of 1-3 consecutive stops to a cheaper position (either direction)."""
+    n = len(tour)
+    improved = False
+    for length in (1, 2, 3):
+        if length >= n - 1:
+            break
+        i = 0
+        while i < n:
+            if time.perf_counter() > deadline:
+                return improved
+            seg = [tour[(i + k) % n] for k in range(length)]
+            prev, nxt = tour[(i - 1) % n], tour[(i + length) % n]
+            removal_gain = (dist[prev][seg[0]] + dist[seg[-1]][nxt] - dist[prev][nxt])
+            rest = [tour[(i + length + k) % n] for k in range(n - length)]
+            best = None
+            for p in range(len(rest) - 1):
+                u, v = rest[p], rest[p + 1]
+                for candidate in (seg, seg[::-1]):
+                    cost = dist[u][candidate[0]] + dist[candidate[-1]][v] - dist[u][v]
+                    if cost < removal_gain - 1e-9 and (best is None or cost < best[0]):
+                        best = (cost, p, candidate)
+            if best is not None:
+                _, p, candidate = best
+                tour[:] = rest[:p + 1] + list(candidate) + rest[p + 1:]
+                improved = True
+            i += 1
+    return improved
+
+
+def optimize_order(
+    points: list[tuple[float, float]],
+    *,
+    depot: tuple[float, float] | None = None,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+) -> dict:
+    """Return a short visiting order for ``points``.
+
+    Result: ``{"order": [indexes into points], "distance_km", "initial_km"}``
+    where ``initial_km`` is the length of the order the points came in.
+    """
+    n = len(points)
+    if n == 0:
+        return {"order": [], "distance_km": 0.0, "initial_km": 0.0}
+
+    # Node n is the depot, or a dummy at zero distance from everything.
+    nodes = list(points) + [depot]
+    dist = [[0.0] * (n + 1) for _ in range(n + 1)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            dist[i][j] = dist[j][i] = haversine_km(points[i], points[j])
+        if depot is not None:
+            dist[i][n] = dist[n][i] = haversine_km(points[i], nodes[n])
+
+    initial = _tour_length([n] + list(range(n)), dist)
+    deadline = time.perf_counter() + max(time_budget, 0.0)
+
+    tour = _nearest_neighbour(dist, n)
+    if n > 2:
+        while time.perf_counter() < deadline:
+            changed = _two_opt(tour, dist, deadline)
+            changed = _or_opt(tour, dist, deadline) or changed
+            if not changed:
+                break
+
+    length = _tour_length(tour, dist)
+    if length >= initial:
+        tour, length = [n] + list(range(n)), initial
+    cut = tour.index(n)
+    order = tour[cut + 1:] + tour[:cut]
+    return {"order": order, "distance_km": round(length, 3), "initial_km": round(initial, 3)}
@@ -0,0 +1,164 @@
+"""Replay of route actions queued on a driver's phone while offline.
+
+The route page queues stop completions and payments in IndexedDB when it
+has no signal, and posts them here in batches once it does. An operation is
+
+    {"key": "<client uuid>", "type": "complete" | "payment",
+     "stop_id": 12,          # complete
+     "customer_id": 34,      # payment
+     "amount_sold": "12.50", "amount_paid": "10", "payment_type": "cash",
+     "notes": "...", "at": "2026-05-08T14:03:00Z"}
+
+``at`` is when the driver did it; it becomes the completion and payment time
+so the day's totals land on the right date. Each operation runs in its own
+savepoint, so a bad one is reported without losing the rest of the batch.
+
+``key`` doubles as the operation's idempotency key (see app.idempotency),
+shared with the online endpoints: an action whose first attempt did reach
+the server before the connection dropped is answered from that attempt.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db, idempotency
+from app.helpers import audit
+from app.models import ActivityLog, Customer, RouteStop, VALID_PAYMENT_TYPES
+from app.payments import record_sale, sale_description
+
+log = logging.getLogger(__name__)
+
+# Largest batch one sync request may carry
+MAX_SYNC_OPS = 50
+# Offline timestamps older than this (or in the future) are replaced by "now"
+MAX_OP_AGE = timedelta(days=7)
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+class OpError(ValueError):
+    """An operation that can never succeed; the client should drop it."""
+
+
+def _op_time(raw, now: datetime) -> datetime:
+    try:
+        at = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        return now
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    if at > now + CLOCK_SKEW or at < now - MAX_OP_AGE:
+        return now
+    return at
+
+
+def _amount(op: dict, field: str) -> Decimal:
+    raw = str(op.get(field) or "").strip()
+    try:
+        value = Decimal(raw) if raw else Decimal("0")
+    except (InvalidOperation, ValueError):
+        raise OpError(f"Invalid {field.replace('_', ' ')}.")
+    if not value.is_finite():
+        raise OpError(f"Invalid {field.replace('_', ' ')}.")
+    if value < 0:
+        raise OpError("Amounts cannot be negative.")
+    return value
+
+
+def _payment_fields(op: dict) -> dict:
+    payment_type = str(op.get("payment_type") or "cash").strip() or "cash"
+    return {
+        "amount_sold": _amount(op, "amount_sold"),
+        "amount_paid": _amount(op, "amount_paid"),
+        "payment_type": payment_type if payment_type in VALID_PAYMENT_TYPES else "other",
+        "notes": str(op.get("notes") or "").strip() or None,
+    }
+
+
+def _record(customer_id: int, fields: dict, user_id: int, at: datetime, label: str) -> str:
+    sale = record_sale(customer_id, user_id=user_id, paid_at=at, **fields)
+    customer, receipt_number = sale["customer"], sale["receipt_number"]
+    desc = sale_description(fields["amount_sold"], fields["amount_paid"]) + f". Receipt: {receipt_number}"
+    db.session.add(ActivityLog(
+        customer_id=customer.id,
+        user_id=user_id,
+        action="payment_recorded",
+        description=desc,
+    ))
+    audit("payment_recorded", f"{label}: {desc} for '{customer.name}'", user_id=user_id)
+    return receipt_number
+
+
+def _complete(op: dict, user_id: int, at: datetime) -> dict:
+    stop = db.session.get(RouteStop, op.get("stop_id")) if isinstance(op.get("stop_id"), int) else None
+    if stop is None:
+        raise OpError("Stop not found.")
+    fields = _payment_fields(op)
+    receipt_number = None
+    if fields["amount_sold"] > 0 or fields["amount_paid"] > 0:
+        receipt_number = _record(stop.customer_id, fields, user_id, at, "Offline route payment")
+    if not stop.completed:
+        stop.completed = True
+        stop.completed_at = at
+        audit("stop_completed", f"Completed route stop for customer #{stop.customer_id} "
+                                f"on {stop.route_date} (offline)", user_id=user_id)
+    return {"stop_id": stop.id, "receipt_number": receipt_number}
+
+
+def _payment(op: dict, user_id: int, at: datetime) -> dict:
+    customer_id = op.get("customer_id")
+    if not isinstance(customer_id, int) or db.session.get(Customer, customer_id) is None:
+        raise OpError("Customer not found.")
+    fields = _payment_fields(op)
+    if fields["amount_sold"] == 0 and fields["amount_paid"] == 0:
+        raise OpError("Enter an amount sold or paid.")
+    return {"receipt_number": _record(customer_id, fields, user_id, at, "Offline payment")}
+
+
+_HANDLERS = {"complete": _complete, "payment": _payment}
+
+
+def replay_ops(ops: list, user_id: int) -> list[dict]:
+    """Apply queued operations in order. Does not commit.
+
+    Returns one result per operation: ``{"key", "ok": True, ...}`` on
+    success, or ``{"key", "ok": False, "error", "retry"}`` where ``retry``
+    says whether sending it again later could help.
+    """
+    now = datetime.now(timezone.utc)
+    results = []
+    for op in ops:
+        key = op.get("key") if isinstance(op, dict) else None
+        handler = _HANDLERS.get(op.get("type")) if isinstance(op, dict) else None
+        if handler is None:
+            results.append({"key": key, "ok": False, "error": "Unknown operation.", "retry": False})
+            continue
+        keyed = idempotency.valid_key(key)
+        stored = idempotency.find(key, user_id) if keyed else None
+        if stored is not None:
+            results.append({"key": key, "ok": True, "replayed": True, **stored})
+            continue
+        try:
+            with db.session.begin_nested():
+                outcome = handler(op, user_id, _op_time(op.get("at"), now))
+                if keyed:
+                    idempotency.remember(key, user_id, f"route.sync.{op['type']}", outcome)
+        except OpError as exc:
+            results.append({"key": key, "ok": False, "error": str(exc), "retry": False})
+        except IntegrityError:
+            # Applied by a concurrent request carrying the same key
+            stored = idempotency.find(key, user_id) if keyed else None
+            if stored is None:
+                results.append({"key": key, "ok": False, "error": "Conflict.", "retry": True})
+            else:
+                results.append({"key": key, "ok": True, "replayed": True, **stored})
+        except Exception:
+            log.exception("Offline replay failed for %s", key)
+            results.append({"key": key, "ok": False, "error": "Server error.", "retry": True})
+        else:
+            results.append({"key": key, "ok": True, **outcome})
+    return results
@@ -372,6 +372,7 @@ def import_csv():
 @admin_required
 def backups():
     """Backup download page."""
+    from app.backup_schedule import outbox_status
     today = date.today()
     customer_count = Customer.query.count()
     payment_count = Payment.query.count()
@@ -382,6 +383,7 @@ def backups():
         customer_count=customer_count,
         payment_count=payment_count,
         stop_count=stop_count,
+        outbox=outbox_status(),
     )
 
 
@@ -402,8 +404,17 @@ def backup_full_archive():
 @bp.route("/backups/email-now", methods=["POST"])
 @admin_required
 def backup_email_now():
-    """Generate a backup and email it immediately."""
+    """Email a backup: via the backup scheduler when it's running, otherwise right away."""
     from app.backup import email_backup, make_backup, BackupError
+    from app.backup_schedule import request_backup, worker_alive
+    if worker_alive():
+        request_backup()
+        audit("backup_requested", "Requested an immediate backup email")
+        db.session.commit()
+        flash("Backup queued. The backup scheduler will build and email it within a minute.", "success")
+        return redirect(url_for("admin.backups"))
+
+    # No scheduler has checked in recently: nobody would pick a request up
     try:
         zip_bytes = make_backup()
         msg_id = email_backup(zip_bytes)
@@ -413,6 +424,8 @@ def backup_email_now():
     except Exception as exc:
         flash(f"Email failed: {exc}", "error")
         return redirect(url_for("admin.backups"))
+    audit("backup_emailed", "Emailed a backup directly (backup scheduler not running)")
+    db.session.commit()
     flash(f"Backup emailed (Resend id: {msg_id}).", "success")
     return redirect(url_for("admin.backups"))
 
@@ -456,6 +469,40 @@ def backup_restore():
     return redirect(url_for("admin.backups"))
 
 
+@bp.route("/backups/restore-selective", methods=["POST"])
+@admin_required
+def backup_restore_selective():
+    """Upsert chosen tables or one customer's rows from an uploaded backup zip."""
+    from app.backup import restore_selective, BackupError
+
+    if request.form.get("confirm", "") != "RESTORE":
+        flash("Restore aborted: confirmation phrase must be exactly RESTORE.", "warning")
+        return redirect(url_for("admin.backups"))
+
+    file = request.files.get("backup")
+    if not file or not file.filename or not secure_filename(file.filename).endswith(".zip"):
+        flash("Restore aborted: upload a .zip backup.", "warning")
+        return redirect(url_for("admin.backups"))
+
+    tables = [t.strip() for t in request.form.get("tables", "").split(",") if t.strip()]
+    customer_id = request.form.get("customer_id", type=int)
+
+    try:
+        result = restore_selective(file.read(), tables=tables or None, customer_id=customer_id)
+    except BackupError as exc:
+        flash(f"Restore failed: {exc}", "error")
+        return redirect(url_for("admin.backups"))
+    except Exception as exc:
+        flash(f"Restore failed: {exc}", "error")
+        return redirect(url_for("admin.backups"))
+
+    detail = ", ".join(f"{name}: {n:,}" for name, n in result["tables"].items())
+    audit("backup_restore_selective", f"Selective restore ({detail})")
+    db.session.commit()
+    flash(f"Selective restore complete: {result['rows']:,} rows ({detail}).", "success")
+    return redirect(url_for("admin.backups"))
+
+
 @bp.route("/backups/customers.csv")
 @admin_required
 def backup_customers():
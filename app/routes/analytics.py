@@ -283,7 +283,7 @@ def index():
         for r in top_stores_rows
     ]
 
-    # --- Needs attention: active customers not visited in 30+ days ---
+    # --- Needs attention: most overdue against their own visit cadence ---
     from app.helpers import get_needs_attention
     attention_list = get_needs_attention(limit=10)
 
@@ -408,3 +408,13 @@ def index():
         profit_delta=pct_change(profit, prev_profit),
         profit_margin=profit_margin,
     )
+
+
+@bp.route("/attention")
+def attention():
+    """Every active customer due a visit, ranked by overdue score."""
+    from app.attention import ranked_query
+
+    page = request.args.get("page", 1, type=int)
+    pagination = db.paginate(ranked_query(), page=page, per_page=25, error_out=False)
+    return render_template("attention.html", pagination=pagination, today=date.today())
@@ -2,7 +2,7 @@
 
 from datetime import date
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_login import login_required
 
 from sqlalchemy.orm import joinedload
@@ -10,6 +10,7 @@ from sqlalchemy.orm import joinedload
 from app import db
 from app.helpers import staff_required, format_date
 from app.models import Customer, Payment, RouteStop
+from app.route_bundle import bundle_bytes, route_etag
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
@@ -113,3 +114,25 @@ def route_today():
         "total_stops": len(data),
         "stops": data,
     })
+
+
+@bp.route("/route/<date_str>")
+def route_bundle(date_str):
+    """Everything the route page shows for a date, as one cacheable document.
+
+    Served with an ETag built from the date's RouteDay version; a client
+    sending it back in If-None-Match gets a 304 after a single lookup.
+    """
+    try:
+        route_date = date.fromisoformat(date_str)
+    except ValueError:
+        return jsonify({"error": "Invalid date."}), 400
+
+    etag = route_etag(route_date)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(bundle_bytes(route_date, etag), mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -1,21 +1,25 @@
 """Customers blueprint – CRUD, payments, notes, status."""
 
-import io
 from collections import OrderedDict
 from datetime import date, datetime, timezone
 from decimal import Decimal, InvalidOperation
 
 from flask import (
-    Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, send_file,
+    Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify,
 )
 from flask_login import login_required, current_user
 
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload, selectinload
 
 from app import db, limiter
 from app.models import Customer, Payment, Invoice, InvoiceItem, Note, ActivityLog, RouteStop, VALID_CUSTOMER_STATUSES, VALID_PAYMENT_TYPES
-from app.helpers import admin_required, staff_required, generate_receipt_number, generate_receipt_pdf, audit, safe_redirect, format_date
+from app.helpers import admin_required, staff_required, generate_receipt_number, audit, safe_redirect
+from app.geo import locate_customer
+from app import pdf_cache, pdf_engine
+from app import idempotency
+from app.payments import record_sale, sale_description
 import logging
 
 bp = Blueprint("customers", __name__, url_prefix="/customers")
@@ -302,6 +306,7 @@ def new():
             tax_exempt=bool(request.form.get("tax_exempt")),
             lead_source=request.form.get("lead_source", "").strip() or None,
         )
+        locate_customer(customer)
         db.session.add(customer)
         db.session.flush()
 
@@ -353,6 +358,7 @@ def edit(id):
             return render_template("customer_form.html", customer=customer), 400
 
         old_balance = customer.balance
+        old_location = (customer.address, customer.city)
         customer.name = name
         customer.customer_code = request.form.get("customer_code", "").strip() or None
         customer.address = request.form.get("address", "").strip()
@@ -363,6 +369,8 @@ def edit(id):
         customer.status = status
         customer.tax_exempt = bool(request.form.get("tax_exempt"))
         customer.lead_source = request.form.get("lead_source", "").strip() or None
+        if (customer.address, customer.city) != old_location:
+            locate_customer(customer)
 
         desc = f"Customer '{customer.name}' updated."
         if old_balance != balance:
@@ -405,6 +413,22 @@ def record_payment(id):
         flash(msg, "error")
         return redirect(redirect_to)
 
+    def _replayed(stored):
+        # A retry of a request that already went through: answer from its record
+        if is_fetch:
+            return jsonify({"ok": True, "replayed": True, **stored})
+        flash(f"Transaction already recorded. Invoice #{stored.get('receipt_number')}.", "info")
+        return redirect(redirect_to)
+
+    try:
+        idem_key = idempotency.request_key()
+    except ValueError as exc:
+        return _error(str(exc))
+    if idem_key:
+        stored = idempotency.find(idem_key, current_user.id)
+        if stored is not None:
+            return _replayed(stored)
+
     # Parse amounts
     raw_sold = request.form.get("amount_sold", "").strip()
     raw_paid = request.form.get("amount_paid", "").strip() or request.form.get("amount", "").strip()
@@ -431,74 +455,21 @@ def record_payment(id):
         payment_type = "other"
 
     try:
-        customer = db.session.query(Customer).filter_by(id=id).with_for_update().one()
-        previous_balance = customer.balance
-
-        # Apply sale (increases balance) then payment (decreases balance)
-        new_balance = previous_balance + amount_sold - amount_paid
-        overpayment = Decimal("0")
-        if new_balance < 0:
-            overpayment = -new_balance
-            new_balance = Decimal("0")
-        customer.balance = new_balance
-
-        receipt_number = generate_receipt_number()
-
-        # Record the payment entry
-        payment = Payment(
-            customer_id=customer.id,
-            amount=amount_paid,
+        sale = record_sale(
+            id,
             amount_sold=amount_sold,
+            amount_paid=amount_paid,
             payment_type=payment_type,
-            receipt_number=receipt_number,
-            previous_balance=previous_balance,
             notes=notes,
-            recorded_by=current_user.id,
+            user_id=current_user.id,
         )
-        db.session.add(payment)
-        db.session.flush()  # get payment.id for FIFO tracking
-        assert payment.id is not None, "Payment flush failed to generate ID"
-
-        # Auto-create invoice when a sale is recorded
-        if amount_sold > 0:
-            invoice = Invoice(
-                customer_id=customer.id,
-                invoice_number=receipt_number,
-                amount=amount_sold,
-                invoice_date=date.today(),
-                description=notes,
-                payment_type=payment_type,
-                status="paid" if amount_paid >= amount_sold else "unpaid",
-                created_by=current_user.id,
-            )
-            db.session.add(invoice)
-
-        # Mark unpaid invoices as paid FIFO, only up to what this payment covers.
-        # yield_per streams rows so we stop consuming once credit is exhausted.
-        if amount_paid > 0:
-            remaining_credit = amount_paid - amount_sold  # excess beyond the current sale
-            if remaining_credit > 0:
-                unpaid_invoices = Invoice.query.filter_by(
-                    customer_id=customer.id, status="unpaid"
-                ).order_by(Invoice.invoice_date.asc()).yield_per(100)
-                for inv in unpaid_invoices:
-                    if inv.invoice_number == receipt_number:
-                        continue  # skip the invoice we just created above
-                    if remaining_credit >= inv.amount:
-                        inv.status = "paid"
-                        inv.payment_type = payment_type
-                        inv.paid_by_payment_id = payment.id
-                        remaining_credit -= inv.amount
-                    else:
-                        break
+        customer = sale["customer"]
+        previous_balance, new_balance = sale["previous_balance"], sale["new_balance"]
+        receipt_number, overpayment = sale["receipt_number"], sale["overpayment"]
 
         # Build description
-        parts = []
-        if amount_sold > 0:
-            parts.append(f"Sold ${amount_sold:,.2f}")
-        if amount_paid > 0:
-            parts.append(f"Paid ${amount_paid:,.2f}")
-        desc = ". ".join(parts) + f". Invoice #{receipt_number}. Balance: ${previous_balance:,.2f} → ${new_balance:,.2f}."
+        desc = (sale_description(amount_sold, amount_paid)
+                + f". Invoice #{receipt_number}. Balance: ${previous_balance:,.2f} → ${new_balance:,.2f}.")
 
         db.session.add(ActivityLog(
             customer_id=customer.id,
@@ -508,7 +479,18 @@ def record_payment(id):
         ))
         audit("payment_recorded", f"{desc} Customer: {customer.name}")
 
+        if idem_key:
+            idempotency.remember(idem_key, current_user.id, "customers.record_payment", {
+                "receipt_number": receipt_number, "new_balance": str(new_balance),
+            })
         db.session.commit()
+    except IntegrityError:
+        # The same key was stored by a concurrent retry; that one won
+        db.session.rollback()
+        stored = idempotency.find(idem_key, current_user.id) if idem_key else None
+        if stored is None:
+            return _error("An error occurred while recording the transaction.")
+        return _replayed(stored)
     except Exception:
         logging.exception("Transaction failed")
         db.session.rollback()
@@ -582,6 +564,9 @@ def delete_payment(id, payment_id):
         flash("An error occurred while deleting the payment.", "error")
         return redirect(url_for("customers.profile", id=id))
 
+    pdf_cache.invalidate("receipt", payment_id)
+    if auto_invoice:
+        pdf_cache.invalidate("invoice", auto_invoice.id)
     flash(f"Payment #{payment.receipt_number} deleted and balance restored.", "success")
     return redirect(url_for("customers.profile", id=id))
 
@@ -788,6 +773,7 @@ def delete_invoice(id, invoice_id):
         flash("Failed to delete invoice.", "error")
         return redirect(url_for("customers.profile", id=id))
 
+    pdf_cache.invalidate("invoice", invoice_id)
     flash("Invoice deleted and balance adjusted.", "success")
     return redirect(url_for("customers.profile", id=id))
 
@@ -976,147 +962,25 @@ def delete_note(id, note_id):
 @bp.route("/<int:id>/invoices/<int:invoice_id>/pdf")
 @login_required
 def invoice_pdf(id, invoice_id):
-    """Generate a PDF invoice with company logo."""
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib import colors
-    import os
-
-    from xml.sax.saxutils import escape as xml_escape
-
-    invoice = Invoice.query.get_or_404(invoice_id)
+    """Serve a PDF invoice with company logo, cached until the invoice changes."""
+    invoice = Invoice.query.options(selectinload(Invoice.items)).get_or_404(invoice_id)
     if invoice.customer_id != id:
         abort(404)
     customer = Customer.query.get_or_404(id)
 
-    buf = io.BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Logo
-    logo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "static", "img", "logo.png")
-    if os.path.exists(logo_path):
-        try:
-            logo = Image(logo_path, width=1.2 * inch, height=1.2 * inch)
-            logo.hAlign = "CENTER"
-            elements.append(logo)
-            elements.append(Spacer(1, 12))
-        except Exception:
-            pass
-
-    # Title
-    title_style = ParagraphStyle("InvTitle", parent=styles["Title"], fontSize=20, spaceAfter=6)
-    elements.append(Paragraph("INVOICE", title_style))
-    elements.append(Spacer(1, 12))
-
-    # Invoice details
-    detail_style = ParagraphStyle("Detail", parent=styles["Normal"], fontSize=11, spaceAfter=4)
-    normal_center = ParagraphStyle("NormalCenter", parent=styles["Normal"], alignment=1)
-    if invoice.invoice_number:
-        elements.append(Paragraph(f"<b>Invoice #:</b> {xml_escape(invoice.invoice_number)}", detail_style))
-    elements.append(Paragraph(f"<b>Date:</b> {format_date(invoice.invoice_date, '%B %d, %Y')}", detail_style))
-    elements.append(Paragraph(f"<b>Status:</b> {invoice.status.upper()}", detail_style))
-    if invoice.payment_type:
-        elements.append(Paragraph(f"<b>Payment Type:</b> {invoice.payment_type.capitalize()}", detail_style))
-    elements.append(Spacer(1, 16))
-
-    # Customer info
-    elements.append(Paragraph("<b>Bill To:</b>", detail_style))
-    elements.append(Paragraph(xml_escape(customer.name), detail_style))
-    if customer.address:
-        elements.append(Paragraph(xml_escape(customer.address), detail_style))
-    if customer.city:
-        elements.append(Paragraph(xml_escape(customer.city), detail_style))
-    if customer.phone:
-        elements.append(Paragraph(xml_escape(customer.phone), detail_style))
-    elements.append(Spacer(1, 20))
-
-    # Line items table
-    from decimal import Decimal as Dec
-    line_items = invoice.items or []
-
-    if line_items:
-        data = [["Item #", "Description", "Qty", "Weight", "Unit Price", "Amount"]]
-        subtotal = Dec("0")
-        for item in line_items:
-            data.append([
-                item.item_number or "",
-                item.description or "",
-                f"{item.quantity:g}" if item.quantity else "",
-                item.weight or "",
-                f"${item.unit_price:,.2f}" if item.unit_price else "",
-                f"${item.amount:,.2f}",
-            ])
-            subtotal += item.amount or Dec("0")
-
-        total = invoice.amount
-
-        data.append(["", "", "", "", "Total:", f"${total:,.2f}"])
-
-        t = Table(data, colWidths=[0.8 * inch, 1.8 * inch, 0.6 * inch, 0.8 * inch, 1 * inch, 1 * inch], repeatRows=1)
-        t.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#374151")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("ALIGN", (-2, 0), (-1, -1), "RIGHT"),
-            ("ALIGN", (2, 0), (2, -1), "CENTER"),
-            ("LINEBELOW", (0, 0), (-1, 0), 1, colors.HexColor("#4b5563")),
-            ("LINEABOVE", (0, -1), (-1, -1), 1, colors.HexColor("#4b5563")),
-            ("FONTNAME", (-2, -1), (-1, -1), "Helvetica-Bold"),
-            ("TOPPADDING", (0, 0), (-1, -1), 6),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ]))
-    else:
-        # Fallback: single-line invoice (e.g. from quick sale)
-        total = invoice.amount
-
-        data = [
-            ["Description", "Amount"],
-            [invoice.description or "Goods/Services", f"${invoice.amount:,.2f}"],
-            ["", ""],
-            ["Total", f"${total:,.2f}"],
-        ]
-        t = Table(data, colWidths=[4 * inch, 2 * inch])
-        t.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE", (0, 0), (-1, -1), 11),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#374151")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("ALIGN", (1, 0), (1, -1), "RIGHT"),
-            ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
-            ("LINEBELOW", (0, 0), (-1, 0), 1, colors.HexColor("#4b5563")),
-            ("LINEABOVE", (0, -1), (-1, -1), 1, colors.HexColor("#4b5563")),
-            ("TOPPADDING", (0, 0), (-1, -1), 8),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-        ]))
-
-    elements.append(t)
-    elements.append(Spacer(1, 0.5 * inch))
-
-    if invoice.status == "void":
-        elements.append(Paragraph("THIS INVOICE HAS BEEN VOIDED", ParagraphStyle(
-            "Void", parent=normal_center, fontSize=14, textColor=colors.red,
-            fontName="Helvetica-Bold",
-        )))
-    elif invoice.status == "unpaid":
-        elements.append(Paragraph(
-            f"Balance owing: ${total:,.2f}. Please remit payment at your earliest convenience.",
-            normal_center,
-        ))
-    else:
-        elements.append(Paragraph("Thank you for your payment!", normal_center))
-
-    doc.build(elements)
-    buf.seek(0)
+    fields = {
+        "invoice": [invoice.invoice_number, invoice.invoice_date, invoice.status,
+                    invoice.payment_type, invoice.amount, invoice.description],
+        "items": [[item.item_number, item.description, item.quantity, item.weight,
+                   item.unit_price, item.amount] for item in invoice.items or []],
+        "customer": [customer.name, customer.address, customer.city, customer.phone],
+    }
 
     import re
     safe_name = re.sub(r'[^\w-]', '_', customer.name)
     filename = f"invoice_{invoice.invoice_number or invoice.id}_{safe_name}.pdf"
-    return send_file(buf, mimetype="application/pdf", as_attachment=False, download_name=filename)
+    return pdf_cache.pdf_response("invoice", invoice.id, fields, lambda: pdf_engine.render_invoice(invoice, customer),
+                                  download_name=filename)
 
 
 # ---------------------------------------------------------------------------
@@ -1126,16 +990,20 @@ def invoice_pdf(id, invoice_id):
 @bp.route("/<int:id>/payments/<int:payment_id>/pdf")
 @login_required
 def payment_receipt_pdf(id, payment_id):
-    """Generate a PDF receipt for a single payment."""
+    """Serve the PDF receipt for a single payment, cached until it changes."""
     payment = Payment.query.get_or_404(payment_id)
     if payment.customer_id != id:
         abort(404)
     customer = Customer.query.get_or_404(id)
 
-    pdf_bytes = generate_receipt_pdf(payment, customer)
-    buf = io.BytesIO(pdf_bytes)
+    fields = {
+        "payment": [payment.receipt_number, payment.payment_date, payment.payment_type, payment.amount,
+                    payment.amount_sold, payment.previous_balance, payment.notes],
+        "customer": [customer.name],
+    }
 
     import re
     safe_name = re.sub(r'[^\w-]', '_', customer.name)
     filename = f"{payment.receipt_number}_{safe_name}.pdf"
-    return send_file(buf, mimetype="application/pdf", as_attachment=False, download_name=filename)
+    return pdf_cache.pdf_response("receipt", payment.id, fields, lambda: pdf_engine.render_receipt(payment, customer),
+                                  download_name=filename)
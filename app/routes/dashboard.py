@@ -9,6 +9,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 
 from app import db
+from app.closeout import current_snapshot as closeout_snapshot
 from app.helpers import TZ_DISPLAY
 from app.models import Customer, RouteStop, Payment
 
@@ -26,13 +27,18 @@ def index():
     yest_start = datetime(yesterday.year, yesterday.month, yesterday.day, tzinfo=timezone.utc)
     yest_end = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59, 999999, tzinfo=timezone.utc)
 
-    # Route-stop KPIs (combined into single query)
-    stop_stats = db.session.query(
-        func.count(RouteStop.id),
-        func.sum(db.case((RouteStop.completed.is_(True), 1), else_=0)),
-    ).filter(RouteStop.route_date == today).first()
-    total_stops = stop_stats[0] or 0
-    completed_stops = int(stop_stats[1] or 0)
+    # Route-stop KPIs: from today's close-out if it's current, else one query
+    _, closed_today = closeout_snapshot(today)
+    if closed_today is not None:
+        total_stops = closed_today["total_stops"]
+        completed_stops = closed_today["completed_stops"]
+    else:
+        stop_stats = db.session.query(
+            func.count(RouteStop.id),
+            func.sum(db.case((RouteStop.completed.is_(True), 1), else_=0)),
+        ).filter(RouteStop.route_date == today).first()
+        total_stops = stop_stats[0] or 0
+        completed_stops = int(stop_stats[1] or 0)
 
     # Payment KPIs (today) — count, sum, and max in a single query
     payment_stats = db.session.query(
@@ -55,12 +61,16 @@ def index():
     # Today's avg order value
     avg_order_today = round(float(sales_sum) / sales_count, 2) if sales_count else 0
 
-    # Yesterday's sales for comparison
-    yest_sales = db.session.query(
-        func.coalesce(func.sum(Payment.amount_sold), Decimal("0")),
-    ).filter(
-        Payment.payment_date >= yest_start, Payment.payment_date <= yest_end
-    ).scalar() or Decimal("0")
+    # Yesterday's sales for comparison, from its close-out when there is one
+    _, closed_yesterday = closeout_snapshot(yesterday)
+    if closed_yesterday is not None:
+        yest_sales = Decimal(closed_yesterday["sales_sum"])
+    else:
+        yest_sales = db.session.query(
+            func.coalesce(func.sum(Payment.amount_sold), Decimal("0")),
+        ).filter(
+            Payment.payment_date >= yest_start, Payment.payment_date <= yest_end
+        ).scalar() or Decimal("0")
 
     # Outstanding today — sold today minus collected today
     total_outstanding = max(sales_sum - payment_sum, Decimal("0"))
@@ -3,66 +3,55 @@
 from datetime import date, timedelta
 
 from flask import (
-    Blueprint, render_template, request, redirect, url_for, flash, jsonify,
+    Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify,
 )
 from flask_login import login_required, current_user
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
 from app import db
-from app.helpers import staff_required
-from app.models import Customer, RouteStop, RecurringStop, RecurringSkip
+from app.customer_index import index_bytes, index_version, search
+from app.geo import customers_near
+from app.helpers import audit, staff_required
+from app.models import Customer, RouteDay, RouteStop, RecurringStop, RecurringSkip
+from app.planning import DEFAULT_DAY_CAPACITY, apply_week_plan, bulk_add_stops, plan_week
+from app.route_optimizer import budget_seconds, depot_from_env, optimize_order
+from app.recurring import (
+    horizon_days, materialize_recurring, projected_counts, projected_stops,
+    reset_next_occurrence,
+)
 
 bp = Blueprint("planner", __name__, url_prefix="/planner")
 
 
-def _auto_populate_recurring(target_date):
-    """Create RouteStops from active recurring schedules for target_date."""
-    existing_ids = {
-        s.customer_id
-        for s in RouteStop.query.filter(RouteStop.route_date == target_date).all()
-    }
-
-    recurring = RecurringStop.query.filter(
-        RecurringStop.is_active.is_(True),
-        RecurringStop.start_date <= target_date,
-    ).all()
-
-    matching = [r for r in recurring if r.matches(target_date) and r.customer_id not in existing_ids]
-    if not matching:
-        return
-
-    # Check for skips
-    matching_ids = [r.id for r in matching]
-    skipped = {
-        s.recurring_stop_id
-        for s in RecurringSkip.query.filter(
-            RecurringSkip.recurring_stop_id.in_(matching_ids),
-            RecurringSkip.skip_date == target_date,
-        ).all()
-    }
+def _day_stops_json(route_date):
+    """All stops on a date, shaped for the planner's Alpine state."""
+    stops = (
+        RouteStop.query.options(joinedload(RouteStop.customer))
+        .join(Customer)
+        .filter(RouteStop.route_date == route_date)
+        .order_by(RouteStop.sequence).all()
+    )
+    return [
+        {"id": s.id, "customer_id": s.customer_id, "customer_name": s.customer.name,
+         "city": s.customer.city or "", "sequence": s.sequence, "completed": s.completed}
+        for s in stops
+    ]
 
-    max_seq = (
-        db.session.query(db.func.max(RouteStop.sequence))
-        .filter(RouteStop.route_date == target_date)
-        .scalar()
-    ) or 0
-
-    added = 0
-    for r in matching:
-        if r.id in skipped:
-            continue
-        max_seq += 1
-        db.session.add(RouteStop(
-            customer_id=r.customer_id,
-            route_date=target_date,
-            sequence=max_seq,
-            created_by=r.created_by,
-        ))
-        added += 1
 
-    if added:
-        db.session.commit()
+def _projected_json(route_date):
+    """Recurring occurrences on a date that have not been generated yet."""
+    return [
+        {
+            "recurring_id": r.id,
+            "customer_id": r.customer_id,
+            "customer_name": r.customer.name,
+            "city": r.customer.city or "",
+            "frequency_label": r.frequency_label,
+        }
+        for r in sorted(projected_stops(route_date), key=lambda r: r.customer.name)
+    ]
 
 
 @bp.route("/")
@@ -78,59 +67,7 @@ def index():
     else:
         selected_date = date.today()
 
-    # Auto-populate from recurring schedules
-    _auto_populate_recurring(selected_date)
-
-    stops = (
-        RouteStop.query
-        .options(joinedload(RouteStop.customer))
-        .join(Customer)
-        .filter(RouteStop.route_date == selected_date)
-        .order_by(RouteStop.sequence)
-        .all()
-    )
-
-    customers = (
-        Customer.query
-        .filter(Customer.status == "active")
-        .order_by(Customer.city, Customer.name)
-        .all()
-    )
-
-    # Cities with customer counts for the bulk-add panel
-    cities = (
-        db.session.query(Customer.city, func.count(Customer.id).label("count"))
-        .filter(Customer.status == "active", Customer.city.isnot(None), Customer.city != "")
-        .group_by(Customer.city)
-        .order_by(func.count(Customer.id).desc())
-        .all()
-    )
-
-    # IDs already on this date's route
-    existing_ids = {s.customer_id for s in stops}
-
-    stops_json = [
-        {
-            "id": s.id,
-            "customer_id": s.customer_id,
-            "customer_name": s.customer.name,
-            "city": s.customer.city or "",
-            "sequence": s.sequence,
-            "completed": s.completed,
-        }
-        for s in stops
-    ]
-
-    customers_json = [
-        {
-            "id": c.id,
-            "name": c.name,
-            "city": c.city or "",
-            "phone": c.phone or "",
-            "balance": float(c.balance) if c.balance else 0.0,
-        }
-        for c in customers
-    ]
+    stops_json = _day_stops_json(selected_date)
 
     # Active recurring schedules
     recurring_stops = (
@@ -151,6 +88,7 @@ def index():
             "frequency_label": r.frequency_label,
             "start_date": r.start_date.isoformat(),
             "end_date": r.end_date.isoformat() if r.end_date else None,
+            "next_occurrence": r.next_occurrence.isoformat() if r.next_occurrence else None,
         }
         for r in recurring_stops
     ]
@@ -158,16 +96,61 @@ def index():
     return render_template(
         "planner.html",
         selected_date=selected_date,
-        stops=stops,
         stops_json=stops_json,
-        customers=customers,
-        customers_json=customers_json,
-        cities=cities,
-        existing_ids=existing_ids,
+        customer_index_url=url_for("planner.customer_index", v=index_version()),
         recurring_json=recurring_json,
+        projected_json=_projected_json(selected_date),
+        route_version=RouteDay.version_of(selected_date),
     )
 
 
+@bp.route("/day/<date_str>")
+@login_required
+def day(date_str):
+    """One date's stops and projected recurring stops, for switching dates in place."""
+    try:
+        route_date = date.fromisoformat(date_str)
+    except ValueError:
+        return jsonify({"error": "Invalid date."}), 400
+    return jsonify({
+        "date": route_date.isoformat(),
+        "stops": _day_stops_json(route_date),
+        "projected": _projected_json(route_date),
+        "version": RouteDay.version_of(route_date),
+    })
+
+
+@bp.route("/customers.json")
+@login_required
+def customer_index():
+    """Active customers as a compact, versioned index (see app.customer_index).
+
+    Requested with the current ``v`` it may be cached indefinitely: any
+    customer change yields a new version, and so a new URL.
+    """
+    version = index_version()
+    if version in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(index_bytes(version), mimetype="application/json")
+    response.set_etag(version)
+    if request.args.get("v") == version:
+        response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@bp.route("/customers/search")
+@login_required
+def customer_search():
+    """Active customers matching ``q``, ``page`` at a time."""
+    q = request.args.get("q", "").strip()[:100]
+    if len(q) < 2:
+        return jsonify({"results": [], "page": 1, "has_more": False})
+    return jsonify(search(q, page=request.args.get("page", 1, type=int)))
+
+
 # ---------------------------------------------------------------------------
 # Add stop
 # ---------------------------------------------------------------------------
@@ -217,7 +200,15 @@ def add_stop():
         created_by=current_user.id,
     )
     db.session.add(stop)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Someone else added the same customer to this date first
+        db.session.rollback()
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return jsonify({"error": f"{customer.name} is already on this route."}), 409
+        flash(f"{customer.name} is already on this route.", "warning")
+        return redirect(url_for("planner.index", date=route_date.isoformat()))
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify({
@@ -227,6 +218,7 @@ def add_stop():
             "city": customer.city or "",
             "sequence": stop.sequence,
             "completed": False,
+            "version": RouteDay.version_of(route_date),
         })
 
     flash(f"{customer.name} added to route on {route_date.isoformat()}.", "success")
@@ -241,9 +233,10 @@ def add_stop():
 @login_required
 @staff_required
 def add_city():
-    """Add all active customers in a city to a route date."""
+    """Add all active customers in a city to a route date (or through a later date)."""
     city = request.form.get("city", "").strip()
     route_date_str = request.form.get("route_date", "")
+    through_str = request.form.get("through", "")
 
     if not city or not route_date_str:
         flash("City and date are required.", "error")
@@ -251,59 +244,22 @@ def add_city():
 
     try:
         route_date = date.fromisoformat(route_date_str)
-    except ValueError:
-        flash("Invalid date.", "error")
+        through = date.fromisoformat(through_str) if through_str else route_date
+        result = bulk_add_stops(route_date, through, cities=[city], created_by=current_user.id)
+    except ValueError as exc:
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return jsonify({"error": str(exc)}), 400
+        flash("Invalid date range.", "error")
         return redirect(url_for("planner.index"))
 
-    # Get customers in this city not already on the route
-    existing_ids = {
-        s.customer_id
-        for s in RouteStop.query.filter(RouteStop.route_date == route_date).all()
-    }
-
-    city_customers = (
-        Customer.query
-        .filter(Customer.status == "active", Customer.city == city)
-        .order_by(Customer.name)
-        .all()
-    )
-
-    max_seq = (
-        db.session.query(db.func.max(RouteStop.sequence))
-        .filter(RouteStop.route_date == route_date)
-        .scalar()
-    ) or 0
-
-    added = 0
-    for c in city_customers:
-        if c.id not in existing_ids:
-            max_seq += 1
-            db.session.add(RouteStop(
-                customer_id=c.id,
-                route_date=route_date,
-                sequence=max_seq,
-                created_by=current_user.id,
-            ))
-            added += 1
-
     db.session.commit()
+    added = result["added"]
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         # Return all stops for this date so the client can rebuild
-        all_stops = (
-            RouteStop.query.options(joinedload(RouteStop.customer))
-            .join(Customer)
-            .filter(RouteStop.route_date == route_date)
-            .order_by(RouteStop.sequence).all()
-        )
-        return jsonify({
-            "added": added,
-            "stops": [
-                {"id": s.id, "customer_id": s.customer_id, "customer_name": s.customer.name,
-                 "city": s.customer.city or "", "sequence": s.sequence, "completed": s.completed}
-                for s in all_stops
-            ],
-        })
+        return jsonify({"added": added, "days": result["days"],
+                        "stops": _day_stops_json(route_date),
+                        "version": RouteDay.version_of(route_date)})
 
     if added:
         flash(f"Added {added} stop{'s' if added != 1 else ''} from {city}.", "success")
@@ -313,6 +269,145 @@ def add_city():
     return redirect(url_for("planner.index", date=route_date.isoformat()))
 
 
+@bp.route("/bulk-add", methods=["POST"])
+@login_required
+@staff_required
+def bulk_add():
+    """JSON bulk add: ``{"cities": [...], "customer_ids": [...], "start", "end"}``.
+
+    Every active customer in the cities (plus any listed ids) is put on every
+    day in the range, skipping days they're already on, in one statement.
+    """
+    data = request.get_json(silent=True) or {}
+    cities = data.get("cities") or []
+    customer_ids = data.get("customer_ids") or []
+    if not isinstance(cities, list) or not all(isinstance(c, str) for c in cities):
+        return jsonify({"error": "cities must be an array of names."}), 400
+    if not isinstance(customer_ids, list) or not all(isinstance(i, int) for i in customer_ids):
+        return jsonify({"error": "customer_ids must be an array of ids."}), 400
+    if not cities and not customer_ids:
+        return jsonify({"error": "Provide cities or customer_ids."}), 400
+
+    try:
+        start = date.fromisoformat(data.get("start") or "")
+        end = date.fromisoformat(data.get("end") or data.get("start") or "")
+        result = bulk_add_stops(start, end, cities=cities, customer_ids=customer_ids,
+                                created_by=current_user.id)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    db.session.commit()
+    return jsonify(result)
+
+
+# ---------------------------------------------------------------------------
+# Week planner
+# ---------------------------------------------------------------------------
+
+@bp.route("/week", methods=["GET"])
+@login_required
+@staff_required
+def week():
+    """Preview a balanced assignment of due visits across a week. Writes nothing."""
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+    except ValueError:
+        start = today + timedelta(days=(7 - today.weekday()) % 7 or 7)  # next Monday
+    try:
+        end = date.fromisoformat(request.args.get("end", ""))
+    except ValueError:
+        end = start + timedelta(days=4)
+    capacity = max(request.args.get("capacity", DEFAULT_DAY_CAPACITY, type=int) or 1, 1)
+    weekdays_only = request.args.get("weekends") != "1"
+    include_attention = request.args.get("attention", "1") == "1"
+
+    try:
+        plan = plan_week(start, end, capacity=capacity, weekdays_only=weekdays_only,
+                         include_attention=include_attention)
+    except ValueError as exc:
+        flash(str(exc), "error")
+        plan = None
+    else:
+        # dateformat treats ISO strings as UTC timestamps; hand it real dates
+        for day in plan["days"]:
+            day["day"] = date.fromisoformat(day["date"])
+            day["add"] = [
+                {**a, "preferred_day": date.fromisoformat(a["preferred"]) if a["preferred"] else None}
+                for a in day["add"]
+            ]
+
+    return render_template(
+        "planner_week.html",
+        start=start,
+        end=end,
+        capacity=capacity,
+        weekdays_only=weekdays_only,
+        include_attention=include_attention,
+        plan=plan,
+    )
+
+
+@bp.route("/week", methods=["POST"])
+@login_required
+@staff_required
+def week_apply():
+    """Commit a previewed week plan (the assignments JSON from the preview form)."""
+    import json
+
+    start = request.form.get("start", "")
+    try:
+        assignments = json.loads(request.form.get("assignments", "[]"))
+        if not isinstance(assignments, list):
+            raise ValueError("Malformed plan")
+        result = apply_week_plan(assignments, created_by=current_user.id)
+    except ValueError as exc:
+        db.session.rollback()
+        flash(f"Could not apply plan: {exc}", "error")
+        return redirect(url_for("planner.week", start=start))
+
+    audit("week_planned", f"Week plan applied from {start}: {result['added']} stops, "
+                          f"{result['moved']} recurring visits moved")
+    db.session.commit()
+    flash(f"Added {result['added']} stop{'s' if result['added'] != 1 else ''} "
+          f"across the week.", "success")
+    return redirect(url_for("planner.index", date=start))
+
+
+# ---------------------------------------------------------------------------
+# Generate recurring stops
+# ---------------------------------------------------------------------------
+
+@bp.route("/generate", methods=["POST"])
+@login_required
+@staff_required
+def generate():
+    """Create the recurring stops due up to and including a date. Idempotent."""
+    route_date_str = request.form.get("route_date", "")
+    try:
+        through = date.fromisoformat(route_date_str)
+    except ValueError:
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return jsonify({"error": "Invalid date."}), 400
+        flash("Invalid date.", "error")
+        return redirect(url_for("planner.index"))
+
+    result = materialize_recurring(through)
+    db.session.commit()
+
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return jsonify({
+            "added": result["created"],
+            "stops": _day_stops_json(through),
+            "projected": _projected_json(through),
+            "version": RouteDay.version_of(through),
+        })
+
+    created = result["created"]
+    flash(f"Generated {created} recurring stop{'s' if created != 1 else ''}.", "success")
+    return redirect(url_for("planner.index", date=through.isoformat()))
+
+
 # ---------------------------------------------------------------------------
 # Remove stop
 # ---------------------------------------------------------------------------
@@ -343,7 +438,8 @@ def remove_stop(id):
     db.session.commit()
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return jsonify({"success": True, "customer_id": customer_id})
+        return jsonify({"success": True, "customer_id": customer_id,
+                        "version": RouteDay.version_of(route_date)})
 
     flash("Stop removed from route.", "success")
     return redirect(url_for("planner.index", date=stop.route_date.isoformat()))
@@ -357,28 +453,129 @@ def remove_stop(id):
 @login_required
 @staff_required
 def reorder():
-    """Receive JSON array of stop IDs in new order and update sequences."""
+    """Resequence a day's stops: ``{"route_date", "version", "stop_ids": [...]}``.
+
+    ``version`` is the RouteDay version the client last saw. It is claimed
+    with a conditional UPDATE; if the route changed since then the request is
+    refused with 409 and the current stops, so the client can redo the move
+    on fresh data. Sequences are then written by one ``UPDATE ... CASE``.
+    """
     data = request.get_json(silent=True)
     if not data or "stop_ids" not in data:
         return jsonify({"error": "Missing stop_ids array."}), 400
 
     stop_ids = data["stop_ids"]
-    if not isinstance(stop_ids, list):
-        return jsonify({"error": "stop_ids must be an array."}), 400
+    if not isinstance(stop_ids, list) or not all(isinstance(i, int) for i in stop_ids):
+        return jsonify({"error": "stop_ids must be an array of ids."}), 400
+    if len(set(stop_ids)) != len(stop_ids):
+        return jsonify({"error": "stop_ids contains duplicates."}), 400
+    version = data.get("version")
+    if not isinstance(version, int) or isinstance(version, bool):
+        return jsonify({"error": "version is required."}), 400
+    try:
+        route_date = date.fromisoformat(data.get("route_date") or "")
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid route_date."}), 400
+    if not stop_ids:
+        return jsonify({"success": True, "count": 0, "version": RouteDay.version_of(route_date)})
+
+    new_version = RouteDay.claim(route_date, version)
+    if new_version is None:
+        db.session.rollback()
+        return jsonify({
+            "error": "This route was changed on another device.",
+            "version": RouteDay.version_of(route_date),
+            "stops": _day_stops_json(route_date),
+        }), 409
+
+    table = RouteStop.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.id.in_(stop_ids), table.c.route_date == route_date)
+        .values(sequence=db.case(
+            {stop_id: seq for seq, stop_id in enumerate(stop_ids, start=1)},
+            value=table.c.id,
+        ))
+    )
+    if result.rowcount != len(stop_ids):
+        db.session.rollback()
+        return jsonify({"error": "Some stops are not on this route."}), 400
+
+    db.session.commit()
+    return jsonify({"success": True, "count": len(stop_ids), "version": new_version})
+
 
-    # Validate all stops exist and belong to the same date
-    stops = RouteStop.query.filter(RouteStop.id.in_(stop_ids)).all()
-    stop_map = {s.id: s for s in stops}
-    dates = {s.route_date for s in stops}
-    if len(dates) > 1:
-        return jsonify({"error": "Cannot reorder stops across different dates."}), 400
+# ---------------------------------------------------------------------------
+# Optimize stop order
+# ---------------------------------------------------------------------------
 
-    for index, stop_id in enumerate(stop_ids, start=1):
-        if stop_id in stop_map:
-            stop_map[stop_id].sequence = index
+@bp.route("/optimize", methods=["POST"])
+@login_required
+@staff_required
+def optimize():
+    """Resequence a day's pending stops into a short driving order.
 
+    Completed stops keep their place at the front. Stops whose customer has
+    no coordinates can't be placed, so they follow the optimized ones in
+    their current order.
+    """
+    route_date_str = request.form.get("route_date", "")
+    try:
+        route_date = date.fromisoformat(route_date_str)
+    except ValueError:
+        return jsonify({"error": "Invalid date."}), 400
+
+    stops = (
+        RouteStop.query.options(joinedload(RouteStop.customer))
+        .filter(RouteStop.route_date == route_date)
+        .order_by(RouteStop.sequence, RouteStop.id)
+        .all()
+    )
+    done = [s for s in stops if s.completed]
+    located = [s for s in stops if not s.completed and s.customer.coordinates]
+    unlocated = [s for s in stops if not s.completed and not s.customer.coordinates]
+
+    result = optimize_order(
+        [s.customer.coordinates for s in located],
+        depot=depot_from_env(),
+        time_budget=budget_seconds(),
+    )
+    ordered = done + [located[i] for i in result["order"]] + unlocated
+    for seq, stop in enumerate(ordered, start=1):
+        stop.sequence = seq
     db.session.commit()
-    return jsonify({"success": True, "count": len(stop_ids)})
+
+    return jsonify({
+        "stops": _day_stops_json(route_date),
+        "version": RouteDay.version_of(route_date),
+        "optimized": len(located),
+        "unlocated": len(unlocated),
+        "distance_km": result["distance_km"],
+        "initial_km": result["initial_km"],
+    })
+
+
+# ---------------------------------------------------------------------------
+# Nearby customers
+# ---------------------------------------------------------------------------
+
+@bp.route("/nearby/<int:customer_id>")
+@login_required
+def nearby(customer_id):
+    """Active customers within ``km`` (default 5) of a customer, nearest first."""
+    customer = Customer.query.get_or_404(customer_id)
+    km = request.args.get("km", 5.0, type=float)
+    if not customer.coordinates:
+        return jsonify({"error": f"{customer.name} has no coordinates."}), 404
+    if not 0 < km <= 100:
+        return jsonify({"error": "km must be between 0 and 100."}), 400
+
+    hits = customers_near(*customer.coordinates, km, exclude_id=customer.id)
+    return jsonify([
+        {"id": c.id, "name": c.name, "city": c.city or "", "distance_km": round(d, 2)}
+        for c, d in hits
+        if c.status == "active"
+    ][:50])
 
 
 # ---------------------------------------------------------------------------
@@ -406,6 +603,7 @@ def recurring_list():
             "frequency_label": r.frequency_label,
             "start_date": r.start_date.isoformat(),
             "end_date": r.end_date.isoformat() if r.end_date else None,
+            "next_occurrence": r.next_occurrence.isoformat() if r.next_occurrence else None,
         }
         for r in recurring
     ])
@@ -442,6 +640,7 @@ def recurring_add():
         existing.interval_days = interval_days
         existing.start_date = start
         existing.end_date = None
+        reset_next_occurrence(existing)
         db.session.commit()
         r = existing
     else:
@@ -451,9 +650,13 @@ def recurring_add():
             start_date=start,
             created_by=current_user.id,
         )
+        reset_next_occurrence(r)
         db.session.add(r)
         db.session.commit()
 
+    materialize_recurring(date.today() + timedelta(days=horizon_days()))
+    db.session.commit()
+
     return jsonify({
         "id": r.id,
         "customer_id": r.customer_id,
@@ -463,6 +666,10 @@ def recurring_add():
         "frequency_label": r.frequency_label,
         "start_date": r.start_date.isoformat(),
         "end_date": None,
+        "next_occurrence": r.next_occurrence.isoformat() if r.next_occurrence else None,
+        "stops": _day_stops_json(start),
+        "projected": _projected_json(start),
+        "version": RouteDay.version_of(start),
     })
 
 
@@ -478,30 +685,47 @@ def recurring_delete(id):
 
 
 # ---------------------------------------------------------------------------
-# All stops (JSON for calendar / Alpine.js)
+# Calendar (JSON for Alpine.js)
 # ---------------------------------------------------------------------------
 
-@bp.route("/all-stops")
+# Longest range the calendar endpoint will project in one request
+MAX_CALENDAR_DAYS = 400
+
+
+@bp.route("/calendar")
 @login_required
-def all_stops():
-    """Return JSON of stop counts per date for calendar rendering."""
-    cutoff = date.today() - timedelta(days=90)
+def calendar():
+    """Per-day stop counts for a date range: actual stops plus recurring projection.
+
+    ``start`` and ``end`` are ISO dates (inclusive). Returns
+    ``{date: {"total", "done", "projected"}}`` for days with any stops.
+    """
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+        end = date.fromisoformat(request.args.get("end", ""))
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO dates."}), 400
+    if end < start:
+        return jsonify({"error": "end must not be before start."}), 400
+    if (end - start).days >= MAX_CALENDAR_DAYS:
+        return jsonify({"error": f"Range is limited to {MAX_CALENDAR_DAYS} days."}), 400
+
     rows = (
         db.session.query(
             RouteStop.route_date,
             func.count(RouteStop.id).label("total"),
             func.sum(db.case((RouteStop.completed.is_(True), 1), else_=0)).label("done"),
         )
-        .filter(RouteStop.route_date >= cutoff)
+        .filter(RouteStop.route_date >= start, RouteStop.route_date <= end)
         .group_by(RouteStop.route_date)
         .all()
     )
-
-    result = {}
-    for r in rows:
-        result[r.route_date.isoformat()] = {
-            "total": r.total,
-            "done": int(r.done or 0),
-        }
+    result = {
+        r.route_date.isoformat(): {"total": r.total, "done": int(r.done or 0), "projected": 0}
+        for r in rows
+    }
+    for day, count in projected_counts(start, end).items():
+        entry = result.setdefault(day.isoformat(), {"total": 0, "done": 0, "projected": 0})
+        entry["projected"] = count
 
     return jsonify(result)
@@ -1,22 +1,30 @@
 """Route blueprint – daily route execution, completion tracking, receipts."""
 
-import io
-import zipfile
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal, InvalidOperation
 
 from flask import (
-    Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify,
-    make_response,
+    Blueprint, render_template, request, redirect, url_for, flash, jsonify,
+    make_response, Response, send_file, current_app, send_from_directory,
 )
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy.exc import IntegrityError
 
 from sqlalchemy.orm import joinedload
 
 from app import db
-from app.models import Customer, Invoice, RouteStop, Payment, ActivityLog, VALID_PAYMENT_TYPES
-from app.helpers import generate_receipt_pdf, generate_receipt_number, audit, staff_required
+from app.models import Customer, RouteDay, RouteStop, Payment, ActivityLog, VALID_PAYMENT_TYPES
+from app.helpers import audit, staff_required
+from app import idempotency, pdf_cache, route_manifest
+from app.closeout import (
+    close_out as close_out_day, compute_summary, current_snapshot as closeout_snapshot,
+    receipts_path as closeout_receipts_path, send_if_unattended,
+)
+from app.payments import record_sale, sale_description
+from app.receipts import render_receipts, snapshot as receipt_snapshot, stream_zip
+from app.route_sync import MAX_SYNC_OPS, replay_ops
+from app.route_bundle import collection_target, day_takings, last_payments, last_visits
 import logging
 
 bp = Blueprint("route", __name__, url_prefix="/route")
@@ -25,7 +33,7 @@ bp = Blueprint("route", __name__, url_prefix="/route")
 @bp.route("/")
 @login_required
 def index():
-    """Show today's route (or a specific date) ordered by city then sequence."""
+    """Show today's route (or a specific date) in stop sequence order."""
     date_param = request.args.get("date", "")
     if date_param:
         try:
@@ -40,77 +48,12 @@ def index():
         .options(joinedload(RouteStop.customer))
         .join(Customer)
         .filter(RouteStop.route_date == route_date)
-        .order_by(Customer.city, RouteStop.sequence)
+        .order_by(RouteStop.sequence, RouteStop.id)
         .all()
     )
 
-    # Collection target: total outstanding balance across today's stop customers
     customer_ids = [s.customer_id for s in stops]
-    collection_target = Decimal("0")
-    if customer_ids:
-        collection_target = db.session.query(
-            func.coalesce(func.sum(Customer.balance), Decimal("0"))
-        ).filter(
-            Customer.id.in_(customer_ids),
-            Customer.balance > 0,
-        ).scalar() or Decimal("0")
-
-    # Today's collections so far
-    day_start = datetime(route_date.year, route_date.month, route_date.day, tzinfo=timezone.utc)
-    day_end = datetime(route_date.year, route_date.month, route_date.day, 23, 59, 59, 999999, tzinfo=timezone.utc)
-    collected_today = db.session.query(
-        func.coalesce(func.sum(Payment.amount), Decimal("0"))
-    ).filter(
-        Payment.payment_date >= day_start,
-        Payment.payment_date <= day_end,
-    ).scalar() or Decimal("0")
-
-    # Today's actual sales (goods delivered)
-    sales_today = db.session.query(
-        func.coalesce(func.sum(Payment.amount_sold), Decimal("0"))
-    ).filter(
-        Payment.payment_date >= day_start,
-        Payment.payment_date <= day_end,
-    ).scalar() or Decimal("0")
-
-    # Last visit info per customer (single query instead of N+1)
-    last_visits = {}
-    if customer_ids:
-        unique_ids = list(set(customer_ids))
-        visit_rows = (
-            db.session.query(
-                RouteStop.customer_id,
-                func.max(RouteStop.route_date).label("last_date"),
-            )
-            .filter(
-                RouteStop.customer_id.in_(unique_ids),
-                RouteStop.completed.is_(True),
-                RouteStop.route_date < route_date,
-            )
-            .group_by(RouteStop.customer_id)
-            .all()
-        )
-        last_visits = {row.customer_id: row.last_date for row in visit_rows}
-
-    # Last payment per customer (single query instead of N+1)
-    last_payments = {}
-    if customer_ids:
-        unique_ids = list(set(customer_ids))
-        latest_payment_date = (
-            db.session.query(
-                Payment.customer_id,
-                func.max(Payment.id).label("max_id"),
-            )
-            .filter(Payment.customer_id.in_(unique_ids))
-            .group_by(Payment.customer_id)
-            .subquery()
-        )
-        payment_rows = (
-            Payment.query
-            .join(latest_payment_date, Payment.id == latest_payment_date.c.max_id)
-            .all()
-        )
-        last_payments = {p.customer_id: p for p in payment_rows}
+    collected_today, sales_today = day_takings(route_date)
 
     prev_date = route_date - timedelta(days=1)
     next_date = route_date + timedelta(days=1)
@@ -120,14 +63,15 @@ def index():
         "route.html",
         stops=stops,
         route_date=route_date,
-        collection_target=collection_target,
+        collection_target=collection_target(customer_ids),
         collected_today=collected_today,
         sales_today=sales_today,
-        last_visits=last_visits,
-        last_payments=last_payments,
+        last_visits=last_visits(customer_ids, route_date),
+        last_payments=last_payments(customer_ids),
         prev_date=prev_date,
         next_date=next_date,
         is_today=is_today,
+        route_version=RouteDay.version_of(route_date),
     )
 
 
@@ -139,9 +83,22 @@ def index():
 @login_required
 @staff_required
 def complete_stop(id):
-    """Mark a route stop as completed. Optionally record a payment."""
+    """Mark a route stop as completed. Optionally record a payment.
+
+    Honours an Idempotency-Key header: a retry is answered from the first
+    attempt's stored result instead of recording the payment again.
+    """
     stop = RouteStop.query.get_or_404(id)
     route_date = stop.route_date  # Save before any potential rollback
+    try:
+        idem_key = idempotency.request_key()
+    except ValueError as exc:
+        flash(str(exc), "error")
+        return redirect(url_for("route.index", date=route_date.isoformat()))
+    if idem_key:
+        stored = idempotency.find(idem_key, current_user.id)
+        if stored is not None:
+            return _completed_response(stop, stored.get("receipt_number"), "Stop already completed.")
     stop.completed = True
     stop.completed_at = datetime.now(timezone.utc)
 
@@ -165,72 +122,19 @@ def complete_stop(id):
 
     if amount_paid > 0 or amount_sold > 0:
         try:
-            # Lock the customer row for safe balance update
-            customer = db.session.query(Customer).filter_by(id=stop.customer_id).with_for_update().one()
-            previous_balance = customer.balance
-            receipt_number = generate_receipt_number()
-
-            new_balance = previous_balance + amount_sold - amount_paid
-            if new_balance < 0:
-                flash(f"Note: overpayment of ${-new_balance:,.2f} — balance was already zero.", "warning")
-                new_balance = Decimal("0")
-            customer.balance = new_balance
-
-            payment = Payment(
-                customer_id=customer.id,
-                amount=amount_paid,
+            sale = record_sale(
+                stop.customer_id,
                 amount_sold=amount_sold,
+                amount_paid=amount_paid,
                 payment_type=payment_type,
-                payment_date=datetime.now(timezone.utc),
-                receipt_number=receipt_number,
-                previous_balance=previous_balance,
                 notes=request.form.get("payment_notes", "").strip() or None,
-                recorded_by=current_user.id,
+                user_id=current_user.id,
             )
-            db.session.add(payment)
-
-            # Auto-create invoice when a sale is recorded (consistent with record_payment)
-            if amount_sold > 0:
-                invoice = Invoice(
-                    customer_id=customer.id,
-                    invoice_number=receipt_number,
-                    amount=amount_sold,
-                    invoice_date=date.today(),
-                    description=request.form.get("payment_notes", "").strip() or None,
-                    payment_type=payment_type,
-                    status="paid" if amount_paid >= amount_sold else "unpaid",
-                    created_by=current_user.id,
-                )
-                db.session.add(invoice)
-
-            db.session.flush()  # get payment.id for FIFO tracking
-            assert payment.id is not None, "Payment flush failed to generate ID"
-
-            # Mark old unpaid invoices paid FIFO if excess payment.
-            # yield_per streams rows so we stop consuming once excess is exhausted.
-            if amount_paid > 0:
-                excess = amount_paid - amount_sold
-                if excess > 0:
-                    unpaid_invoices = Invoice.query.filter_by(
-                        customer_id=customer.id, status="unpaid"
-                    ).order_by(Invoice.invoice_date.asc()).yield_per(100)
-                    for inv in unpaid_invoices:
-                        if inv.invoice_number == receipt_number:
-                            continue
-                        if excess >= inv.amount:
-                            inv.status = "paid"
-                            inv.payment_type = payment_type
-                            inv.paid_by_payment_id = payment.id
-                            excess -= inv.amount
-                        else:
-                            break
-
-            parts = []
-            if amount_sold > 0:
-                parts.append(f"Sold ${amount_sold:,.2f}")
-            if amount_paid > 0:
-                parts.append(f"Paid ${amount_paid:,.2f}")
-            desc = ". ".join(parts) + f". Receipt: {receipt_number}"
+            customer, receipt_number = sale["customer"], sale["receipt_number"]
+            if sale["overpayment"] > 0:
+                flash(f"Note: overpayment of ${sale['overpayment']:,.2f} — balance was already zero.", "warning")
+
+            desc = sale_description(amount_sold, amount_paid) + f". Receipt: {receipt_number}"
 
             db.session.add(ActivityLog(
                 customer_id=customer.id,
@@ -248,20 +152,36 @@ def complete_stop(id):
     audit("stop_completed", f"Completed route stop for customer #{stop.customer_id} on {stop.route_date}")
 
     try:
+        if idem_key:
+            idempotency.remember(idem_key, current_user.id, "route.complete_stop",
+                                 {"stop_id": stop.id, "receipt_number": receipt_number})
         db.session.commit()
+    except IntegrityError:
+        # A concurrent retry with the same key got there first
+        db.session.rollback()
+        stored = idempotency.find(idem_key, current_user.id) if idem_key else None
+        if stored is None:
+            flash("Failed to save. Please try again.", "error")
+            return redirect(url_for("route.index"))
+        return _completed_response(db.session.get(RouteStop, id), stored.get("receipt_number"),
+                                   "Stop already completed.")
     except Exception:
         logging.exception("Failed to commit stop completion for stop #%s", id)
         db.session.rollback()
         flash("Failed to save. Please try again.", "error")
         return redirect(url_for("route.index"))
 
+    return _completed_response(stop, receipt_number, "Stop completed.")
+
+
+def _completed_response(stop, receipt_number, message):
     # For HTMX, return the updated stop card with trigger to refresh totals
     if request.headers.get("HX-Request"):
         response = make_response(render_template("partials/stop_card.html", stop=stop, receipt_number=receipt_number))
         response.headers["HX-Trigger"] = "stopCompleted"
         return response
 
-    flash("Stop completed.", "success")
+    flash(message, "success")
     return redirect(url_for("route.index", date=stop.route_date.isoformat()))
 
 
@@ -285,6 +205,53 @@ def uncomplete_stop(id):
     return redirect(url_for("route.index", date=stop.route_date.isoformat()))
 
 
+# ---------------------------------------------------------------------------
+# Offline support
+# ---------------------------------------------------------------------------
+
+@bp.route("/sw.js")
+def service_worker():
+    """The offline service worker, served from /route/ so it can control the route pages."""
+    response = send_from_directory(current_app.static_folder, "js/sw.js",
+                                   mimetype="application/javascript", max_age=0)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@bp.route("/sync", methods=["GET"])
+@login_required
+@staff_required
+def sync_token():
+    """Fresh CSRF token for a page that may have been served from the offline cache."""
+    return jsonify({"csrf_token": generate_csrf()})
+
+
+@bp.route("/sync", methods=["POST"])
+@login_required
+@staff_required
+def sync():
+    """Replay a batch of queued offline actions: ``{"ops": [...]}``.
+
+    Runs every operation (see app.route_sync) and commits once. Results come
+    back in order so the client can drop what succeeded or can never succeed.
+    """
+    data = request.get_json(silent=True) or {}
+    ops = data.get("ops")
+    if not isinstance(ops, list):
+        return jsonify({"error": "ops must be an array."}), 400
+    if len(ops) > MAX_SYNC_OPS:
+        return jsonify({"error": f"Send at most {MAX_SYNC_OPS} operations at a time."}), 400
+
+    results = replay_ops(ops, current_user.id)
+    try:
+        db.session.commit()
+    except Exception:
+        logging.exception("Failed to commit offline sync batch")
+        db.session.rollback()
+        return jsonify({"error": "Failed to save. Please try again."}), 500
+    return jsonify({"results": results})
+
+
 # ---------------------------------------------------------------------------
 # Stop notes
 # ---------------------------------------------------------------------------
@@ -319,33 +286,11 @@ def summary():
     else:
         route_date = date.today()
 
-    total_stops = RouteStop.query.filter(RouteStop.route_date == route_date).count()
-    completed_stops = RouteStop.query.filter(
-        RouteStop.route_date == route_date,
-        RouteStop.completed.is_(True),
-    ).count()
-
-    day_start = datetime(route_date.year, route_date.month, route_date.day, tzinfo=timezone.utc)
-    day_end = datetime(route_date.year, route_date.month, route_date.day, 23, 59, 59, 999999, tzinfo=timezone.utc)
-
-    payment_stats = db.session.query(
-        func.count(Payment.id),
-        func.coalesce(func.sum(Payment.amount), Decimal("0")),
-    ).filter(
-        Payment.payment_date >= day_start,
-        Payment.payment_date <= day_end,
-    ).first()
-    payment_count = payment_stats[0]
-    payment_sum = payment_stats[1] or Decimal("0")
-
-    stops = (
-        RouteStop.query
-        .options(joinedload(RouteStop.customer))
-        .join(Customer)
-        .filter(RouteStop.route_date == route_date)
-        .order_by(RouteStop.sequence)
-        .all()
-    )
+    # A closed-out day reads its snapshot; otherwise (or once stale) aggregate live
+    closeout, day_summary = closeout_snapshot(route_date)
+    closeout_current = day_summary is not None
+    if not closeout_current:
+        day_summary = compute_summary(route_date)
 
     next_date = route_date + timedelta(days=1)
     next_day_stops_list = (
@@ -361,17 +306,83 @@ def summary():
     return render_template(
         "route_summary.html",
         route_date=route_date,
-        total_stops=total_stops,
-        completed_stops=completed_stops,
-        stops=stops,
-        payment_count=payment_count,
-        payment_sum=payment_sum,
+        total_stops=day_summary["total_stops"],
+        completed_stops=day_summary["completed_stops"],
+        stops=day_summary["stops"],
+        payment_count=day_summary["payment_count"],
+        payment_sum=Decimal(day_summary["payment_sum"]),
+        closeout=closeout,
+        closeout_current=closeout_current,
         next_date=next_date,
         next_day_stops=next_day_stops,
         next_day_stops_list=next_day_stops_list,
     )
 
 
+# ---------------------------------------------------------------------------
+# End-of-day close-out
+# ---------------------------------------------------------------------------
+
+@bp.route("/closeout/<date_str>", methods=["POST"])
+@login_required
+@staff_required
+def close_out(date_str):
+    """Snapshot the day's summary, archive its receipts and manifest, queue the email."""
+    try:
+        target_date = date.fromisoformat(date_str)
+    except ValueError:
+        flash("Invalid date format.", "error")
+        return redirect(url_for("route.index"))
+
+    existing, snapshot = closeout_snapshot(target_date)
+    if snapshot is not None:
+        flash("This day is already closed out.", "info")
+        return redirect(url_for("route.summary", date=date_str))
+    try:
+        result = close_out_day(target_date, current_user.id)
+        audit("route_closed_out", f"Closed out route for {date_str}"
+                                  f"{' again' if existing else ''} (email {result.email_status})")
+        db.session.commit()
+    except Exception:
+        logging.exception("Close-out failed for %s", date_str)
+        db.session.rollback()
+        flash("Close-out failed. Please try again.", "error")
+        return redirect(url_for("route.summary", date=date_str))
+
+    status = send_if_unattended(result)
+    if status == "sent":
+        note = " Summary emailed."
+    elif status == "queued" and result.email_error:
+        note = f" Summary email not sent yet ({result.email_error}); it will be retried."
+    elif status == "queued":
+        note = " Summary email queued."
+    else:
+        note = ""
+    flash("Day closed out." + note, "success")
+    return redirect(url_for("route.summary", date=date_str))
+
+
+# ---------------------------------------------------------------------------
+# Route manifest PDF
+# ---------------------------------------------------------------------------
+
+@bp.route("/manifest/<date_str>")
+@login_required
+def manifest(date_str):
+    """Printable manifest of the day's stops, cached until the route changes."""
+    try:
+        target_date = date.fromisoformat(date_str)
+    except ValueError:
+        flash("Invalid date format.", "error")
+        return redirect(url_for("route.index"))
+
+    return pdf_cache.pdf_response(
+        route_manifest.CACHE_KIND, target_date.isoformat(), route_manifest.cache_fields(target_date),
+        lambda: route_manifest.render(target_date),
+        download_name=f"manifest-{target_date.isoformat()}.pdf",
+    )
+
+
 # ---------------------------------------------------------------------------
 # Receipts ZIP
 # ---------------------------------------------------------------------------
@@ -379,13 +390,24 @@ def summary():
 @bp.route("/receipts/<date_str>")
 @login_required
 def receipts_zip(date_str):
-    """Generate a ZIP of all payment receipt PDFs for the given date."""
+    """Stream a ZIP of all payment receipt PDFs for the given date.
+
+    A closed-out day serves the ZIP written at close-out. Otherwise PDFs are
+    rendered in the receipt worker pool and written to the ZIP as they
+    finish (see app.receipts).
+    """
     try:
         target_date = date.fromisoformat(date_str)
     except ValueError:
         flash("Invalid date format.", "error")
         return redirect(url_for("route.index"))
 
+    _, snapshot = closeout_snapshot(target_date)
+    archived = closeout_receipts_path(target_date)
+    if snapshot is not None and archived.is_file():
+        return send_file(archived.resolve(), mimetype="application/zip", as_attachment=True,
+                         download_name=archived.name)
+
     day_start = datetime(target_date.year, target_date.month, target_date.day, tzinfo=timezone.utc)
     day_end = datetime(target_date.year, target_date.month, target_date.day, 23, 59, 59, 999999, tzinfo=timezone.utc)
 
@@ -400,18 +422,9 @@ def receipts_zip(date_str):
         flash("No payments found for that date.", "warning")
         return redirect(url_for("route.summary", date=date_str))
 
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for payment in payments:
-            customer = payment.customer
-            pdf_bytes = generate_receipt_pdf(payment, customer)
-            filename = f"{payment.receipt_number}.pdf"
-            zf.writestr(filename, pdf_bytes)
-
-    zip_buffer.seek(0)
-    return send_file(
-        zip_buffer,
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"receipts-{date_str}.zip",
-    )
+    # Snapshot before streaming: the generator runs after the session is gone
+    items = [receipt_snapshot(payment) for payment in payments]
+    response = Response(stream_zip(render_receipts(items)), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="receipts-{date_str}.zip"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,146 @@
+"""Per-request SQL instrumentation.
+
+With SQL_TIMING on (``SQL_TIMING=true``), every request counts the
+statements it sends and the time spent in them, and answers with
+
+    Server-Timing: db;dur=12.4;desc="9 queries", app;dur=31.0
+
+so the browser's network panel shows where the time went. One log line
+per request (logger ``app.sql_timing``) carries the same figures as JSON.
+A statement sent SQL_TIMING_REPEAT_THRESHOLD times or more (default 5)
+with identical SQL text, differing only in parameters, is the usual shape
+of an N+1 query: it is listed in the log line, which is then a warning.
+
+When SQL_TIMING is off no engine listener is registered at all.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import Flask, request
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+DEFAULT_REPEAT_THRESHOLD = 5
+
+
+class _Stats:
+    __slots__ = ("started", "count", "seconds", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+
+_current: ContextVar[_Stats | None] = ContextVar("sql_timing", default=None)
+
+
+def enabled() -> bool:
+    return os.environ.get("SQL_TIMING", "").lower() in ("true", "1", "yes")
+
+
+def repeat_threshold() -> int:
+    try:
+        return max(int(os.environ.get("SQL_TIMING_REPEAT_THRESHOLD", DEFAULT_REPEAT_THRESHOLD)), 2)
+    except ValueError:
+        return DEFAULT_REPEAT_THRESHOLD
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_timing_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("sql_timing_start")
+    if not starts:
+        return
+    stats.seconds += time.perf_counter() - starts.pop()
+    stats.count += 1
+    stats.statements[statement] += 1
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # so it doesn't linger on the pooled connection.
+    conn = context.connection
+    starts = conn.info.get("sql_timing_start") if conn is not None else None
+    if not starts:
+        return
+    started = starts.pop()
+    stats = _current.get()
+    if stats is not None and context.statement is not None:
+        stats.seconds += time.perf_counter() - started
+        stats.count += 1
+        stats.statements[context.statement] += 1
+
+
+def _repeated(stats: _Stats, threshold: int) -> list[dict]:
+    return [
+        {"count": n, "sql": " ".join(sql.split())[:200]}
+        for sql, n in stats.statements.most_common()
+        if n >= threshold
+    ]
+
+
+def init_sql_timing(app: Flask, engine) -> None:
+    """Instrument ``engine`` for ``app``'s requests if SQL_TIMING is on."""
+    app.config.setdefault("SQL_TIMING", enabled())
+    if not app.config["SQL_TIMING"]:
+        return
+    threshold = repeat_threshold()
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+    @app.before_request
+    def _start_sql_timing():
+        request.environ["sql_timing.token"] = _current.set(_Stats())
+
+    @app.after_request
+    def _report_sql_timing(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        db_ms = stats.seconds * 1000
+        app_ms = (time.perf_counter() - stats.started) * 1000
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={db_ms:.1f};desc="{stats.count} queries", app;dur={app_ms:.1f}',
+        )
+        repeated = _repeated(stats, threshold)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "queries": stats.count,
+            "db_ms": round(db_ms, 1),
+            "total_ms": round(app_ms, 1),
+        }
+        if repeated:
+            record["repeated"] = repeated
+            log.warning("sql %s", json.dumps(record))
+        else:
+            log.info("sql %s", json.dumps(record))
+        return response
+
+    @app.teardown_request
+    def _end_sql_timing(exc):
+        token = request.environ.pop("sql_timing.token", None)
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,40 @@
+"""Key route close-outs on a fingerprint of the day's stops and payments
+
+Revision ID: a3b4c5d6e7f8
+Revises: f2a3b4c5d6e7
+Create Date: 2026-05-13 10:00:00.000000
+
+The old column held the route's ETag, which moved whenever any customer on
+the day changed. Existing close-outs show as changed once and can be
+closed out again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a3b4c5d6e7f8'
+down_revision = 'f2a3b4c5d6e7'
+branch_labels = None
+depends_on = None
+
+
+def _columns(bind):
+    return {c['name'] for c in sa.inspect(bind).get_columns('route_closeouts')}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'route_etag' not in _columns(bind):
+        return
+    with op.batch_alter_table('route_closeouts') as batch:
+        batch.alter_column('route_etag', new_column_name='fingerprint',
+                           existing_type=sa.String(length=64), existing_nullable=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if 'fingerprint' not in _columns(bind):
+        return
+    with op.batch_alter_table('route_closeouts') as batch:
+        batch.alter_column('fingerprint', new_column_name='route_etag',
+                           existing_type=sa.String(length=64), existing_nullable=False)
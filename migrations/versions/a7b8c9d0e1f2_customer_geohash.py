@@ -0,0 +1,63 @@
+"""Add indexed customers.geohash for spatial bucketing
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-05-06 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a7b8c9d0e1f2'
+down_revision = 'f6a7b8c9d0e1'
+branch_labels = None
+depends_on = None
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision=9):
+    # Frozen copy of app.geo.geohash_encode so the migration doesn't import the app.
+    bounds = [[-180.0, 180.0], [-90.0, 90.0]]  # lon, lat
+    value, out = (lon, lat), []
+    for n in range(precision * 5):
+        axis = 0 if n % 2 == 0 else 1
+        lo, hi = bounds[axis]
+        mid = (lo + hi) / 2
+        bit = value[axis] >= mid
+        bounds[axis] = [mid, hi] if bit else [lo, mid]
+        if n % 5 == 0:
+            ch = 0
+        ch = (ch << 1) | bit
+        if n % 5 == 4:
+            out.append(_BASE32[ch])
+    return "".join(out)
+
+
+def upgrade():
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('customers')}
+    indexes = {i['name'] for i in sa.inspect(bind).get_indexes('customers')}
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        if 'geohash' not in columns:
+            batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        if 'ix_customers_geohash' not in indexes:
+            batch_op.create_index('ix_customers_geohash', ['geohash'], unique=False)
+
+    # Bucket customers that already have coordinates.
+    rows = bind.execute(sa.text(
+        "SELECT id, latitude, longitude FROM customers "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )).fetchall()
+    for row_id, lat, lon in rows:
+        bind.execute(
+            sa.text("UPDATE customers SET geohash = :g WHERE id = :id"),
+            {"g": geohash_encode(lat, lon), "id": row_id},
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('ix_customers_geohash')
+        batch_op.drop_column('geohash')
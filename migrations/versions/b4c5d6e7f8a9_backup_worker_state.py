@@ -0,0 +1,55 @@
+"""Add worker_state and backup_deliveries: backup scheduler state in the database
+
+Revision ID: b4c5d6e7f8a9
+Revises: a3b4c5d6e7f8
+Create Date: 2026-05-13 11:00:00.000000
+
+The backup worker runs in its own container, so its heartbeat, the admin's
+"email now" request and the delivery outbox move off the local disk.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'b4c5d6e7f8a9'
+down_revision = 'a3b4c5d6e7f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('worker_state'):
+        op.create_table(
+            'worker_state',
+            sa.Column('name', sa.String(length=40), nullable=False),
+            sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+            sa.Column('requested_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('name'),
+        )
+    if not inspector.has_table('backup_deliveries'):
+        op.create_table(
+            'backup_deliveries',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('archive', sa.String(length=255), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_backup_deliveries_next_attempt_at', 'backup_deliveries',
+                        ['next_attempt_at'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if inspector.has_table('backup_deliveries'):
+        op.drop_index('ix_backup_deliveries_next_attempt_at', table_name='backup_deliveries')
+        op.drop_table('backup_deliveries')
+    if inspector.has_table('worker_state'):
+        op.drop_table('worker_state')
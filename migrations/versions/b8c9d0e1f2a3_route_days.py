@@ -0,0 +1,34 @@
+"""Add route_days: per-date route version for conflict detection
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-05-08 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'b8c9d0e1f2a3'
+down_revision = 'a7b8c9d0e1f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('route_days'):
+        return
+    op.create_table(
+        'route_days',
+        sa.Column('route_date', sa.Date(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('route_date'),
+    )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('route_days'):
+        op.drop_table('route_days')
@@ -0,0 +1,51 @@
+"""Mark route close-outs stale on write instead of fingerprinting the day
+
+Revision ID: c5d6e7f8a9b0
+Revises: b4c5d6e7f8a9
+Create Date: 2026-05-13 12:00:00.000000
+
+Writes to a day's stops or payments now set route_closeouts.stale, so views
+no longer hash the whole day to check a snapshot. Whether existing
+close-outs still match their day is unknown, so they start out stale and
+can be closed out again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c5d6e7f8a9b0'
+down_revision = 'b4c5d6e7f8a9'
+branch_labels = None
+depends_on = None
+
+
+def _columns(bind):
+    return {c['name'] for c in sa.inspect(bind).get_columns('route_closeouts')}
+
+
+def upgrade():
+    bind = op.get_bind()
+    columns = _columns(bind)
+    if 'stale' not in columns:
+        with op.batch_alter_table('route_closeouts') as batch:
+            batch.add_column(sa.Column('stale', sa.Boolean(), nullable=False,
+                                       server_default=sa.true()))
+        with op.batch_alter_table('route_closeouts') as batch:
+            batch.alter_column('stale', existing_type=sa.Boolean(), existing_nullable=False,
+                               server_default=sa.false())
+    if 'fingerprint' in columns:
+        with op.batch_alter_table('route_closeouts') as batch:
+            batch.drop_column('fingerprint')
+
+
+def downgrade():
+    bind = op.get_bind()
+    columns = _columns(bind)
+    if 'fingerprint' not in columns:
+        # An empty fingerprint never matches, so every close-out reads as changed
+        with op.batch_alter_table('route_closeouts') as batch:
+            batch.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=False,
+                                       server_default=''))
+    if 'stale' in columns:
+        with op.batch_alter_table('route_closeouts') as batch:
+            batch.drop_column('stale')
@@ -0,0 +1,44 @@
+"""Add route_closeouts: end-of-day route summary snapshots
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-05-10 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd0e1f2a3b4c5'
+down_revision = 'c9d0e1f2a3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('route_closeouts'):
+        return
+    op.create_table(
+        'route_closeouts',
+        sa.Column('route_date', sa.Date(), nullable=False),
+        sa.Column('route_etag', sa.String(length=64), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+        sa.Column('closed_by', sa.Integer(), nullable=True),
+        sa.Column('email_status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('email_attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('email_next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('email_error', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['closed_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('route_date'),
+    )
+    op.create_index('ix_route_closeouts_email_next_attempt_at', 'route_closeouts',
+                    ['email_next_attempt_at'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('route_closeouts'):
+        op.drop_index('ix_route_closeouts_email_next_attempt_at', table_name='route_closeouts')
+        op.drop_table('route_closeouts')
@@ -0,0 +1,60 @@
+"""Add recurring_stops.next_occurrence with (is_active, next_occurrence) index
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-05-02 20:00:00.000000
+
+"""
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('recurring_stops')}
+    indexes = {i['name'] for i in sa.inspect(bind).get_indexes('recurring_stops')}
+
+    with op.batch_alter_table('recurring_stops', schema=None) as batch_op:
+        if 'next_occurrence' not in columns:
+            batch_op.add_column(sa.Column('next_occurrence', sa.Date(), nullable=True))
+        if 'ix_recurring_stops_active_next' not in indexes:
+            batch_op.create_index('ix_recurring_stops_active_next',
+                                  ['is_active', 'next_occurrence'], unique=False)
+
+    # Point every running schedule at its first occurrence from today on.
+    today = date.today()
+    rows = bind.execute(sa.text(
+        "SELECT id, interval_days, start_date, end_date FROM recurring_stops "
+        "WHERE is_active AND next_occurrence IS NULL"
+    )).fetchall()
+    for row_id, interval, start, end in rows:
+        if isinstance(start, str):
+            start = date.fromisoformat(start)
+        if isinstance(end, str):
+            end = date.fromisoformat(end)
+        if not interval or interval < 1:
+            continue
+        nxt = start
+        if today > start:
+            periods = -(-(today - start).days // interval)
+            nxt = start + timedelta(days=periods * interval)
+        if end and nxt > end:
+            continue
+        bind.execute(
+            sa.text("UPDATE recurring_stops SET next_occurrence = :d WHERE id = :id"),
+            {"d": nxt, "id": row_id},
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('recurring_stops', schema=None) as batch_op:
+        batch_op.drop_index('ix_recurring_stops_active_next')
+        batch_op.drop_column('next_occurrence')
@@ -0,0 +1,48 @@
+"""Add customer_cadence: per-customer visit interval statistics
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-05-11 10:00:00.000000
+
+Rows are derived from completed route stops. The app fills an empty
+table from them on start (app.init_db); ``flask route cadence-rebuild``
+recomputes it on demand.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'e1f2a3b4c5d6'
+down_revision = 'd0e1f2a3b4c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('customer_cadence'):
+        return
+    op.create_table(
+        'customer_cadence',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('visit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('first_visit', sa.Date(), nullable=False),
+        sa.Column('last_visit', sa.Date(), nullable=False),
+        sa.Column('mean_interval', sa.Float(), nullable=True),
+        sa.Column('median_interval', sa.Float(), nullable=True),
+        sa.Column('recent_intervals', sa.Text(), nullable=False, server_default='[]'),
+        sa.Column('expected_next', sa.Date(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.PrimaryKeyConstraint('customer_id'),
+    )
+    op.create_index('ix_customer_cadence_last_visit', 'customer_cadence', ['last_visit'])
+    op.create_index('ix_customer_cadence_expected_next', 'customer_cadence', ['expected_next'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('customer_cadence'):
+        op.drop_index('ix_customer_cadence_expected_next', table_name='customer_cadence')
+        op.drop_index('ix_customer_cadence_last_visit', table_name='customer_cadence')
+        op.drop_table('customer_cadence')
@@ -0,0 +1,54 @@
+"""Unique route_stops(customer_id, route_date), removing existing duplicates
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-05-03 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = {c['name'] for c in sa.inspect(bind).get_unique_constraints('route_stops')}
+    if 'uq_route_stops_customer_date' in existing:
+        return
+
+    # Concurrent planner views could insert the same recurring stop twice.
+    # Keep one row per (customer, date): a completed one if any, else the oldest.
+    rows = bind.execute(sa.text(
+        "SELECT id, customer_id, route_date FROM route_stops "
+        "WHERE (customer_id, route_date) IN ("
+        "  SELECT customer_id, route_date FROM route_stops "
+        "  GROUP BY customer_id, route_date HAVING COUNT(*) > 1"
+        ") ORDER BY customer_id, route_date, completed DESC, id"
+    )).fetchall()
+    seen = set()
+    doomed = []
+    for row_id, customer_id, route_date in rows:
+        if (customer_id, route_date) in seen:
+            doomed.append(row_id)
+        else:
+            seen.add((customer_id, route_date))
+    for i in range(0, len(doomed), 500):
+        bind.execute(
+            sa.text("DELETE FROM route_stops WHERE id IN :ids").bindparams(
+                sa.bindparam('ids', expanding=True)
+            ),
+            {"ids": doomed[i:i + 500]},
+        )
+
+    with op.batch_alter_table('route_stops', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_route_stops_customer_date', ['customer_id', 'route_date'])
+
+
+def downgrade():
+    with op.batch_alter_table('route_stops', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_route_stops_customer_date', type_='unique')
@@ -0,0 +1,45 @@
+"""Add attention_scores: materialized overdue-visit ranking
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-05-12 10:00:00.000000
+
+The table fills itself on first read; ``flask route score-attention``
+recomputes it on demand.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'f2a3b4c5d6e7'
+down_revision = 'e1f2a3b4c5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('attention_scores'):
+        return
+    op.create_table(
+        'attention_scores',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('overdue_ratio', sa.Float(), nullable=False),
+        sa.Column('expected_interval', sa.Float(), nullable=False),
+        sa.Column('last_visit', sa.Date(), nullable=True),
+        sa.Column('days_since', sa.Integer(), nullable=True),
+        sa.Column('balance', sa.Numeric(precision=10, scale=2), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Numeric(precision=10, scale=2), nullable=False, server_default='0'),
+        sa.Column('computed_on', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.PrimaryKeyConstraint('customer_id'),
+    )
+    op.create_index('ix_attention_scores_score', 'attention_scores', ['score'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('attention_scores'):
+        op.drop_index('ix_attention_scores_score', table_name='attention_scores')
+        op.drop_table('attention_scores')
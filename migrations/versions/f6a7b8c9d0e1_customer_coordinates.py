@@ -0,0 +1,29 @@
+"""Add customers.latitude / customers.longitude
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-05-05 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'f6a7b8c9d0e1'
+down_revision = 'e5f6a7b8c9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('customers')}
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        for name in ('latitude', 'longitude'):
+            if name not in columns:
+                batch_op.add_column(sa.Column(name, sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -13,6 +13,122 @@
     return el ? el.getAttribute("content") : "";
   }
 
+  function toast(message, category) {
+    document.dispatchEvent(new CustomEvent("show-toast", { detail: { message, category: category || "info" } }));
+  }
+
+  // ── Offline queue ─────────────────────────────────────────────────────
+  // Stop completions and payments made without signal are kept in
+  // IndexedDB and replayed in batches through /route/sync once online.
+
+  const SYNC_BATCH = 25;
+  let syncing = false;
+
+  function openQueue() {
+    return new Promise((resolve, reject) => {
+      const req = indexedDB.open("candy-dash", 1);
+      req.onupgradeneeded = () => req.result.createObjectStore("ops", { keyPath: "key" });
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  async function queueTx(mode, fn) {
+    const db = await openQueue();
+    return new Promise((resolve, reject) => {
+      const tx = db.transaction("ops", mode);
+      const out = fn(tx.objectStore("ops"));
+      tx.oncomplete = () => { db.close(); resolve(out && out.result); };
+      tx.onerror = () => { db.close(); reject(tx.error); };
+    });
+  }
+
+  function newKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+  }
+
+  async function pendingOps() {
+    const ops = await queueTx("readonly", (store) => store.getAll());
+    return (ops || []).sort((a, b) => a.at.localeCompare(b.at));
+  }
+
+  async function announcePending() {
+    const ops = await pendingOps();
+    document.dispatchEvent(new CustomEvent("offline-queue", { detail: { pending: ops.length } }));
+  }
+
+  async function queueOp(op) {
+    op.key = op.key || newKey();
+    op.at = new Date().toISOString();
+    await queueTx("readwrite", (store) => store.put(op));
+    announcePending();
+    return op;
+  }
+
+  async function syncQueue() {
+    if (syncing || !navigator.onLine || !window.indexedDB) return;
+    syncing = true;
+    let applied = 0;
+    try {
+      const ops = await pendingOps();
+      if (!ops.length) return;
+      // The page may be a cached copy; fetch a CSRF token that is still valid
+      const tokenRes = await fetch("/route/sync", { headers: { "Accept": "application/json" } });
+      if (!tokenRes.ok) return;
+      const { csrf_token } = await tokenRes.json();
+      for (let i = 0; i < ops.length; i += SYNC_BATCH) {
+        const res = await fetch("/route/sync", {
+          method: "POST",
+          headers: { "Content-Type": "application/json", "X-CSRFToken": csrf_token },
+          body: JSON.stringify({ ops: ops.slice(i, i + SYNC_BATCH) }),
+        });
+        if (!res.ok) break;
+        const { results } = await res.json();
+        const done = results.filter((r) => r.ok || !r.retry);
+        await queueTx("readwrite", (store) => done.forEach((r) => store.delete(r.key)));
+        for (const r of results) {
+          if (r.ok) applied++;
+          else if (!r.retry) toast("Offline update dropped: " + r.error, "error");
+        }
+      }
+    } catch (_) {
+      // Still offline or the server is unreachable; try again later
+    } finally {
+      syncing = false;
+      announcePending();
+    }
+    if (applied) {
+      toast(applied + " offline update" + (applied !== 1 ? "s" : "") + " synced", "success");
+      if (document.querySelector("[data-route-version]")) window.location.reload();
+    }
+  }
+
+  // Queue a route stop completion (the Done button or the Complete & Pay form)
+  async function queueCompletion(elt) {
+    const card = elt.closest("[data-offline-stop]");
+    if (!card || card.dataset.queued) return;
+    const form = elt.closest("form");
+    const field = (name) => (form && form.elements[name] ? form.elements[name].value : "");
+    await queueOp({
+      key: elt.dataset.idempotencyKey,
+      type: "complete",
+      stop_id: parseInt(card.dataset.offlineStop, 10),
+      amount_sold: field("amount_sold"),
+      amount_paid: field("amount"),
+      payment_type: field("payment_type") || "cash",
+      notes: field("payment_notes"),
+    });
+    card.dataset.queued = "1";
+    card.classList.replace("border-app", "border-green-700/40");
+    card.querySelectorAll("button, form").forEach((el) => { el.hidden = true; });
+    const badge = document.createElement("p");
+    badge.className = "text-2xs text-amber-400 mt-2 ml-9";
+    badge.textContent = "Saved offline — will sync when back online";
+    card.firstElementChild.appendChild(badge);
+    toast("No signal: stop saved and will sync later", "warning");
+  }
+
   // ── Alpine components ─────────────────────────────────────────────────
   document.addEventListener("alpine:init", () => {
 
@@ -96,6 +212,16 @@
       };
     });
 
+    // Offline queue status (number of actions waiting to sync)
+    Alpine.data("offlineStatus", () => ({
+      pending: 0,
+      init() {
+        document.addEventListener("offline-queue", (e) => { this.pending = e.detail.pending; });
+        if (window.indexedDB) announcePending();
+      },
+      sync() { syncQueue(); },
+    }));
+
     // Payment modal
     Alpine.data("paymentModal", () => ({
       isOpen: false,
@@ -108,6 +234,7 @@
       paymentType: "cash",
       notes: "",
       submitting: false,
+      idemKey: null,
       _controller: null,
 
       get newBalance() {
@@ -152,6 +279,7 @@
         this.amountPaid = "";
         this.paymentType = "cash";
         this.notes = "";
+        this.idemKey = null;
       },
 
       async searchCustomers() {
@@ -186,6 +314,8 @@
       async submit() {
         if (!this.selectedCustomer || (!this.amountSold && !this.amountPaid)) return;
         this.submitting = true;
+        // One key per transaction, reused by retries and the offline queue
+        this.idemKey = this.idemKey || newKey();
         try {
           const res = await fetch("/customers/" + this.selectedCustomer.id + "/payment", {
             method: "POST",
@@ -193,6 +323,7 @@
               "Content-Type": "application/x-www-form-urlencoded",
               "X-CSRFToken": csrfToken(),
               "X-Requested-With": "fetch",
+              "Idempotency-Key": this.idemKey,
             },
             body: new URLSearchParams({
               amount_sold: this.amountSold || "0",
@@ -227,9 +358,22 @@
             }));
           }
         } catch (_) {
-          document.dispatchEvent(new CustomEvent("show-toast", {
-            detail: { message: "Network error. Please try again.", category: "error" },
-          }));
+          if (window.indexedDB) {
+            // No signal: keep the transaction and replay it once back online
+            await queueOp({
+              key: this.idemKey,
+              type: "payment",
+              customer_id: this.selectedCustomer.id,
+              amount_sold: this.amountSold || "0",
+              amount_paid: this.amountPaid || "0",
+              payment_type: this.paymentType,
+              notes: this.notes,
+            });
+            toast("No signal: transaction saved and will sync later", "warning");
+            this.close();
+          } else {
+            toast("Network error. Please try again.", "error");
+          }
         }
         this.submitting = false;
       },
@@ -242,6 +386,12 @@
     // CSRF header on every HTMX request
     document.body.addEventListener("htmx:configRequest", (e) => {
       e.detail.headers["X-CSRFToken"] = csrfToken();
+      // Route completions carry a key so a retry can't record a payment twice
+      const elt = e.detail.elt;
+      if (elt.closest("[data-offline-stop]")) {
+        elt.dataset.idempotencyKey = elt.dataset.idempotencyKey || newKey();
+        e.detail.headers["Idempotency-Key"] = elt.dataset.idempotencyKey;
+      }
     });
 
     // Error handling for HTMX swaps
@@ -271,11 +421,48 @@
       }
     });
 
-    // Unregister any leftover service workers
+    // Route completions: queue instead of failing when there is no signal
+    if (window.indexedDB) {
+      document.body.addEventListener("htmx:beforeRequest", (e) => {
+        if (!navigator.onLine && e.detail.elt.closest("[data-offline-stop]")) {
+          e.preventDefault();
+          queueCompletion(e.detail.elt);
+        }
+      });
+      document.body.addEventListener("htmx:sendError", (e) => {
+        if (e.detail.elt.closest("[data-offline-stop]")) queueCompletion(e.detail.elt);
+      });
+      window.addEventListener("online", syncQueue);
+      setInterval(syncQueue, 30000);
+      syncQueue();
+    }
+
+    // Route page: refresh only when the route-day bundle reports a new version
+    const routeEl = document.querySelector("[data-route-version]");
+    if (routeEl) {
+      const bundleUrl = "/api/route/" + routeEl.dataset.routeDate;
+      const checkBundle = async () => {
+        if (document.hidden || !navigator.onLine || syncing) return;
+        if (document.querySelector("[data-queued], form:focus-within")) return;
+        try {
+          const res = await fetch(bundleUrl);
+          if (!res.ok) return;
+          const bundle = await res.json();
+          if (String(bundle.version) !== routeEl.dataset.routeVersion) window.location.reload();
+        } catch (_) { /* offline */ }
+      };
+      checkBundle();  // also stores the bundle in the offline cache
+      setInterval(checkBundle, 60000);
+    }
+
+    // Offline support lives under /route/; drop service workers from elsewhere
     if ("serviceWorker" in navigator) {
       navigator.serviceWorker.getRegistrations().then(function(registrations) {
-        for (var reg of registrations) { reg.unregister(); }
+        for (var reg of registrations) {
+          if (!reg.scope.endsWith("/route/")) reg.unregister();
+        }
       });
+      navigator.serviceWorker.register("/route/sw.js", { scope: "/route/" }).catch(() => {});
     }
   });
 
@@ -0,0 +1,64 @@
+// ==========================================================================
+// Candy Dash — offline service worker
+// Served as /route/sw.js so it controls the route pages. Keeps the last
+// copy of each route page, its route-day bundle and the static assets, so
+// the route still opens with no signal. Writes are never handled here:
+// the page queues them in IndexedDB and replays them via /route/sync.
+// ==========================================================================
+
+const CACHE = "candy-dash-route-v1";
+
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil((async () => {
+    for (const key of await caches.keys()) {
+      if (key !== CACHE) await caches.delete(key);
+    }
+    await self.clients.claim();
+  })());
+});
+
+// Network first; keep a copy of what worked and fall back to it offline.
+async function networkFirst(request, fallbackUrl) {
+  const cache = await caches.open(CACHE);
+  try {
+    const response = await fetch(request);
+    if (response.ok && !response.redirected) cache.put(request, response.clone());
+    return response;
+  } catch (err) {
+    const cached = await cache.match(request) || (fallbackUrl && await cache.match(fallbackUrl));
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+// Cache first for versioned static assets, refreshing in the background.
+async function staleWhileRevalidate(request) {
+  const cache = await caches.open(CACHE);
+  const cached = await cache.match(request);
+  const refresh = fetch(request).then((response) => {
+    if (response.ok) cache.put(request, response.clone());
+    return response;
+  });
+  if (cached) {
+    refresh.catch(() => {});
+    return cached;
+  }
+  return refresh;
+}
+
+self.addEventListener("fetch", (event) => {
+  const request = event.request;
+  if (request.method !== "GET") return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (request.mode === "navigate" && url.pathname.startsWith("/route/") && url.pathname !== "/route/sw.js") {
+    event.respondWith(networkFirst(request, "/route/"));
+  } else if (url.pathname.startsWith("/api/route/")) {
+    event.respondWith(networkFirst(request));
+  } else if (url.pathname.startsWith("/static/")) {
+    event.respondWith(staleWhileRevalidate(request));
+  }
+});
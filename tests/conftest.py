@@ -39,3 +39,18 @@ def db(app):
     """SQLAlchemy db bound to the test app."""
     from app import db as _db
     return _db
+
+
+@pytest.fixture
+def client(app, db):
+    """Test client logged in as an admin user."""
+    from app.models import User
+    user = User(username="admin", role="admin")
+    user.set_password("admin-password")
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    return client
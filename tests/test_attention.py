@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+
+def _visited(db, name, every, last_days_ago, balance="0"):
+    """An active customer visited four times, ``every`` days apart."""
+    from app.models import Customer, RouteStop
+    customer = Customer(name=name, city="Salem", status="active", balance=Decimal(balance))
+    db.session.add(customer)
+    db.session.flush()
+    last = date.today() - timedelta(days=last_days_ago)
+    db.session.add_all(
+        RouteStop(customer_id=customer.id, route_date=last - timedelta(days=every * i),
+                  sequence=1, completed=True)
+        for i in range(4)
+    )
+    db.session.commit()
+    return customer
+
+
+def test_score_weights_saturate():
+    from app.attention import score
+    assert score(None, None, 0, 0) == (30.0, 2.0, 1.0)
+    assert score(10, 20, 0, 0)[2] < 0
+    _, _, plain = score(30, 10, 0, 0)
+    _, _, owing = score(30, 10, 100, 0)
+    _, _, huge = score(30, 10, 10**9, 10**9)
+    assert plain == 2.0 and owing == 3.0 and huge <= 3 * plain
+
+
+def test_ranking_follows_each_customers_cadence(app, db):
+    from app.helpers import get_needs_attention
+    weekly = _visited(db, "Weekly", every=7, last_days_ago=14)
+    _visited(db, "Monthly", every=30, last_days_ago=35)
+    _visited(db, "OnTime", every=30, last_days_ago=20)
+
+    ranked = get_needs_attention(limit=None)
+    assert [r["name"] for r in ranked] == ["Weekly", "Monthly"]
+    assert ranked[0]["expected_interval"] == 7.0
+    assert ranked[0]["days_overdue"] == 7
+
+    # Completing a visit today rescores in the same commit
+    from app.models import RouteStop
+    db.session.add(RouteStop(customer_id=weekly.id, route_date=date.today(), sequence=1, completed=True))
+    db.session.commit()
+    assert [r["name"] for r in get_needs_attention(limit=None)] == ["Monthly"]
+
+
+def test_balance_lifts_rank_and_rescores_on_change(app, db):
+    from app.helpers import get_needs_attention
+    _visited(db, "Small", every=30, last_days_ago=45)
+    big = _visited(db, "Owes", every=30, last_days_ago=45)
+    assert {r["name"] for r in get_needs_attention(limit=None)} == {"Small", "Owes"}
+
+    big.balance = Decimal("400")
+    db.session.commit()
+    assert get_needs_attention(limit=1)[0]["name"] == "Owes"
+
+    big.status = "inactive"
+    db.session.commit()
+    assert [r["name"] for r in get_needs_attention(limit=None)] == ["Small"]
+
+
+def test_attention_page_lists_ranked_customers(client, db):
+    _visited(db, "Weekly", every=7, last_days_ago=21)
+    resp = client.get("/analytics/attention")
+    assert resp.status_code == 200
+    assert b"Weekly" in resp.data
+    assert b"14d over" in resp.data
+
+
+def test_reads_never_write_scores(client, db):
+    from app.attention import ensure_current
+    from app.models import AttentionScore, Customer
+    _visited(db, "Weekly", every=7, last_days_ago=21)
+    db.session.add(Customer(name="New", city="Salem", status="active"))
+    db.session.commit()
+    # A new customer is scored by the flush that adds it
+    assert {s.customer.name for s in AttentionScore.query} == {"Weekly", "New"}
+
+    yesterday = date.today() - timedelta(days=1)
+    AttentionScore.query.update({"computed_on": yesterday})
+    db.session.commit()
+    assert client.get("/analytics/attention").status_code == 200
+    assert client.get("/dashboard").status_code == 200
+    db.session.expire_all()
+    assert {s.computed_on for s in AttentionScore.query} == {yesterday}
+
+    ensure_current(db.session)
+    db.session.expire_all()
+    assert {s.computed_on for s in AttentionScore.query} == {date.today()}
+
+
+def test_worker_pass_recomputes_stale_scores(app, db, tmp_path, monkeypatch):
+    from app.models import AttentionScore
+    monkeypatch.setenv("BACKUP_ARCHIVE_DIR", str(tmp_path / "archives"))
+    monkeypatch.setenv("BACKUP_TRANSPORT_DIR", str(tmp_path / "outbox"))
+    _visited(db, "Weekly", every=7, last_days_ago=21)
+    AttentionScore.query.update({"computed_on": date.today() - timedelta(days=1)})
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["backup", "schedule", "--once", "--transport", "filesystem"])
+    assert result.exit_code == 0, result.output
+    assert [s.computed_on for s in AttentionScore.query] == [date.today()]
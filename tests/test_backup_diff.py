@@ -0,0 +1,99 @@
+import io
+import json
+import zipfile
+from decimal import Decimal
+
+from app.backup import diff_backups, make_backup
+
+
+def _customers(db, *names):
+    from app.models import Customer
+    for name in names:
+        db.session.add(Customer(name=name, balance=Decimal("1.00")))
+    db.session.commit()
+
+
+def test_identical_backups_have_no_changes(app, db):
+    _customers(db, "A", "B")
+    backup = make_backup()
+
+    result = diff_backups(backup, backup)
+
+    assert (result["inserted"], result["deleted"], result["changed"]) == (0, 0, 0)
+    assert result["tables"]["customers"]["unchanged"] == 2
+
+
+def test_diff_counts_inserts_deletes_and_changes(app, db):
+    from app.models import Customer
+    _customers(db, "A", "B", "C")
+    before = make_backup()
+
+    db.session.delete(db.session.query(Customer).filter_by(name="A").one())
+    db.session.query(Customer).filter_by(name="B").update({"balance": Decimal("9.99")})
+    _customers(db, "D")
+    after = make_backup()
+
+    t = diff_backups(before, after)["tables"]["customers"]
+
+    assert (t["inserted"], t["deleted"], t["changed"], t["unchanged"]) == (1, 1, 1, 1)
+    assert t["samples"]["inserted"][0]["name"] == "D"
+    assert t["samples"]["deleted"][0]["name"] == "A"
+    assert t["samples"]["changed"][0]["columns"]["balance"] == ["1.00", "9.99"]
+
+
+def test_diff_against_live_database(app, db):
+    from app.models import Customer
+    _customers(db, "A", "B")
+    backup = make_backup()
+    db.session.query(Customer).filter_by(name="A").update({"name": "A2"})
+    _customers(db, "C")
+
+    # What restoring the backup would do to the live data.
+    t = diff_backups(None, backup)["tables"]["customers"]
+
+    assert (t["inserted"], t["deleted"], t["changed"]) == (0, 1, 1)
+
+
+def test_diff_limits_samples(app, db):
+    _customers(db, *[f"C{i}" for i in range(10)])
+    after = make_backup()
+    from app.models import Customer
+    db.session.query(Customer).delete()
+    db.session.commit()
+    before = make_backup()
+
+    t = diff_backups(before, after, sample_size=2)["tables"]["customers"]
+
+    assert t["inserted"] == 10
+    assert len(t["samples"]["inserted"]) == 2
+
+
+def test_diff_handles_archives_not_in_pk_order(app, db):
+    _customers(db, "A", "B", "C")
+    backup = make_backup()
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(backup)) as src, zipfile.ZipFile(buf, "w") as dst:
+        for name in src.namelist():
+            data = src.read(name)
+            if name == "tables/customers.json":
+                data = json.dumps(list(reversed(json.loads(data)))).encode()
+            dst.writestr(name, data)
+
+    result = diff_backups(backup, buf.getvalue())
+
+    assert result["tables"]["customers"]["unchanged"] == 3
+
+
+def test_cli_diff(app, db, tmp_path):
+    _customers(db, "A")
+    a = tmp_path / "a.zip"
+    a.write_bytes(make_backup())
+    _customers(db, "B")
+    b = tmp_path / "b.zip"
+    b.write_bytes(make_backup())
+
+    result = app.test_cli_runner().invoke(args=["backup", "diff", str(a), str(b)])
+
+    assert result.exit_code == 0, result.output
+    assert "customers" in result.output
+    assert "+1 inserted" in result.output
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.backup_schedule import (
+    FilesystemTransport, drain_outbox, enqueue, get_transport, list_archives,
+    outbox_status, request_backup, run_pending, worker_alive, write_archive,
+)
+
+NOW = datetime(2026, 5, 9, 7, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def dirs(app, tmp_path, monkeypatch):
+    monkeypatch.setenv("BACKUP_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setenv("BACKUP_INTERVAL_HOURS", "24")
+    return tmp_path
+
+
+class FlakyTransport:
+    name = "flaky"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, archive):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("network down")
+        self.sent.append(archive.name)
+        return "ok"
+
+
+def test_first_pass_archives_and_delivers(dirs):
+    transport = FilesystemTransport(dirs / "sent")
+
+    result = run_pending(transport, NOW)
+
+    assert result["archived"] is not None
+    assert result["sent"] == 1
+    assert [p.name for p in (dirs / "sent").iterdir()] == [list_archives()[0].name]
+
+
+def test_no_new_archive_until_interval_passes(dirs):
+    transport = FilesystemTransport(dirs / "sent")
+    run_pending(transport, NOW)
+
+    assert run_pending(transport, NOW + timedelta(hours=23))["archived"] is None
+    assert run_pending(transport, NOW + timedelta(hours=24))["archived"] is not None
+    assert len(list_archives()) == 2
+
+
+def test_admin_request_forces_a_backup(dirs, db):
+    transport = FilesystemTransport(dirs / "sent")
+    run_pending(transport, NOW)
+    request_backup()
+    db.session.commit()
+    assert outbox_status()["requested"] is True
+
+    result = run_pending(transport, NOW + timedelta(minutes=5))
+
+    assert result["archived"] is not None
+    assert outbox_status()["requested"] is False
+
+
+def test_request_made_during_a_build_is_kept(dirs, db, monkeypatch):
+    import app.backup_schedule as schedule
+    from app.models import WorkerState
+    transport = FilesystemTransport(dirs / "sent")
+    run_pending(transport, NOW)
+    request_backup(NOW + timedelta(minutes=1))
+    db.session.commit()
+
+    build = schedule.write_archive
+
+    def slow_build(now):
+        # Another admin clicks "Back up now" from the web process mid-build
+        with db.engine.begin() as conn:
+            conn.execute(WorkerState.__table__.update().values(requested_at=NOW + timedelta(minutes=2)))
+        return build(now)
+
+    monkeypatch.setattr(schedule, "write_archive", slow_build)
+    assert run_pending(transport, NOW + timedelta(minutes=5))["archived"] is not None
+    assert outbox_status()["requested"] is True
+
+    monkeypatch.setattr(schedule, "write_archive", build)
+    assert run_pending(transport, NOW + timedelta(minutes=6))["archived"] is not None
+    assert outbox_status()["requested"] is False
+
+
+def test_archive_rotation(dirs, monkeypatch):
+    monkeypatch.setenv("BACKUP_ARCHIVE_RETENTION", "2")
+    for hours in range(4):
+        write_archive(NOW + timedelta(hours=hours))
+    assert len(list_archives()) == 2
+
+
+def test_failed_send_is_retried_with_backoff(dirs):
+    transport = FlakyTransport(failures=1)
+    archive = write_archive(NOW)
+    enqueue(archive, NOW)
+
+    assert drain_outbox(transport, NOW)["retrying"] == 1
+    # Not due yet: the first retry waits a minute.
+    assert drain_outbox(transport, NOW + timedelta(seconds=30)) == {"sent": 0, "retrying": 0, "failed": 0}
+    assert drain_outbox(transport, NOW + timedelta(minutes=1))["sent"] == 1
+    assert transport.sent == [archive.name]
+    assert outbox_status()["pending"] == 0
+
+
+def test_gives_up_after_max_attempts(dirs, monkeypatch):
+    monkeypatch.setenv("BACKUP_MAX_ATTEMPTS", "2")
+    transport = FlakyTransport(failures=10)
+    archive = write_archive(NOW)
+    enqueue(archive, NOW)
+
+    drain_outbox(transport, NOW)
+    result = drain_outbox(transport, NOW + timedelta(hours=1))
+
+    assert result["failed"] == 1
+    status = outbox_status()
+    assert (status["pending"], status["failed"]) == (0, 1)
+
+
+def test_unknown_transport_raises(app):
+    from app.backup import BackupError
+    with pytest.raises(BackupError, match="Unknown backup transport"):
+        get_transport("carrier-pigeon")
+
+
+def test_cli_schedule_once(app, dirs):
+    result = app.test_cli_runner().invoke(
+        args=["backup", "schedule", "--once", "--transport", "filesystem"],
+        env={"BACKUP_TRANSPORT_DIR": str(dirs / "sent")},
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Archived" in result.output
+    assert len(list((dirs / "sent").iterdir())) == 1
+
+
+def test_pass_records_the_worker_heartbeat(dirs):
+    assert worker_alive(NOW) is False
+    run_pending(FilesystemTransport(dirs / "sent"), NOW)
+    assert worker_alive(NOW + timedelta(minutes=1)) is True
+    assert worker_alive(NOW + timedelta(hours=1)) is False
+
+
+def test_email_now_sends_directly_without_a_worker(dirs, client, monkeypatch):
+    sent = []
+    monkeypatch.setattr("app.backup.email_backup", lambda zip_bytes: sent.append(zip_bytes) or "msg-1")
+
+    resp = client.post("/admin/backups/email-now", follow_redirects=True)
+
+    assert len(sent) == 1
+    assert b"Backup emailed" in resp.data
+    assert outbox_status()["requested"] is False
+
+
+def test_email_now_hands_off_to_a_running_worker(dirs, client, monkeypatch):
+    monkeypatch.setattr("app.backup.email_backup", lambda zip_bytes: pytest.fail("sent inline"))
+    run_pending(FilesystemTransport(dirs / "sent"))
+
+    resp = client.post("/admin/backups/email-now", follow_redirects=True)
+
+    assert b"Backup queued" in resp.data
+    assert outbox_status()["requested"] is True
+    assert b"Scheduler:\n      running" in client.get("/admin/backups").data
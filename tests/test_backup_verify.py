@@ -0,0 +1,148 @@
+import io
+import json
+import zipfile
+from decimal import Decimal
+
+import pytest
+
+from app.backup import BackupError, _iter_json_array, make_backup, restore_backup, verify_backup
+
+
+def _ensure_alembic(db, head: str = "test_head") -> None:
+    db.session.execute(db.text(
+        "CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"
+    ))
+    db.session.execute(db.text("DELETE FROM alembic_version"))
+    db.session.execute(db.text(
+        "INSERT INTO alembic_version (version_num) VALUES (:h)"
+    ), {"h": head})
+    db.session.commit()
+
+
+def _rewrite(backup: bytes, path: str, content: bytes) -> bytes:
+    """Copy a backup zip, replacing one member's content."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(backup)) as src, zipfile.ZipFile(buf, "w") as dst:
+        for name in src.namelist():
+            dst.writestr(name, content if name == path else src.read(name))
+    return buf.getvalue()
+
+
+def _seed(db):
+    from app.models import Customer
+    db.session.add(Customer(name="A", balance=Decimal("1.00")))
+    db.session.add(Customer(name="B", balance=Decimal("2.50")))
+    db.session.commit()
+
+
+def test_manifest_records_sha256_per_table(app, db):
+    _seed(db)
+    backup = make_backup()
+    with zipfile.ZipFile(io.BytesIO(backup)) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        for entry in manifest["tables"]:
+            assert len(entry["sha256"]) == 64
+        customers = next(t for t in manifest["tables"] if t["name"] == "customers")
+        assert customers["rows"] == 2
+
+
+def test_verify_accepts_fresh_backup(app, db, tmp_path):
+    _seed(db)
+    path = tmp_path / "backup.zip"
+    path.write_bytes(make_backup())
+
+    result = verify_backup(path)
+
+    assert result["valid"] is True
+    assert result["rows"] == 4  # two customers and their overdue scores
+    assert result["checksums"] == result["tables"] == len(db.metadata.tables)
+
+
+def test_verify_detects_tampered_table(app, db):
+    _seed(db)
+    backup = make_backup()
+    with zipfile.ZipFile(io.BytesIO(backup)) as zf:
+        rows = json.loads(zf.read("tables/customers.json"))
+    rows[0]["balance"] = "999.00"
+    tampered = _rewrite(backup, "tables/customers.json", json.dumps(rows).encode())
+
+    with pytest.raises(BackupError, match="checksum"):
+        verify_backup(tampered)
+
+
+def test_verify_detects_row_count_mismatch(app, db):
+    _seed(db)
+    backup = make_backup()
+    with zipfile.ZipFile(io.BytesIO(backup)) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+    for entry in manifest["tables"]:
+        if entry["name"] == "customers":
+            entry["rows"] = 5
+    tampered = _rewrite(backup, "manifest.json", json.dumps(manifest).encode())
+
+    with pytest.raises(BackupError, match="rows"):
+        verify_backup(tampered)
+
+
+def test_verify_detects_column_drift(app, db):
+    _seed(db)
+    backup = make_backup()
+    with zipfile.ZipFile(io.BytesIO(backup)) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        rows = json.loads(zf.read("tables/customers.json"))
+    rows[1]["favourite_candy"] = "fudge"
+    for entry in manifest["tables"]:
+        entry.pop("sha256")
+    tampered = _rewrite(backup, "tables/customers.json", json.dumps(rows).encode())
+    tampered = _rewrite(tampered, "manifest.json", json.dumps(manifest).encode())
+
+    with pytest.raises(BackupError, match="favourite_candy"):
+        verify_backup(tampered)
+
+
+def test_verify_rejects_non_array_table(app, db):
+    backup = make_backup()
+    with zipfile.ZipFile(io.BytesIO(backup)) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+    for entry in manifest["tables"]:
+        entry.pop("sha256")
+    tampered = _rewrite(backup, "tables/customers.json", b'{"rows": []}')
+    tampered = _rewrite(tampered, "manifest.json", json.dumps(manifest).encode())
+
+    with pytest.raises(BackupError, match="JSON array"):
+        verify_backup(tampered)
+
+
+def test_iter_json_array_streams_across_small_chunks():
+    rows = [{"id": i, "name": f"row {i} é"} for i in range(50)]
+    fp = io.BytesIO(json.dumps(rows, indent=2).encode("utf-8"))
+    assert list(_iter_json_array(fp, chunk_size=7)) == rows
+
+
+def test_iter_json_array_rejects_truncated_file():
+    fp = io.BytesIO(b'[{"id": 1}, {"id": 2')
+    with pytest.raises(BackupError, match="valid JSON"):
+        list(_iter_json_array(fp, chunk_size=4))
+
+
+def test_restore_preflight_rejects_tampered_backup(app, db, monkeypatch, tmp_path):
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    _ensure_alembic(db)
+    _seed(db)
+    backup = make_backup()
+    tampered = _rewrite(backup, "tables/customers.json", b"[]")
+
+    with pytest.raises(BackupError, match="checksum|rows"):
+        restore_backup(tampered)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cli_verify(app, db, tmp_path):
+    _seed(db)
+    path = tmp_path / "backup.zip"
+    path.write_bytes(make_backup())
+
+    result = app.test_cli_runner().invoke(args=["backup", "verify", str(path)])
+
+    assert result.exit_code == 0, result.output
+    assert "OK: 4 rows" in result.output
@@ -0,0 +1,92 @@
+import json
+from datetime import date, timedelta
+
+
+def _customer(db, name="Ann"):
+    from app.models import Customer
+    customer = Customer(name=name, city="Salem", status="active")
+    db.session.add(customer)
+    db.session.flush()
+    return customer
+
+
+def test_cadence_stats():
+    from app.cadence import cadence_stats
+    d = date(2026, 1, 1)
+    stats = cadence_stats([d, d + timedelta(days=14), d + timedelta(days=28), d + timedelta(days=49)])
+    assert stats["visit_count"] == 4
+    assert stats["last_visit"] == d + timedelta(days=49)
+    assert stats["median_interval"] == 14.0
+    assert stats["mean_interval"] == round(49 / 3, 2)
+    assert json.loads(stats["recent_intervals"]) == [14, 14, 21]
+    assert stats["expected_next"] == d + timedelta(days=63)
+    assert cadence_stats([d])["expected_next"] is None
+    assert cadence_stats([]) is None
+
+
+def test_cadence_follows_completion_and_uncompletion(app, db):
+    from app.models import CustomerCadence, RouteStop
+    ann = _customer(db)
+    d = date(2026, 3, 2)
+    stops = [RouteStop(customer_id=ann.id, route_date=d + timedelta(days=7 * i), sequence=1) for i in range(3)]
+    db.session.add_all(stops)
+    db.session.commit()
+    assert db.session.get(CustomerCadence, ann.id) is None
+
+    for stop in stops:
+        stop.completed = True
+    db.session.commit()
+    cadence = db.session.get(CustomerCadence, ann.id)
+    assert (cadence.visit_count, cadence.median_interval) == (3, 7.0)
+    assert cadence.expected_next == d + timedelta(days=21)
+
+    stops[-1].completed = False
+    db.session.commit()
+    db.session.expire_all()
+    cadence = db.session.get(CustomerCadence, ann.id)
+    assert cadence.visit_count == 2
+    assert cadence.last_visit == d + timedelta(days=7)
+
+    db.session.delete(stops[0])
+    db.session.delete(stops[1])
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(CustomerCadence, ann.id) is None
+
+
+def test_needs_attention_reads_cadence_and_rebuild_matches(app, db):
+    from app.cadence import rebuild
+    from app.helpers import get_needs_attention
+    from app.models import CustomerCadence, RouteStop
+    today = date.today()
+    stale, fresh, never = _customer(db, "Stale"), _customer(db, "Fresh"), _customer(db, "Never")
+    db.session.add_all([
+        RouteStop(customer_id=stale.id, route_date=today - timedelta(days=60), sequence=1, completed=True),
+        RouteStop(customer_id=fresh.id, route_date=today - timedelta(days=3), sequence=1, completed=True),
+    ])
+    db.session.commit()
+
+    attention = {a["name"]: a for a in get_needs_attention(limit=None)}
+    assert sorted(attention) == ["Never", "Stale"]
+    assert attention["Stale"]["days_since"] == 60
+
+    before = {c.customer_id: c.last_visit for c in CustomerCadence.query}
+    assert rebuild(db.session) == 2
+    db.session.commit()
+    assert {c.customer_id: c.last_visit for c in CustomerCadence.query} == before
+
+
+def test_app_start_fills_an_empty_cadence_table(app, db):
+    from app.init_db import init_database
+    from app.models import CustomerCadence, RouteStop
+    ann = _customer(db)
+    yesterday = date.today() - timedelta(days=1)
+    db.session.add(RouteStop(customer_id=ann.id, route_date=yesterday, sequence=1, completed=True))
+    db.session.commit()
+    # As right after the migration: stops exist, the table is empty
+    db.session.execute(CustomerCadence.__table__.delete())
+    db.session.commit()
+
+    init_database()
+
+    assert db.session.get(CustomerCadence, ann.id).last_visit == yesterday
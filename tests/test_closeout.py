@@ -0,0 +1,206 @@
+import json
+import zipfile
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def closeout_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLOSEOUT_DIR", str(tmp_path / "closeouts"))
+    monkeypatch.setenv("PDF_CACHE_DIR", str(tmp_path / "pdf_cache"))
+    monkeypatch.setenv("RECEIPT_WORKERS", "0")
+    monkeypatch.setenv("CLOSEOUT_EMAIL_TO", "office@example.com")
+    monkeypatch.setenv("BACKUP_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setenv("BACKUP_TRANSPORT_DIR", str(tmp_path / "sent"))
+
+
+@pytest.fixture
+def route_day(app, db):
+    from app.models import Customer, RouteStop
+    from app.payments import record_sale
+    today = date.today()
+    ann = Customer(name="Ann", city="Salem", balance=Decimal("20"))
+    bob = Customer(name="Bob", city="Salem", balance=Decimal("0"))
+    db.session.add_all([ann, bob])
+    db.session.flush()
+    db.session.add_all([
+        RouteStop(customer_id=ann.id, route_date=today, sequence=1,
+                  completed=True, completed_at=datetime.now(timezone.utc)),
+        RouteStop(customer_id=bob.id, route_date=today, sequence=2),
+    ])
+    record_sale(ann.id, amount_sold=Decimal("5"), amount_paid=Decimal("10"),
+                payment_type="cash", notes=None, user_id=None)
+    db.session.commit()
+    return today, ann, bob
+
+
+def test_close_out_snapshots_day_and_archives_files(client, db, route_day):
+    from app.closeout import current_snapshot, manifest_path, receipts_path
+    today, ann, _ = route_day
+
+    resp = client.post(f"/route/closeout/{today.isoformat()}")
+    assert resp.status_code == 302
+
+    closeout, summary = current_snapshot(today)
+    assert closeout.email_status == "queued"
+    assert summary["total_stops"] == 2
+    assert summary["completed_stops"] == 1
+    assert summary["payment_count"] == 1
+    assert Decimal(summary["payment_sum"]) == Decimal("10")
+    assert manifest_path(today).read_bytes().startswith(b"%PDF")
+    with zipfile.ZipFile(receipts_path(today)) as zf:
+        assert len(zf.namelist()) == 1
+
+    page = client.get(f"/route/summary?date={today.isoformat()}")
+    assert page.status_code == 200
+    assert b"Closed out" in page.data
+
+    archived = client.get(f"/route/receipts/{today.isoformat()}")
+    assert archived.status_code == 200
+    assert archived.get_data() == receipts_path(today).read_bytes()
+
+
+def test_change_after_close_out_makes_snapshot_stale(client, db, route_day):
+    from app.closeout import current_snapshot
+    from app.payments import record_sale
+    today, _, bob = route_day
+    client.post(f"/route/closeout/{today.isoformat()}")
+
+    record_sale(bob.id, amount_sold=Decimal("3"), amount_paid=Decimal("3"),
+                payment_type="cash", notes=None, user_id=None)
+    db.session.commit()
+
+    closeout, summary = current_snapshot(today)
+    assert closeout is not None and summary is None
+    page = client.get(f"/route/summary?date={today.isoformat()}")
+    assert b"Changed since close-out" in page.data
+
+    client.post(f"/route/closeout/{today.isoformat()}")
+    _, summary = current_snapshot(today)
+    assert summary["payment_count"] == 2
+
+
+def test_reading_a_snapshot_does_not_reread_the_day(client, db, route_day):
+    from sqlalchemy import event
+
+    from app.closeout import current_snapshot
+    today, _, _ = route_day
+    client.post(f"/route/closeout/{today.isoformat()}")
+    db.session.expire_all()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        assert current_snapshot(today)[1] is not None
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert len(statements) == 1 and "route_closeouts" in statements[0]
+
+
+def test_core_resequence_makes_snapshot_stale(client, db, route_day):
+    from app.closeout import current_snapshot
+    from app.models import RouteDay, RouteStop
+    today, _, _ = route_day
+    client.post(f"/route/closeout/{today.isoformat()}")
+
+    ids = [s.id for s in RouteStop.query.filter_by(route_date=today).order_by(RouteStop.sequence.desc())]
+    resp = client.post("/planner/reorder", json={
+        "stop_ids": ids, "route_date": today.isoformat(), "version": RouteDay.version_of(today),
+    })
+    assert resp.status_code == 200, resp.get_json()
+    assert current_snapshot(today)[1] is None
+
+
+def test_customer_edit_keeps_the_close_out(client, db, route_day):
+    from app.closeout import current_snapshot
+    today, ann, _ = route_day
+    client.post(f"/route/closeout/{today.isoformat()}")
+
+    ann.phone = "555-0100"
+    db.session.commit()
+
+    assert current_snapshot(today)[1] is not None
+
+
+def test_activity_elsewhere_keeps_an_old_close_out(client, db):
+    from app.closeout import current_snapshot, receipts_path
+    from app.models import Customer, Payment, RouteStop
+    from app.payments import record_sale
+    week_ago = date.today() - timedelta(days=7)
+    ann = Customer(name="Ann", city="Salem", balance=Decimal("20"))
+    db.session.add(ann)
+    db.session.flush()
+    db.session.add(RouteStop(customer_id=ann.id, route_date=week_ago, sequence=1, completed=True))
+    db.session.add(Payment(customer_id=ann.id, amount=Decimal("5"), amount_sold=Decimal("0"),
+                           payment_type="cash", receipt_number="R-OLD-1", previous_balance=Decimal("25"),
+                           payment_date=datetime.combine(week_ago, datetime.min.time(), tzinfo=timezone.utc)))
+    db.session.commit()
+    client.post(f"/route/closeout/{week_ago.isoformat()}")
+
+    record_sale(ann.id, amount_sold=Decimal("3"), amount_paid=Decimal("3"),
+                payment_type="cash", notes=None, user_id=None)
+    db.session.get(Customer, ann.id).phone = "555-0100"
+    db.session.commit()
+
+    _, summary = current_snapshot(week_ago)
+    assert summary is not None and summary["payment_count"] == 1
+    archived = client.get(f"/route/receipts/{week_ago.isoformat()}")
+    assert archived.get_data() == receipts_path(week_ago).read_bytes()
+
+
+def test_email_is_sent_inline_only_without_a_worker(app, db, route_day):
+    from app.backup_schedule import FilesystemTransport, run_pending
+    from app.closeout import close_out, send_if_unattended
+    today = route_day[0]
+    closeout = close_out(today, user_id=None)
+    db.session.commit()
+
+    sent = []
+    assert send_if_unattended(closeout, send=sent.append) == "sent"
+    assert sent == [closeout]
+
+    run_pending(FilesystemTransport(), datetime.now(timezone.utc))  # the worker checks in
+    closeout = close_out(today, user_id=None)
+    db.session.commit()
+    assert send_if_unattended(closeout, send=sent.append) == "queued"
+    assert len(sent) == 1
+
+
+def test_drain_email_queue_retries_then_gives_up(app, db, route_day):
+    from app.closeout import MAX_EMAIL_ATTEMPTS, close_out, drain_email_queue
+    from app.models import RouteCloseout
+    today = route_day[0]
+    close_out(today, user_id=None)
+    db.session.commit()
+
+    def failing(closeout):
+        raise RuntimeError("smtp down")
+
+    now = datetime.now(timezone.utc)
+    assert drain_email_queue(now=now, send=failing) == {"sent": 0, "retrying": 1, "failed": 0}
+    # Not due again until the backoff passes
+    assert drain_email_queue(now=now, send=failing) == {"sent": 0, "retrying": 0, "failed": 0}
+
+    for _ in range(MAX_EMAIL_ATTEMPTS - 1):
+        now += timedelta(days=1)
+        drain_email_queue(now=now, send=failing)
+    closeout = db.session.get(RouteCloseout, today)
+    assert closeout.email_status == "failed"
+    assert closeout.email_error == "smtp down"
+
+
+def test_drain_email_queue_sends_summary(app, db, route_day):
+    from app.closeout import close_out, drain_email_queue
+    from app.models import RouteCloseout
+    today = route_day[0]
+    close_out(today, user_id=None)
+    db.session.commit()
+
+    sent = []
+    result = drain_email_queue(send=lambda c: sent.append(json.loads(c.summary)))
+    assert result == {"sent": 1, "retrying": 0, "failed": 0}
+    assert sent[0]["completed_stops"] == 1
+    assert db.session.get(RouteCloseout, today).email_status == "sent"
@@ -0,0 +1,73 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def customers(app, db):
+    from app.models import Customer
+    rows = [
+        Customer(name="Ann's Variety", city="Salem", phone="555-0101", balance=Decimal("12.50")),
+        Customer(name="Bob's Bait", city="Salem", phone="555-0102"),
+        Customer(name="Cat Cafe", city="Dover", phone="555-0103"),
+        Customer(name="Old Lead", city="Dover", status="lead"),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def test_planner_page_links_versioned_index_instead_of_embedding(client, customers):
+    from app.customer_index import index_version
+    resp = client.get("/planner/")
+    assert resp.status_code == 200
+    assert f"/planner/customers.json?v={index_version()}".encode() in resp.data
+    assert b"Ann's Variety" not in resp.data and b"Ann&#39;s Variety" not in resp.data
+
+
+def test_index_is_cacheable_until_a_customer_changes(client, db, customers):
+    from app.customer_index import index_version
+    version = index_version()
+
+    resp = client.get(f"/planner/customers.json?v={version}")
+    assert resp.status_code == 200
+    assert "immutable" in resp.headers["Cache-Control"]
+    doc = resp.get_json()
+    assert doc["fields"] == ["id", "name", "city", "balance"]
+    assert [row[1] for row in doc["rows"]] == ["Cat Cafe", "Ann's Variety", "Bob's Bait"]
+    assert doc["rows"][1][3] == 12.5
+
+    assert client.get("/planner/customers.json", headers={"If-None-Match": f'"{version}"'}).status_code == 304
+
+    customers[0].balance = Decimal("0")
+    db.session.commit()
+    assert index_version() != version
+    stale = client.get(f"/planner/customers.json?v={version}")
+    assert stale.headers["Cache-Control"] == "private, no-cache"
+    assert stale.get_json()["rows"][1][3] == 0
+
+
+def test_search_pages_through_active_customers(client, customers, monkeypatch):
+    from app import customer_index
+    monkeypatch.setattr(customer_index, "SEARCH_PAGE_SIZE", 2)
+    first = client.get("/planner/customers/search?q=555").get_json()
+    assert [c["name"] for c in first["results"]] == ["Ann's Variety", "Bob's Bait"]
+    assert first["has_more"] is True
+    second = client.get("/planner/customers/search?q=555&page=2").get_json()
+    assert [c["name"] for c in second["results"]] == ["Cat Cafe"]
+    assert second["has_more"] is False
+    assert client.get("/planner/customers/search?q=Old").get_json()["results"] == []
+
+
+def test_day_endpoint_returns_only_that_days_stops(client, db, customers):
+    from app.models import RouteStop
+    day = date(2026, 5, 11)
+    db.session.add(RouteStop(customer_id=customers[0].id, route_date=day, sequence=1))
+    db.session.commit()
+
+    data = client.get(f"/planner/day/{day.isoformat()}").get_json()
+    assert data["date"] == "2026-05-11"
+    assert [s["customer_name"] for s in data["stops"]] == ["Ann's Variety"]
+    assert data["version"] >= 1
+    assert client.get("/planner/day/nope").status_code == 400
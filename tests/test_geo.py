@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+from app.geo import (
+    apply_cache,
+    customers_near,
+    geohash_encode,
+    import_cache,
+    load_cache,
+    locate_customer,
+    normalize_address,
+    set_location,
+)
+from app.route_optimizer import haversine_km
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    path = tmp_path / "geocode_cache.csv"
+    monkeypatch.setenv("GEOCODE_CACHE", str(path))
+    return path
+
+
+def _write_csv(path, rows):
+    path.write_text("address,city,latitude,longitude\n" + "".join(f"{r}\n" for r in rows))
+    return path
+
+
+def test_geohash_matches_reference_value():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_normalized_address_ignores_case_and_punctuation():
+    assert normalize_address("12  Main St.", "Salem") == normalize_address("12 main st", "SALEM")
+    assert normalize_address("", "Salem") is None
+
+
+def test_import_merges_into_cache_and_later_rows_win(cache_file, tmp_path):
+    import_cache(_write_csv(tmp_path / "a.csv", ["1 Oak St,Salem,44.9,-123.0"]))
+    result = import_cache(_write_csv(tmp_path / "b.csv", [
+        "1 OAK ST.,salem,44.95,-123.05",
+        "2 Elm St,Salem,44.8,-123.1",
+    ]))
+
+    assert result == {"imported": 2, "added": 1, "total": 2}
+    assert load_cache()[normalize_address("1 Oak St", "Salem")] == (44.95, -123.05)
+
+
+def test_load_cache_parses_once_until_the_file_changes(cache_file, tmp_path, monkeypatch):
+    import os
+
+    from app import geo
+    import_cache(_write_csv(tmp_path / "a.csv", ["1 Oak St,Salem,44.9,-123.0"]))
+    reads = []
+    real_read_rows = geo._read_rows
+    monkeypatch.setattr(geo, "_read_rows", lambda path: reads.append(path) or real_read_rows(path))
+
+    first = load_cache()
+    assert load_cache() is first
+    assert len(reads) == 1
+
+    import_cache(_write_csv(tmp_path / "b.csv", ["2 Elm St,Salem,44.8,-123.1"]))
+    st = cache_file.stat()
+    os.utime(cache_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert normalize_address("2 Elm St", "Salem") in load_cache()
+
+
+def test_import_rejects_bad_coordinates(cache_file, tmp_path):
+    with pytest.raises(ValueError, match="line 2"):
+        import_cache(_write_csv(tmp_path / "bad.csv", ["1 Oak St,Salem,north,-123"]))
+    assert not cache_file.exists()
+
+
+def test_apply_cache_locates_customers_and_buckets_them(app, db, cache_file, tmp_path):
+    from app.models import Customer
+    import_cache(_write_csv(tmp_path / "a.csv", ["1 Oak St,Salem,44.9,-123.0"]))
+    found = Customer(name="Found", address="1 Oak St", city="Salem")
+    lost = Customer(name="Lost", address="9 Nowhere Rd", city="Salem")
+    db.session.add_all([found, lost])
+    db.session.commit()
+
+    assert apply_cache() == {"located": 1, "missing": 1}
+    assert found.coordinates == (44.9, -123.0)
+    assert found.geohash == geohash_encode(44.9, -123.0)
+
+    lost.address = "1 Oak St"
+    assert locate_customer(lost)
+    assert lost.geohash == found.geohash
+
+
+def test_customers_near_matches_brute_force(app, db):
+    from app.models import Customer
+    rng = random.Random(3)
+    for i in range(200):
+        c = Customer(name=f"C{i}")
+        set_location(c, 44.9 + rng.uniform(-0.2, 0.2), -123.0 + rng.uniform(-0.3, 0.3))
+        db.session.add(c)
+    db.session.commit()
+    everyone = Customer.query.all()
+
+    for km in (0.5, 2, 8):
+        hits = customers_near(44.9, -123.0, km)
+        expected = {c.id for c in everyone
+                    if haversine_km((44.9, -123.0), c.coordinates) <= km}
+        assert {c.id for c, _ in hits} == expected
+        assert [d for _, d in hits] == sorted(d for _, d in hits)
+
+
+def test_cell_lookup_is_an_index_range_not_like(app, db):
+    from app.geo import _cell_range
+    from app.models import Customer
+    for gh in ("c2b2qz", "c2b2r0", "c2b2rz", "c2b2s0", "c2bz", "c2c0", "zzz"):
+        db.session.add(Customer(name=gh, geohash=gh))
+    db.session.commit()
+
+    def within(cell):
+        return sorted(c.geohash for c in Customer.query.filter(_cell_range(cell)))
+
+    assert within("c2b2r") == ["c2b2r0", "c2b2rz"]
+    assert within("c2bz") == ["c2bz"]  # the next cell is c2c
+    assert within("zz") == ["zzz"]
+    assert "LIKE" not in str(_cell_range("c2b2r").compile()).upper()
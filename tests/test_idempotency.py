@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def stop(app, db):
+    from app.models import Customer, RouteStop
+    customer = Customer(name="Ann", city="Salem", balance=Decimal("40"))
+    db.session.add(customer)
+    db.session.flush()
+    stop = RouteStop(customer_id=customer.id, route_date=date.today(), sequence=1)
+    db.session.add(stop)
+    db.session.commit()
+    return stop
+
+
+def _pay(client, customer_id, key, amount="10"):
+    return client.post(
+        f"/customers/{customer_id}/payment",
+        data={"amount_paid": amount, "payment_type": "cash"},
+        headers={"Idempotency-Key": key, "X-Requested-With": "fetch"},
+    )
+
+
+def test_payment_retry_is_answered_from_first_attempt(client, stop, db):
+    from app.models import Customer, Payment
+    first = _pay(client, stop.customer_id, "pay-1").get_json()
+    retry = _pay(client, stop.customer_id, "pay-1").get_json()
+    assert first["ok"] and retry["replayed"]
+    assert retry["receipt_number"] == first["receipt_number"]
+    assert Payment.query.count() == 1
+    assert db.session.get(Customer, stop.customer_id).balance == Decimal("30")
+
+    # A different key is a different transaction
+    _pay(client, stop.customer_id, "pay-2")
+    assert Payment.query.count() == 2
+
+    resp = _pay(client, stop.customer_id, "bad key with spaces")
+    assert resp.status_code == 400
+    assert Payment.query.count() == 2
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+def test_expired_key_is_processed_again(client, stop, db):
+    from app.models import IdempotencyKey, Payment
+    _pay(client, stop.customer_id, "pay-1")
+    row = IdempotencyKey.query.one()
+    row.expires_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+    db.session.commit()
+
+    assert "replayed" not in _pay(client, stop.customer_id, "pay-1").get_json()
+    assert Payment.query.count() == 2
+    assert IdempotencyKey.query.count() == 1
+
+
+def test_stop_completion_retry_and_offline_replay_share_keys(client, stop, db):
+    from app.models import Payment
+    form = {"amount": "15", "payment_type": "cash"}
+    headers = {"Idempotency-Key": "done-1", "HX-Request": "true"}
+    first = client.post(f"/route/stop/{stop.id}/complete", data=form, headers=headers)
+    retry = client.post(f"/route/stop/{stop.id}/complete", data=form, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert Payment.query.count() == 1
+
+    # The phone lost the response and queued the same action offline
+    results = client.post("/route/sync", json={"ops": [
+        {"key": "done-1", "type": "complete", "stop_id": stop.id, "amount_paid": "15"},
+        {"key": "pay-9", "type": "payment", "customer_id": stop.customer_id, "amount_paid": "5"},
+        {"key": "pay-9", "type": "payment", "customer_id": stop.customer_id, "amount_paid": "5"},
+    ]}).get_json()["results"]
+    assert [r["ok"] for r in results] == [True, True, True]
+    assert [r.get("replayed", False) for r in results] == [True, False, True]
+    assert results[2]["receipt_number"] == results[1]["receipt_number"]
+    assert Payment.query.count() == 2
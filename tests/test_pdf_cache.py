@@ -0,0 +1,67 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PDF_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def invoice(app, db):
+    from app.models import Customer, Invoice
+    customer = Customer(name="Ann", city="Salem", balance=Decimal("12"))
+    db.session.add(customer)
+    db.session.flush()
+    invoice = Invoice(customer_id=customer.id, invoice_number="INV-1", amount=Decimal("12"),
+                      invoice_date=date.today(), status="unpaid")
+    db.session.add(invoice)
+    db.session.commit()
+    return invoice
+
+
+def test_invoice_pdf_is_cached_and_revalidated(client, invoice, db, cache_dir, monkeypatch):
+    from app import pdf_engine
+    url = f"/customers/{invoice.customer_id}/invoices/{invoice.id}/pdf"
+    first = client.get(url)
+    assert first.status_code == 200 and first.data.startswith(b"%PDF")
+    etag = first.get_etag()[0]
+    assert len(list(cache_dir.glob("invoice-*.pdf"))) == 1
+
+    def fail(*args):
+        raise AssertionError("rendered again")
+    with monkeypatch.context() as m:
+        m.setattr(pdf_engine, "render_invoice", fail)
+        assert client.get(url).data == first.data
+        assert client.get(url, headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+    # Marking it paid changes the document: new key, old file dropped
+    invoice.status = "paid"
+    db.session.commit()
+    paid = client.get(url, headers={"If-None-Match": f'"{etag}"'})
+    assert paid.status_code == 200
+    assert paid.get_etag()[0] != etag
+    assert len(list(cache_dir.glob("invoice-*.pdf"))) == 1
+
+
+def test_cache_is_size_bounded(app, cache_dir, monkeypatch):
+    from app import pdf_cache
+    monkeypatch.setenv("PDF_CACHE_MB", "1")
+    blob = b"x" * (400 * 1024)
+    for i in range(4):
+        pdf_cache.put("receipt", i, f"d{i}", blob)
+    assert pdf_cache.get("receipt", 0, "d0") is None
+    assert pdf_cache.get("receipt", 3, "d3") == blob
+    assert sum(p.stat().st_size for p in cache_dir.glob("*.pdf")) <= 1024 * 1024
+
+
+def test_engine_benchmark_covers_each_document(app):
+    from app import pdf_engine
+    styles = pdf_engine.styles()
+    results = pdf_engine.benchmark(iterations=1)
+    assert {"receipt", "invoice", "purchase_order"} <= set(results)
+    assert all(r["bytes"] > 0 for name, r in results.items() if name != "setup")
+    assert pdf_engine.styles() is styles
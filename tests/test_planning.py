@@ -0,0 +1,242 @@
+from datetime import date
+
+import pytest
+
+from app.planning import bulk_add_stops
+
+
+@pytest.fixture
+def towns(app, db):
+    from app.models import Customer, RouteStop
+    customers = {
+        name: Customer(name=name, city=city, status=status)
+        for name, city, status in (
+            ("Ann", "Salem", "active"),
+            ("Bob", "Salem", "active"),
+            ("Cat", "Albany", "active"),
+            ("Dan", "Albany", "inactive"),
+            ("Eve", "Bend", "active"),
+        )
+    }
+    db.session.add_all(customers.values())
+    db.session.flush()
+    db.session.add(RouteStop(customer_id=customers["Bob"].id, route_date=date(2026, 5, 5),
+                             sequence=4))
+    db.session.commit()
+    return {name: c.id for name, c in customers.items()}
+
+
+def _stops(db):
+    from app.models import Customer, RouteStop
+    return [
+        (s.route_date.day, name, s.sequence)
+        for s, name in db.session.query(RouteStop, Customer.name)
+        .join(Customer).order_by(RouteStop.route_date, RouteStop.sequence)
+    ]
+
+
+def test_bulk_add_fills_each_day_and_skips_existing(towns, db):
+    result = bulk_add_stops(date(2026, 5, 4), date(2026, 5, 5), cities=["Salem", "Albany"],
+                            customer_ids=[towns["Eve"]])
+    db.session.commit()
+
+    assert result == {"added": 7, "days": {"2026-05-04": 4, "2026-05-05": 3}}
+    assert _stops(db) == [
+        (4, "Cat", 1), (4, "Eve", 2), (4, "Ann", 3), (4, "Bob", 4),
+        (5, "Bob", 4), (5, "Cat", 5), (5, "Eve", 6), (5, "Ann", 7),
+    ]
+
+
+def test_bulk_add_is_idempotent(towns, db):
+    bulk_add_stops(date(2026, 5, 4), date(2026, 5, 4), cities=["Salem"])
+    again = bulk_add_stops(date(2026, 5, 4), date(2026, 5, 4), cities=["Salem"])
+    assert again["added"] == 0
+
+
+def test_bulk_add_validates_range(towns):
+    with pytest.raises(ValueError):
+        bulk_add_stops(date(2026, 5, 5), date(2026, 5, 4), cities=["Salem"])
+    with pytest.raises(ValueError):
+        bulk_add_stops(date(2026, 5, 1), date(2026, 7, 1), cities=["Salem"])
+
+
+def test_bulk_add_endpoint(client, towns, db):
+    resp = client.post("/planner/bulk-add", json={
+        "cities": ["Bend"], "start": "2026-05-04", "end": "2026-05-06",
+    })
+    assert resp.get_json()["added"] == 3
+
+    resp = client.post("/planner/bulk-add", json={"cities": "Bend", "start": "2026-05-04"})
+    assert resp.status_code == 400
+
+
+
+def test_bulk_add_bumps_route_version(towns, db):
+    from app.models import RouteDay
+    before = RouteDay.version_of(date(2026, 5, 5))
+    bulk_add_stops(date(2026, 5, 4), date(2026, 5, 5), cities=["Bend"])
+    db.session.commit()
+    assert RouteDay.version_of(date(2026, 5, 4)) == 1
+    assert RouteDay.version_of(date(2026, 5, 5)) == before + 1
+    assert RouteDay.version_of(date(2026, 5, 6)) == 0
+
+
+def test_reorder_is_guarded_by_route_version(client, towns, db):
+    from app.models import RouteDay, RouteStop
+    client.post("/planner/bulk-add", json={"cities": ["Salem", "Albany"], "start": "2026-05-05"})
+    ids = [s.id for s in RouteStop.query.filter_by(route_date=date(2026, 5, 5))
+           .order_by(RouteStop.sequence)]
+    reordered = ids[::-1]
+    seen = RouteDay.version_of(date(2026, 5, 5))
+
+    resp = client.post("/planner/reorder", json={"route_date": "2026-05-05", "version": seen,
+                                                 "stop_ids": reordered})
+    assert resp.get_json() == {"success": True, "count": 3, "version": seen + 1}
+    assert [s for _, _, s in _stops(db)] == [1, 2, 3]
+    assert [s.id for s in RouteStop.query.order_by(RouteStop.sequence)] == reordered
+
+    # A second device still holding version 1 is refused and handed the current route
+    resp = client.post("/planner/reorder", json={"route_date": "2026-05-05", "version": seen,
+                                                 "stop_ids": ids})
+    assert resp.status_code == 409
+    body = resp.get_json()
+    assert body["version"] == seen + 1
+    assert [s["id"] for s in body["stops"]] == reordered
+
+    resp = client.post("/planner/reorder", json={"route_date": "2026-05-04", "version": 0,
+                                                 "stop_ids": ids})
+    assert resp.status_code == 400
+    resp = client.post("/planner/reorder", json={"route_date": "2026-05-05", "stop_ids": ids})
+    assert resp.status_code == 400
+
+@pytest.fixture
+def busy_week(app, db):
+    """Ten overdue Salem customers, five in Albany, and a weekly Monday schedule."""
+    from app.models import Customer, RecurringStop
+    from app.recurring import reset_next_occurrence
+    for i in range(10):
+        db.session.add(Customer(name=f"Salem {i}", city="Salem"))
+    for i in range(5):
+        db.session.add(Customer(name=f"Albany {i}", city="Albany"))
+    weekly = Customer(name="Weekly", city="Bend")
+    db.session.add(weekly)
+    db.session.flush()
+    r = RecurringStop(customer_id=weekly.id, interval_days=7, start_date=date(2026, 5, 4))
+    reset_next_occurrence(r, today=date(2026, 5, 1))
+    db.session.add(r)
+    db.session.commit()
+    return r
+
+
+def test_plan_week_balances_and_clusters(busy_week, db):
+    from app.planning import plan_week
+
+    plan = plan_week(date(2026, 5, 4), date(2026, 5, 8), capacity=5, time_budget=0.2)
+
+    assert sorted(d["total"] for d in plan["days"]) == [3, 3, 3, 3, 4]
+    assert len(plan["assignments"]) == 16 and plan["unassigned"] == []
+    for d in plan["days"]:
+        assert len({a["city"] for a in d["add"]}) <= 2
+    weekly = next(a for a in plan["assignments"] if a["recurring_id"] == busy_week.id)
+    assert weekly["date"] in ("2026-05-04", "2026-05-05")
+    assert _stops(db) == []  # preview only
+
+
+def test_plan_week_respects_capacity(busy_week):
+    from app.planning import plan_week
+
+    plan = plan_week(date(2026, 5, 4), date(2026, 5, 5), capacity=3, time_budget=0.05)
+
+    assert all(d["total"] <= 3 for d in plan["days"])
+    assert len(plan["unassigned"]) == 16 - 6
+
+
+def test_apply_week_plan_skips_moved_recurring_date(busy_week, db):
+    from app.models import RecurringSkip
+    from app.planning import apply_week_plan
+    from app.recurring import materialize_recurring
+
+    result = apply_week_plan([
+        {"customer_id": busy_week.customer_id, "date": "2026-05-05",
+         "recurring_id": busy_week.id, "preferred": "2026-05-04"},
+    ])
+    materialize_recurring(date(2026, 5, 8))
+    db.session.commit()
+
+    assert result == {"added": 1, "moved": 1}
+    assert RecurringSkip.query.filter_by(skip_date=date(2026, 5, 4)).count() == 1
+    assert [(d, name) for d, name, _ in _stops(db)] == [(5, "Weekly")]
+
+
+def test_week_preview_then_apply(client, busy_week, db):
+    import json
+
+    resp = client.get("/planner/week?start=2026-05-04&end=2026-05-08&capacity=5")
+    assert resp.status_code == 200
+    assert _stops(db) == []
+
+    plan = [{"customer_id": busy_week.customer_id, "date": "2026-05-04",
+             "recurring_id": busy_week.id, "preferred": "2026-05-04"}]
+    resp = client.post("/planner/week", data={"start": "2026-05-04",
+                                              "assignments": json.dumps(plan)})
+    assert resp.status_code == 302
+    assert [name for _, name, _ in _stops(db)] == ["Weekly"]
+
+
+def test_apply_week_plan_counts_only_inserted_stops(towns, db):
+    from app.planning import apply_week_plan
+
+    result = apply_week_plan([
+        {"customer_id": towns["Bob"], "date": "2026-05-05"},
+        {"customer_id": towns["Ann"], "date": "2026-05-05"},
+    ])
+    db.session.commit()
+
+    assert result == {"added": 1, "moved": 0}
+    assert [name for _, name, _ in _stops(db)] == ["Bob", "Ann"]
+
+
+def test_plan_week_never_doubles_a_customer_on_a_day(app, db):
+    from collections import Counter
+
+    from app.models import Customer, RecurringStop, RouteStop
+    from app.planning import apply_week_plan, plan_week
+    from app.recurring import reset_next_occurrence
+    daily, weekly = Customer(name="Daily", city="Salem"), Customer(name="Weekly", city="Bend")
+    db.session.add_all([daily, weekly])
+    db.session.flush()
+    for customer, every in ((daily, 1), (weekly, 7)):
+        r = RecurringStop(customer_id=customer.id, interval_days=every, start_date=date(2026, 5, 4))
+        reset_next_occurrence(r, today=date(2026, 5, 1))
+        db.session.add(r)
+    # Weekly is already on Tuesday, the only day its Monday visit could move to
+    db.session.add(RouteStop(customer_id=weekly.id, route_date=date(2026, 5, 5), sequence=1))
+    db.session.commit()
+
+    for seed in range(5):
+        plan = plan_week(date(2026, 5, 4), date(2026, 5, 8), capacity=2,
+                         include_attention=False, time_budget=0.05, seed=seed)
+        pairs = Counter((a["customer_id"], a["date"]) for a in plan["assignments"])
+        assert max(pairs.values()) == 1
+        assert (weekly.id, "2026-05-05") not in pairs
+
+    result = apply_week_plan(plan["assignments"])
+    db.session.commit()
+    assert result["added"] == len(plan["assignments"]) == 6
+    assert [d for d, name, _ in _stops(db) if name == "Daily"] == [4, 5, 6, 7, 8]
+
+
+def test_apply_week_plan_keeps_the_date_of_a_visit_it_could_not_move(busy_week, db):
+    from app.models import RecurringSkip, RouteStop
+    from app.planning import apply_week_plan
+    db.session.add(RouteStop(customer_id=busy_week.customer_id, route_date=date(2026, 5, 5), sequence=1))
+    db.session.commit()
+
+    result = apply_week_plan([
+        {"customer_id": busy_week.customer_id, "date": "2026-05-05",
+         "recurring_id": busy_week.id, "preferred": "2026-05-04"},
+    ])
+    db.session.commit()
+
+    assert result == {"added": 0, "moved": 0}
+    assert RecurringSkip.query.count() == 0
@@ -0,0 +1,60 @@
+import io
+import zipfile
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def receipts(app, db):
+    from app.models import Customer
+    from app.payments import record_sale
+    numbers = []
+    for name in ("Ann", "Bob", "Cat"):
+        customer = Customer(name=name, city="Salem", balance=Decimal("20"))
+        db.session.add(customer)
+        db.session.flush()
+        sale = record_sale(customer.id, amount_sold=Decimal("5"), amount_paid=Decimal("10"),
+                           payment_type="cash", notes=None, user_id=None)
+        numbers.append(sale["receipt_number"])
+    db.session.commit()
+    return numbers
+
+
+@pytest.mark.parametrize("workers", ["0", "2"])
+def test_receipts_zip_streams_every_receipt(client, receipts, monkeypatch, workers):
+    from app import receipts as receipts_module
+    monkeypatch.setenv("RECEIPT_WORKERS", workers)
+    try:
+        resp = client.get(f"/route/receipts/{date.today().isoformat()}")
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert "receipts-" in resp.headers["Content-Disposition"]
+        with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+            assert zf.testzip() is None
+            assert sorted(zf.namelist()) == sorted(f"{n}.pdf" for n in receipts)
+            assert all(zf.read(name).startswith(b"%PDF") for name in zf.namelist())
+    finally:
+        if receipts_module._pool is not None:
+            receipts_module._discard_pool(receipts_module._pool)
+
+
+def test_receipts_zip_skips_a_receipt_that_fails(client, receipts, monkeypatch):
+    from app import pdf_engine
+    from app.receipts import FAILED_NOTE
+    monkeypatch.setenv("RECEIPT_WORKERS", "0")
+    render = pdf_engine.render_receipt
+
+    def flaky(payment, customer):
+        if payment.receipt_number == receipts[1]:
+            raise ValueError("bad payment data")
+        return render(payment, customer)
+
+    monkeypatch.setattr(pdf_engine, "render_receipt", flaky)
+    resp = client.get(f"/route/receipts/{date.today().isoformat()}")
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+        assert zf.testzip() is None
+        assert sorted(zf.namelist()) == sorted([f"{receipts[0]}.pdf", f"{receipts[2]}.pdf", FAILED_NOTE])
+        assert f"{receipts[1]}.pdf" in zf.read(FAILED_NOTE).decode()
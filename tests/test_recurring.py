@@ -0,0 +1,188 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.recurring import (
+    backfill_next_occurrence,
+    materialize_recurring,
+    occurrence_on_or_after,
+    reset_next_occurrence,
+    top_up,
+)
+
+
+@pytest.fixture
+def schedule(app, db):
+    from app.models import Customer, RecurringStop
+    c = Customer(name="Alpha")
+    db.session.add(c)
+    db.session.flush()
+    r = RecurringStop(customer_id=c.id, interval_days=7, start_date=date(2026, 5, 4))
+    reset_next_occurrence(r, today=date(2026, 5, 1))
+    db.session.add(r)
+    db.session.commit()
+    return r
+
+
+def _stop_dates(db):
+    from app.models import RouteStop
+    return [s.route_date for s in db.session.query(RouteStop).order_by(RouteStop.route_date)]
+
+
+def test_occurrence_rounds_up_to_next_interval(schedule):
+    assert occurrence_on_or_after(schedule, date(2026, 5, 1)) == date(2026, 5, 4)
+    assert occurrence_on_or_after(schedule, date(2026, 5, 4)) == date(2026, 5, 4)
+    assert occurrence_on_or_after(schedule, date(2026, 5, 5)) == date(2026, 5, 11)
+    schedule.end_date = date(2026, 5, 10)
+    assert occurrence_on_or_after(schedule, date(2026, 5, 5)) is None
+
+
+def test_materialize_creates_each_occurrence_and_advances(schedule, db):
+    result = materialize_recurring(date(2026, 5, 25))
+    db.session.commit()
+
+    assert result == {"schedules": 1, "created": 4}
+    assert _stop_dates(db) == [date(2026, 5, d) for d in (4, 11, 18, 25)]
+    assert schedule.next_occurrence == date(2026, 6, 1)
+
+
+def test_materialize_is_idempotent_and_respects_skips(schedule, db):
+    from app.models import RecurringSkip, RouteStop
+    db.session.add(RecurringSkip(recurring_stop_id=schedule.id, skip_date=date(2026, 5, 11)))
+    db.session.add(RouteStop(customer_id=schedule.customer_id, route_date=date(2026, 5, 18)))
+    db.session.commit()
+
+    assert materialize_recurring(date(2026, 5, 18))["created"] == 1
+    db.session.commit()
+    assert materialize_recurring(date(2026, 5, 18)) == {"schedules": 0, "created": 0}
+    assert _stop_dates(db) == [date(2026, 5, 4), date(2026, 5, 18)]
+
+
+def test_materialize_stops_at_end_date(schedule, db):
+    schedule.end_date = date(2026, 5, 12)
+    db.session.commit()
+
+    assert materialize_recurring(date(2026, 6, 30))["created"] == 2
+    assert schedule.next_occurrence is None
+
+
+def test_backfill_seeds_schedules_missing_next_occurrence(schedule, db):
+    schedule.next_occurrence = None
+    db.session.commit()
+
+    assert backfill_next_occurrence(today=date(2026, 5, 12)) == 1
+    assert schedule.next_occurrence == date(2026, 5, 18)
+
+
+def test_cli_materializes_through_horizon(app, db):
+    from app.models import Customer, RecurringStop
+    c = Customer(name="Beta")
+    db.session.add(c)
+    db.session.flush()
+    db.session.add(RecurringStop(customer_id=c.id, interval_days=14, start_date=date.today()))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["recurring", "materialize", "--days", "20"])
+
+    assert result.exit_code == 0, result.output
+    assert "Initialized 1 schedule" in result.output
+    assert _stop_dates(db) == [date.today(), date.today() + timedelta(days=14)]
+
+
+def test_top_up_fills_the_horizon_once_a_day(schedule, db, monkeypatch, caplog):
+    monkeypatch.setenv("RECURRING_HORIZON_DAYS", "21")
+
+    result = top_up(today=date(2026, 5, 12))
+
+    # The lapsed May 4/11 occurrences are skipped, not back-filled, and logged
+    assert result == {"schedules": 1, "created": 3}
+    assert _stop_dates(db) == [date(2026, 5, 18), date(2026, 5, 25), date(2026, 6, 1)]
+    assert "2026-05-04 to 2026-05-11 were never generated" in caplog.text
+    assert top_up(today=date(2026, 5, 12)) is None
+
+
+def test_worker_tops_up_recurring_stops_and_pages_do_not(app, client, db, tmp_path, monkeypatch):
+    from app.models import Customer, RecurringStop
+    monkeypatch.setenv("BACKUP_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setenv("BACKUP_TRANSPORT_DIR", str(tmp_path / "outbox"))
+    c = Customer(name="Gamma")
+    db.session.add(c)
+    db.session.flush()
+    db.session.add(RecurringStop(customer_id=c.id, interval_days=7, start_date=date.today()))
+    db.session.commit()
+
+    assert client.get("/route/").status_code == 200
+    assert client.get("/planner/").status_code == 200
+    assert _stop_dates(db) == []
+
+    result = app.test_cli_runner().invoke(args=["backup", "schedule", "--once", "--transport", "filesystem"])
+    assert result.exit_code == 0, result.output
+    assert date.today() in _stop_dates(db)
+
+
+def test_planner_get_projects_without_writing(client, schedule, db):
+    resp = client.get("/planner/?date=2026-05-11")
+
+    assert resp.status_code == 200
+    assert b'"recurring_id": %d' % schedule.id in resp.data
+    assert _stop_dates(db) == []
+    assert schedule.next_occurrence == date(2026, 5, 4)
+
+
+def test_generate_is_idempotent(client, schedule, db):
+    for _ in range(2):
+        resp = client.post("/planner/generate", data={"route_date": "2026-05-11"},
+                           headers={"X-Requested-With": "XMLHttpRequest"})
+        assert resp.status_code == 200
+
+    assert resp.get_json()["added"] == 0
+    assert resp.get_json()["projected"] == []
+    assert _stop_dates(db) == [date(2026, 5, 4), date(2026, 5, 11)]
+
+
+def test_route_stops_unique_per_customer_and_date(schedule, db):
+    from sqlalchemy.exc import IntegrityError
+
+    from app.models import RouteStop
+    from app.recurring import insert_stops
+    db.session.add(RouteStop(customer_id=schedule.customer_id, route_date=date(2026, 5, 4)))
+    db.session.commit()
+
+    insert_stops([{"customer_id": schedule.customer_id, "route_date": date(2026, 5, 4),
+                    "sequence": 9, "completed": False, "created_by": None}])
+    db.session.commit()
+    assert _stop_dates(db) == [date(2026, 5, 4)]
+
+    db.session.add(RouteStop(customer_id=schedule.customer_id, route_date=date(2026, 5, 4)))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_projected_counts_subtracts_skips_and_existing_stops(schedule, db):
+    from app.models import RecurringSkip, RouteStop
+    from app.recurring import projected_counts
+    db.session.add(RecurringSkip(recurring_stop_id=schedule.id, skip_date=date(2026, 5, 11)))
+    db.session.add(RouteStop(customer_id=schedule.customer_id, route_date=date(2026, 5, 18)))
+    db.session.commit()
+
+    counts = projected_counts(date(2026, 5, 5), date(2026, 6, 1))
+
+    assert counts == {date(2026, 5, 25): 1, date(2026, 6, 1): 1}
+    assert len(projected_counts(date(2026, 1, 1), date(2026, 12, 31))) == 33
+
+
+def test_calendar_merges_actual_and_projected(client, schedule, db):
+    from app.models import RouteStop
+    db.session.add(RouteStop(customer_id=schedule.customer_id, route_date=date(2026, 5, 4),
+                             completed=True))
+    schedule.next_occurrence = date(2026, 5, 11)
+    db.session.commit()
+
+    resp = client.get("/planner/calendar?start=2026-05-01&end=2026-05-12")
+
+    assert resp.get_json() == {
+        "2026-05-04": {"total": 1, "done": 1, "projected": 0},
+        "2026-05-11": {"total": 0, "done": 0, "projected": 1},
+    }
+    assert client.get("/planner/calendar?start=2026-01-01&end=2027-12-31").status_code == 400
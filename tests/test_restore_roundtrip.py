@@ -100,3 +100,25 @@ def test_restore_rotates_secret_key(app, db, monkeypatch, tmp_path):
     restore_backup(backup)
     after = app.secret_key
     assert before != after
+
+
+def test_restore_brings_back_the_cadence_from_the_archive(app, db, monkeypatch, tmp_path):
+    from datetime import date, timedelta
+
+    from app.models import Customer, CustomerCadence, RouteStop
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    _ensure_alembic(db)
+    c = Customer(name="Regular")
+    db.session.add(c)
+    db.session.flush()
+    db.session.add_all(RouteStop(customer_id=c.id, route_date=date(2026, 5, 4) + timedelta(days=7 * i),
+                                 sequence=1, completed=True) for i in range(3))
+    db.session.commit()
+    backup = make_backup()
+
+    db.session.execute(CustomerCadence.__table__.delete())
+    db.session.commit()
+    restore_backup(backup)
+
+    cadence = db.session.get(CustomerCadence, c.id)
+    assert cadence.median_interval == 7 and cadence.last_visit == date(2026, 5, 18)
@@ -0,0 +1,115 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.backup import BackupError, make_backup, restore_selective
+
+
+def _ensure_alembic(db, head: str = "test_head") -> None:
+    db.session.execute(db.text(
+        "CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"
+    ))
+    db.session.execute(db.text("DELETE FROM alembic_version"))
+    db.session.execute(db.text(
+        "INSERT INTO alembic_version (version_num) VALUES (:h)"
+    ), {"h": head})
+    db.session.commit()
+
+
+@pytest.fixture
+def two_customers(app, db, monkeypatch, tmp_path):
+    from app.models import Customer, Invoice, InvoiceItem, Payment
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    _ensure_alembic(db)
+    a = Customer(name="Alpha", balance=Decimal("10.00"))
+    b = Customer(name="Beta", balance=Decimal("20.00"))
+    db.session.add_all([a, b])
+    db.session.flush()
+    for c, prefix in ((a, "A"), (b, "B")):
+        db.session.add(Payment(customer_id=c.id, amount=Decimal("5.00"),
+                               receipt_number=f"{prefix}-1", previous_balance=Decimal("0")))
+        inv = Invoice(customer_id=c.id, invoice_number=f"{prefix}-INV", amount=Decimal("3.00"),
+                      invoice_date=date(2026, 5, 1))
+        inv.items.append(InvoiceItem(description=f"{prefix} fudge", unit_price=Decimal("3.00"),
+                                     amount=Decimal("3.00")))
+        db.session.add(inv)
+    db.session.commit()
+    return a.id, b.id
+
+
+def test_restores_one_customers_deleted_payments(two_customers, db):
+    from app.models import Payment
+    alpha_id, beta_id = two_customers
+    backup = make_backup()
+
+    db.session.query(Payment).delete()
+    db.session.commit()
+
+    result = restore_selective(backup, tables=["payments"], customer_id=alpha_id)
+
+    assert result["tables"] == {"payments": 1}
+    assert [p.receipt_number for p in db.session.query(Payment).all()] == ["A-1"]
+
+
+def test_customer_restore_follows_child_tables(two_customers, db):
+    from app.models import Customer, Invoice, InvoiceItem
+    alpha_id, beta_id = two_customers
+    backup = make_backup()
+
+    db.session.query(InvoiceItem).delete()
+    db.session.query(Customer).filter_by(id=alpha_id).update({"name": "Changed"})
+    db.session.query(Customer).filter_by(id=beta_id).update({"name": "Beta Edited"})
+    db.session.commit()
+
+    result = restore_selective(backup, customer_id=alpha_id)
+
+    assert result["tables"]["invoice_items"] == 1
+    assert db.session.get(Customer, alpha_id).name == "Alpha"
+    # Beta's live edit and deleted item are left alone.
+    assert db.session.get(Customer, beta_id).name == "Beta Edited"
+    items = db.session.query(InvoiceItem).join(Invoice).all()
+    assert [i.description for i in items] == ["A fudge"]
+
+
+def test_table_restore_upserts_without_deleting_new_rows(two_customers, db):
+    from app.models import Customer
+    backup = make_backup()
+
+    db.session.query(Customer).update({"balance": Decimal("0")})
+    db.session.add(Customer(name="Gamma"))
+    db.session.commit()
+
+    restore_selective(backup, tables=["customers"])
+
+    rows = {c.name: c.balance for c in db.session.query(Customer).all()}
+    assert rows == {"Alpha": Decimal("10.00"), "Beta": Decimal("20.00"), "Gamma": Decimal("0")}
+
+
+def test_selective_restore_requires_a_selection(two_customers):
+    with pytest.raises(BackupError, match="Choose"):
+        restore_selective(make_backup())
+
+
+def test_rejects_tables_not_linked_to_customers(two_customers):
+    alpha_id, _ = two_customers
+    with pytest.raises(BackupError, match="not linked"):
+        restore_selective(make_backup(), tables=["users"], customer_id=alpha_id)
+
+
+def test_cli_selective_restore(app, two_customers, db, tmp_path):
+    from app.models import Payment
+    alpha_id, _ = two_customers
+    path = tmp_path / "backup.zip"
+    path.write_bytes(make_backup())
+    db.session.query(Payment).delete()
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=[
+        "backup", "restore", str(path), "--confirm", "RESTORE",
+        "--table", "payments", "--customer", str(alpha_id),
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert "Upserted 1 rows" in result.output
+    assert db.session.query(Payment).count() == 1
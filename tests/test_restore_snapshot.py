@@ -1,3 +1,5 @@
+import zlib
+
 import pytest
 
 from app.backup import make_backup, restore_backup
@@ -23,19 +25,20 @@ def test_restore_creates_pre_restore_snapshot(app, db, tmp_path, monkeypatch):
 
     restore_backup(backup)
 
-    snapshots = list(tmp_path.glob("pre-restore-*.zip"))
+    snapshots = list(tmp_path.glob("pre-restore-*.json"))
     assert len(snapshots) == 1
 
 
 def test_snapshot_retention_keeps_last_three(app, db, tmp_path, monkeypatch):
     monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr("app.backup.SNAPSHOT_RETENTION", 3)
     _ensure_alembic(db)
 
     backup = make_backup()
     for _ in range(5):
         restore_backup(backup)
 
-    snapshots = sorted(tmp_path.glob("pre-restore-*.zip"))
+    snapshots = sorted(tmp_path.glob("pre-restore-*.json"))
     assert len(snapshots) == 3
 
 
@@ -60,3 +63,93 @@ def test_snapshot_failure_aborts_restore(app, db, tmp_path, monkeypatch):
 
     names = {c.name for c in db.session.query(Customer).all()}
     assert "Added After Backup" in names
+
+
+def test_unchanged_snapshots_share_chunks(app, db, tmp_path, monkeypatch):
+    from app.backup import _write_pre_restore_snapshot
+    from app.models import Customer
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr("app.backup.SNAPSHOT_CHUNK_ROWS", 10)
+    _ensure_alembic(db)
+    for i in range(45):
+        db.session.add(Customer(name=f"C{i}"))
+    db.session.commit()
+
+    _write_pre_restore_snapshot()
+    chunks_after_first = set((tmp_path / "chunks").glob("*/*"))
+    _write_pre_restore_snapshot()
+    assert set((tmp_path / "chunks").glob("*/*")) == chunks_after_first
+
+    db.session.get(Customer, 3).name = "Renamed"
+    db.session.commit()
+    _write_pre_restore_snapshot()
+    # Only the bucket holding customer 3 is new.
+    assert len(set((tmp_path / "chunks").glob("*/*")) - chunks_after_first) == 1
+
+
+def test_pruning_removes_unreferenced_chunks(app, db, tmp_path, monkeypatch):
+    from app.backup import _write_pre_restore_snapshot
+    from app.models import Customer
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr("app.backup.SNAPSHOT_RETENTION", 1)
+    _ensure_alembic(db)
+    db.session.add(Customer(name="Old"))
+    db.session.commit()
+    _write_pre_restore_snapshot()
+
+    db.session.query(Customer).update({"name": "New"})
+    db.session.commit()
+    _write_pre_restore_snapshot()
+
+    assert len(list(tmp_path.glob("pre-restore-*.json"))) == 1
+    customer_chunks = [
+        c for c in (tmp_path / "chunks").glob("*/*")
+        if b"Old" in zlib.decompress(c.read_bytes())
+    ]
+    assert customer_chunks == []
+
+
+def test_snapshot_exports_as_restorable_backup(app, db, tmp_path, monkeypatch):
+    from decimal import Decimal
+    from app.backup import list_snapshots, snapshot_to_backup, verify_backup
+    from app.models import Customer
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    _ensure_alembic(db)
+    db.session.add(Customer(name="Keep", balance=Decimal("7.25")))
+    db.session.commit()
+
+    restore_backup(make_backup())
+    db.session.query(Customer).delete()
+    db.session.commit()
+
+    [snapshot] = list_snapshots()
+    exported = snapshot_to_backup(snapshot["name"])
+    assert verify_backup(exported)["valid"] is True
+    restore_backup(exported)
+
+    c = db.session.query(Customer).one()
+    assert (c.name, c.balance) == ("Keep", Decimal("7.25"))
+
+
+def test_legacy_zip_snapshots_are_listed_and_pruned(app, db, tmp_path, monkeypatch):
+    from app.backup import _write_pre_restore_snapshot, list_snapshots, snapshot_to_backup
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr("app.backup.SNAPSHOT_RETENTION", 2)
+    _ensure_alembic(db)
+    legacy = [tmp_path / f"pre-restore-2025010{i}T000000000000Z.zip" for i in (1, 2)]
+    for path in legacy:
+        path.write_bytes(make_backup())
+
+    assert [s["name"] for s in list_snapshots()] == [legacy[1].stem, legacy[0].stem]
+    assert snapshot_to_backup(legacy[1].stem) == legacy[1].read_bytes()
+
+    _write_pre_restore_snapshot()
+    assert not legacy[0].exists()
+    assert [s["name"] for s in list_snapshots()][1:] == [legacy[1].stem]
+
+
+def test_snapshot_name_must_be_valid(app, tmp_path, monkeypatch):
+    from app.backup import BackupError, snapshot_to_backup
+    monkeypatch.setattr("app.backup.SNAPSHOT_DIR", tmp_path)
+    with pytest.raises(BackupError, match="No snapshot"):
+        snapshot_to_backup("../../etc/passwd")
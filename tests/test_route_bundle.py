@@ -0,0 +1,99 @@
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def route(app, db):
+    from app.models import Customer, RouteStop
+    ann = Customer(name="Ann", city="Salem", balance=40)
+    bob = Customer(name="Bob", city="Albany", balance=0)
+    db.session.add_all([ann, bob])
+    db.session.flush()
+    today = date.today()
+    db.session.add_all([
+        RouteStop(customer_id=ann.id, route_date=today, sequence=1),
+        RouteStop(customer_id=bob.id, route_date=today, sequence=2),
+        RouteStop(customer_id=ann.id, route_date=date(2020, 1, 6), sequence=1),
+    ])
+    db.session.commit()
+    return {"ann": ann.id, "bob": bob.id, "today": today.isoformat()}
+
+
+def test_bundle_contents_and_not_modified(client, route):
+    resp = client.get(f"/api/route/{route['today']}")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert [s["customer"]["name"] for s in body["stops"]] == ["Ann", "Bob"]  # sequence, not city
+    assert body["collection_target"] == 40.0
+    assert body["total_stops"] == 2 and body["completed_stops"] == 0
+
+    etag = resp.headers["ETag"]
+    again = client.get(f"/api/route/{route['today']}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert client.get("/api/route/not-a-date").status_code == 400
+
+
+def test_completing_a_stop_changes_the_bundle(client, route, db):
+    from app.models import RouteStop
+    url = f"/api/route/{route['today']}"
+    etag = client.get(url).headers["ETag"]
+    stop = RouteStop.query.filter_by(customer_id=route["ann"], route_date=date.today()).one()
+
+    client.post(f"/route/stop/{stop.id}/complete", data={"amount": "15", "payment_type": "cash"})
+
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["collected"] == 15.0 and body["completed_stops"] == 1
+    ann = next(s for s in body["stops"] if s["customer"]["id"] == route["ann"])
+    assert ann["customer"]["balance"] == 25.0
+    assert ann["last_payment"]["amount"] == 15.0
+
+
+def test_customer_edit_bumps_only_current_and_future_days(route, db):
+    from app.models import Customer, RouteDay
+    past, today = RouteDay.version_of(date(2020, 1, 6)), RouteDay.version_of(date.today())
+    db.session.get(Customer, route["ann"]).phone = "555-0100"
+    db.session.commit()
+    assert RouteDay.version_of(date(2020, 1, 6)) == past
+    assert RouteDay.version_of(date.today()) == today + 1
+
+
+def test_payment_bumps_its_own_day_not_the_customers_history(route, db):
+    from decimal import Decimal
+
+    from app.models import RouteDay
+    from app.payments import record_sale
+    past = RouteDay.version_of(date(2020, 1, 6))
+    record_sale(route["ann"], amount_sold=Decimal("0"), amount_paid=Decimal("5"),
+                payment_type="cash", notes=None, user_id=None)
+    db.session.commit()
+    assert RouteDay.version_of(date(2020, 1, 6)) == past
+
+
+def test_route_manifest_rows_and_cached_pdf(client, route, db, tmp_path, monkeypatch):
+    from app.models import RouteStop
+    from app.route_manifest import manifest_rows
+    monkeypatch.setenv("PDF_CACHE_DIR", str(tmp_path))
+    old = RouteStop.query.filter_by(route_date=date(2020, 1, 6)).one()
+    old.completed = True
+    db.session.commit()
+
+    rows = manifest_rows(date.today())
+    assert [r.name for r in rows] == ["Ann", "Bob"]  # route sequence, not city
+    assert rows[0].last_visit == date(2020, 1, 6) and rows[1].last_visit is None
+    assert rows[0].last_payment_date is None
+
+    url = f"/route/manifest/{route['today']}"
+    resp = client.get(url)
+    assert resp.status_code == 200 and resp.data.startswith(b"%PDF")
+    etag = resp.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    stop = RouteStop.query.filter_by(customer_id=route["ann"], route_date=date.today()).one()
+    client.post(f"/route/stop/{stop.id}/complete", data={"amount": "15", "payment_type": "cash"})
+    assert manifest_rows(date.today())[0].last_paid == 15
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    assert len(list(tmp_path.glob("manifest-*.pdf"))) == 1
@@ -0,0 +1,86 @@
+import itertools
+import random
+from datetime import date
+
+import pytest
+
+from app.route_optimizer import haversine_km, optimize_order
+
+
+def _path_km(points, order):
+    return sum(haversine_km(points[a], points[b]) for a, b in zip(order, order[1:]))
+
+
+def test_small_routes_match_brute_force():
+    rng = random.Random(7)
+    for _ in range(20):
+        points = [(45 + rng.random(), -122 + rng.random()) for _ in range(rng.randint(3, 7))]
+        best = min(_path_km(points, p) for p in itertools.permutations(range(len(points))))
+
+        result = optimize_order(points)
+
+        assert sorted(result["order"]) == list(range(len(points)))
+        assert _path_km(points, result["order"]) == pytest.approx(best)
+
+
+def test_untangles_a_scrambled_line_within_budget():
+    points = [(45.0, -122.0 + 0.01 * i) for i in (0, 5, 2, 7, 1, 4, 6, 3)]
+
+    result = optimize_order(points, time_budget=0.2)
+
+    assert [points[i][1] for i in result["order"]] in (
+        sorted(p[1] for p in points), sorted((p[1] for p in points), reverse=True)
+    )
+    assert result["distance_km"] < result["initial_km"]
+
+
+def test_never_worse_than_input_order():
+    points = [(45.0, -122.0), (45.0, -121.9), (45.0, -121.8)]
+    result = optimize_order(points, time_budget=0)
+    assert result["distance_km"] <= result["initial_km"]
+    assert optimize_order([])["order"] == []
+
+
+def test_optimize_action_resequences_pending_stops(client, db):
+    from app.models import Customer, RouteStop
+    day = date(2026, 5, 4)
+    lons = {"Done": -121.5, "East": -121.7, "West": -122.0, "Middle": -121.85, "Nowhere": None}
+    for seq, (name, lon) in enumerate(lons.items(), start=1):
+        c = Customer(name=name, latitude=None if lon is None else 45.0, longitude=lon)
+        db.session.add(c)
+        db.session.flush()
+        db.session.add(RouteStop(customer_id=c.id, route_date=day, sequence=seq,
+                                 completed=name == "Done"))
+    db.session.commit()
+
+    resp = client.post("/planner/optimize", data={"route_date": day.isoformat()})
+
+    data = resp.get_json()
+    names = [s["customer_name"] for s in data["stops"]]
+    assert names[0] == "Done" and names[-1] == "Nowhere"
+    assert names[1:4] in (["East", "Middle", "West"], ["West", "Middle", "East"])
+    assert data["unlocated"] == 1
+    assert [s["sequence"] for s in data["stops"]] == [1, 2, 3, 4, 5]
+
+
+def test_route_page_and_bundle_follow_the_optimized_order(client, db):
+    from app.models import Customer, RouteStop
+    day = date(2026, 5, 4)
+    # City order (Alder, Birch, Cedar) matches neither optimized direction
+    stops = {"Stop East": ("Birch", -121.7), "Stop West": ("Cedar", -122.0),
+             "Stop Middle": ("Alder", -121.85)}
+    for seq, (name, (city, lon)) in enumerate(stops.items(), start=1):
+        c = Customer(name=name, city=city, latitude=45.0, longitude=lon)
+        db.session.add(c)
+        db.session.flush()
+        db.session.add(RouteStop(customer_id=c.id, route_date=day, sequence=seq))
+    db.session.commit()
+
+    optimized = [s["customer_name"] for s in
+                 client.post("/planner/optimize", data={"route_date": day.isoformat()}).get_json()["stops"]]
+    assert optimized in (["Stop East", "Stop Middle", "Stop West"], ["Stop West", "Stop Middle", "Stop East"])
+
+    page = client.get(f"/route/?date={day.isoformat()}").get_data(as_text=True)
+    assert sorted(optimized, key=page.index) == optimized
+    bundle = client.get(f"/api/route/{day.isoformat()}").get_json()
+    assert [s["customer"]["name"] for s in bundle["stops"]] == optimized
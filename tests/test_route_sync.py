@@ -0,0 +1,54 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def stop(app, db):
+    from app.models import Customer, RouteStop
+    customer = Customer(name="Ann", city="Salem", balance=Decimal("40"))
+    db.session.add(customer)
+    db.session.flush()
+    stop = RouteStop(customer_id=customer.id, route_date=date.today(), sequence=1)
+    db.session.add(stop)
+    db.session.commit()
+    return stop
+
+
+def test_sync_replays_completions_and_payments(client, stop, db):
+    from app.models import Customer, Payment, RouteStop
+    at = (datetime.now(timezone.utc) - timedelta(hours=2)).replace(microsecond=0)
+    resp = client.post("/route/sync", json={"ops": [
+        {"key": "a", "type": "complete", "stop_id": stop.id, "amount_paid": "15",
+         "payment_type": "cash", "at": at.isoformat()},
+        {"key": "b", "type": "payment", "customer_id": stop.customer_id, "amount_sold": "5"},
+        {"key": "c", "type": "complete", "stop_id": 9999},
+        {"key": "d", "type": "payment", "customer_id": stop.customer_id, "amount_paid": "-1"},
+        {"key": "e", "type": "teleport"},
+    ]})
+    assert resp.status_code == 200
+    results = resp.get_json()["results"]
+    assert [(r["key"], r["ok"]) for r in results] == [
+        ("a", True), ("b", True), ("c", False), ("d", False), ("e", False),
+    ]
+    assert not any(r.get("retry") for r in results)
+
+    replayed = db.session.get(RouteStop, stop.id)
+    assert replayed.completed
+    assert replayed.completed_at.replace(tzinfo=timezone.utc) == at
+    assert db.session.get(Customer, stop.customer_id).balance == Decimal("30")
+    assert Payment.query.count() == 2
+
+
+def test_sync_rejects_malformed_batches(client, stop):
+    assert client.post("/route/sync", json={"ops": "nope"}).status_code == 400
+    too_many = [{"key": str(i), "type": "payment"} for i in range(51)]
+    assert client.post("/route/sync", json={"ops": too_many}).status_code == 400
+
+
+def test_offline_support_endpoints(client):
+    sw = client.get("/route/sw.js")
+    assert sw.status_code == 200
+    assert "javascript" in sw.mimetype
+    assert client.get("/route/sync").get_json()["csrf_token"]
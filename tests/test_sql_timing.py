@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import tempfile
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The app with SQL_TIMING on; conftest's ``client`` logs into it."""
+    monkeypatch.setenv("SQL_TIMING", "true")
+    monkeypatch.setenv("SQL_TIMING_REPEAT_THRESHOLD", "3")
+    from app import create_app, db as _db
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{path}")
+    application = create_app()
+    application.config["TESTING"] = True
+    with application.app_context():
+        _db.session.remove()
+        _db.drop_all()
+        _db.create_all()
+        yield application
+        _db.session.remove()
+        _db.engine.dispose()
+    os.unlink(path)
+
+
+def test_server_timing_header_and_log_line(client, caplog):
+    with caplog.at_level(logging.INFO, logger="app.sql_timing"):
+        resp = client.get("/health")
+    record = json.loads(caplog.records[-1].getMessage().split(" ", 1)[1])
+    assert record["path"] == "/health" and record["queries"] >= 1
+    assert "repeated" not in record
+    header = resp.headers["Server-Timing"]
+    assert header.startswith("db;dur=") and f'desc="{record["queries"]} queries"' in header
+
+
+def test_repeated_statements_are_flagged(app, client, caplog):
+    from app import db
+    from app.models import Customer
+    for name in ("A", "B", "C"):
+        db.session.add(Customer(name=name, balance=Decimal("0")))
+    db.session.commit()
+
+    @app.route("/_n_plus_one")
+    def n_plus_one():
+        ids = [c.id for c in Customer.query.all()]
+        for customer_id in ids:
+            db.session.expunge_all()
+            db.session.get(Customer, customer_id)
+        return "ok"
+
+    with caplog.at_level(logging.INFO, logger="app.sql_timing"):
+        client.get("/_n_plus_one")
+    warning = [r for r in caplog.records if r.levelno == logging.WARNING][-1]
+    record = json.loads(warning.getMessage().split(" ", 1)[1])
+    assert record["repeated"][0]["count"] == 3
+
+
+def test_failed_statement_does_not_leave_a_start_time(app, client):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from app import db
+
+    @app.route("/_broken")
+    def broken():
+        conn = db.session.connection()
+        try:
+            conn.execute(text("SELECT * FROM no_such_table"))
+        except OperationalError:
+            pending.extend(conn.info.get("sql_timing_start", []))
+            db.session.rollback()
+        return "ok"
+
+    pending = []
+    resp = client.get("/_broken")
+    assert resp.headers["Server-Timing"].startswith("db;dur=")
+    assert pending == []
+
+
+def test_disabled_by_default(monkeypatch):
+    from flask import Flask
+    from sqlalchemy import create_engine, event
+
+    from app.sql_timing import _before_cursor_execute, init_sql_timing
+    monkeypatch.delenv("SQL_TIMING", raising=False)
+    bare, engine = Flask(__name__), create_engine("sqlite://")
+    bare.route("/health")(lambda: "ok")
+
+    init_sql_timing(bare, engine)
+    assert bare.config["SQL_TIMING"] is False
+    assert not event.contains(engine, "before_cursor_execute", _before_cursor_execute)
+    assert "Server-Timing" not in bare.test_client().get("/health").headers